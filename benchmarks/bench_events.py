@@ -0,0 +1,73 @@
+"""
+Microbenchmark del costo por publish del EventBus.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_events.py [iteraciones]
+"""
+import os
+import sys
+import timeit
+import inspect
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'megacmd'))
+
+from core.events import EventBus, Event
+
+
+class LegacyEventBus(EventBus):
+    """Atribución anterior: inspect.currentframe() + nombre resuelto en cada publish"""
+
+    @staticmethod
+    def _get_caller_globals():
+        frame = inspect.currentframe()
+        try:
+            caller_frame = frame.f_back.f_back
+            name = caller_frame.f_globals.get('__name__', 'unknown') if caller_frame else 'unknown'
+            return {'__name__': name}
+        finally:
+            del frame
+
+
+def _medir(fn, iteraciones):
+    mejor = min(timeit.repeat(fn, number=iteraciones, repeat=5))
+    return mejor / iteraciones * 1e6
+
+
+def _bytes_por_evento(n=10000):
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    eventos = [Event("backup.manual.progress", data={}) for _ in range(n)]
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del eventos
+    return (despues - antes) / n
+
+
+def main():
+    iteraciones = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+
+    bus = EventBus()
+    legacy_bus = LegacyEventBus()
+
+    casos = [
+        ("publish sin handlers (atribución inspect)",
+         lambda: legacy_bus.publish("backup.manual.progress", percent=50)),
+        ("publish sin handlers (atribución diferida)",
+         lambda: bus.publish("backup.manual.progress", percent=50)),
+        ("publish + lectura de .source",
+         lambda: bus.publish("backup.manual.progress", percent=50).source),
+        ("construcción de Event",
+         lambda: Event("backup.manual.progress", data={})),
+    ]
+
+    print(f"{'caso':<45} {'µs/publish':>10}")
+    print("-" * 57)
+    for nombre, fn in casos:
+        print(f"{nombre:<45} {_medir(fn, iteraciones):>10.2f}")
+
+    print(f"\nmemoria por Event (sin data): {_bytes_por_evento():.0f} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,8 @@
-from .pipeline import Pipeline, PipelineContext
+from .pipeline import Pipeline, PipelineContext, ContextSnapshot, RetryPolicy, StepTimeoutError, StepStream, StreamClosedError
+from .cancellation import CancellationToken, PipelineCancelledError
+from .locking import ProcessLock, LockBusyError
+from .hooks import HookRegistry, HookError, backup_hooks
 from .events import event_bus
+from .storage import StorageBackend, StorageEntry, LocalStorageBackend
 
-__all__ = ['Pipeline', 'PipelineContext', 'event_bus']
\ No newline at end of file
+__all__ = ['Pipeline', 'PipelineContext', 'ContextSnapshot', 'RetryPolicy', 'StepTimeoutError', 'StepStream', 'StreamClosedError', 'CancellationToken', 'PipelineCancelledError', 'ProcessLock', 'LockBusyError', 'HookRegistry', 'HookError', 'backup_hooks', 'event_bus', 'StorageBackend', 'StorageEntry', 'LocalStorageBackend']
\ No newline at end of file
@@ -0,0 +1,171 @@
+from typing import Callable, List, Optional
+import logging
+import subprocess
+import threading
+import time
+
+POLL_SECONDS = 0.2
+# Tiempo que se le da a un proceso hijo para terminar antes de matarlo
+TERMINATE_GRACE_SECONDS = 5.0
+
+_logger = logging.getLogger('pipeline')
+
+
+class PipelineCancelledError(Exception):
+    """La corrida se canceló (a pedido o por vencer su plazo)"""
+
+    def __init__(self, reason: str = "Cancelado", deadline_exceeded: bool = False):
+        super().__init__(reason)
+        self.reason = reason
+        self.deadline_exceeded = deadline_exceeded
+
+
+class CancellationToken:
+    """Cancelación cooperativa: los pasos consultan el token y cortan por su cuenta.
+
+    Con deadline_seconds, al vencer el plazo el token se cancela solo.
+    """
+
+    def __init__(self, deadline_seconds: Optional[float] = None):
+        self.reason: Optional[str] = None
+        self.deadline_exceeded = False
+        self.deadline: Optional[float] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+        self._timer: Optional[threading.Timer] = None
+        # En un token hijo: quita el callback registrado en el padre
+        self._unlink: Optional[Callable[[], None]] = None
+
+        if deadline_seconds and deadline_seconds > 0:
+            self.deadline = time.monotonic() + deadline_seconds
+            self._timer = threading.Timer(
+                deadline_seconds, self._expire, args=(deadline_seconds,)
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Segundos hasta el plazo; None si no hay plazo"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def cancel(self, reason: str = "Cancelado por el usuario") -> bool:
+        """False si ya estaba cancelado (se conserva el primer motivo)"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+            if self._timer is not None:
+                self._timer.cancel()
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                _logger.warning(f"Error en callback de cancelación: {e}")
+        return True
+
+    def _expire(self, seconds: float):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.deadline_exceeded = True
+        self.cancel(f"Se superó el plazo de {seconds:g}s")
+
+    def check(self):
+        if self._event.is_set():
+            raise PipelineCancelledError(self.reason, self.deadline_exceeded)
+
+    def wait(self, seconds: float) -> bool:
+        """Espera interrumpible (ej: backoff entre reintentos); True si se canceló"""
+        return self._event.wait(seconds)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Registra un callback; si ya está cancelado se llama enseguida. Devuelve cómo quitarlo"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def remove():
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+                return remove
+        callback()
+        return lambda: None
+
+    def child(self, deadline_seconds: Optional[float] = None) -> 'CancellationToken':
+        """Token ligado a este: se cancela con él (mismo motivo) o al vencer su propio plazo"""
+        token = CancellationToken(deadline_seconds)
+        if self.deadline is not None and (token.deadline is None or self.deadline < token.deadline):
+            token.deadline = self.deadline
+        token._unlink = self.on_cancel(lambda: token._follow(self))
+        return token
+
+    def _follow(self, parent: 'CancellationToken'):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.deadline_exceeded = parent.deadline_exceeded
+        self.cancel(parent.reason)
+
+    def release(self):
+        # Corrida terminada: el timer del plazo ya no tiene nada que cortar
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._unlink is not None:
+            self._unlink()
+            self._unlink = None
+
+
+def terminate_process(process: subprocess.Popen, grace: float = TERMINATE_GRACE_SECONDS):
+    """SIGTERM y, si no termina dentro de `grace` segundos, SIGKILL"""
+    if process.poll() is not None:
+        return
+    try:
+        process.terminate()
+        process.wait(grace)
+    except subprocess.TimeoutExpired:
+        _logger.warning(f"El proceso {process.pid} no terminó, se fuerza el cierre")
+        process.kill()
+        process.wait()
+    except OSError:
+        pass
+
+
+def run_process(cmd, cancel_token: Optional[CancellationToken] = None,
+                timeout: Optional[float] = None, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run que además corta al proceso hijo si se cancela el token"""
+    if cancel_token is None:
+        return subprocess.run(cmd, timeout=timeout, **kwargs)
+
+    cancel_token.check()
+    if kwargs.pop('capture_output', False):
+        kwargs['stdout'] = subprocess.PIPE
+        kwargs['stderr'] = subprocess.PIPE
+
+    limit = time.monotonic() + timeout if timeout else None
+    with subprocess.Popen(cmd, **kwargs) as process:
+        while True:
+            try:
+                # communicate() con timeout se puede repetir sin perder salida
+                stdout, stderr = process.communicate(timeout=POLL_SECONDS)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if cancel_token.cancelled:
+                terminate_process(process)
+                cancel_token.check()
+            if limit is not None and time.monotonic() >= limit:
+                terminate_process(process)
+                raise subprocess.TimeoutExpired(cmd, timeout)
+
+    return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
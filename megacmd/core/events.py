@@ -1,165 +1,880 @@
 from typing import Callable, Dict, List, Any, Optional
-from dataclasses import dataclass, field
 from datetime import datetime
+from collections import deque
+import bisect
+import sys
+import threading
+import asyncio
+import time
+import atexit
+import inspect
 import logging
+import weakref
+from .journal import EventJournal, compact_jsonable, pattern_matches
+
+# Desfase entre reloj de pared y monotónico, fijado al importar el módulo
+_WALL_OFFSET = time.time() - time.monotonic()
+
 
-@dataclass
 class Event:
-    name: str
-    timestamp: datetime = field(default_factory=datetime.now)
-    data: Dict[str, Any] = field(default_factory=dict)
-    source: Optional[str] = None
+    __slots__ = ('name', 'data', 'monotonic', '_timestamp', '_source', '_source_globals', '_compact')
+    
+    def __init__(
+        self,
+        name: str,
+        timestamp: Optional[datetime] = None,
+        data: Optional[Dict[str, Any]] = None,
+        source: Optional[str] = None,
+        source_globals: Optional[dict] = None
+    ):
+        setattr_ = object.__setattr__
+        setattr_(self, 'name', name)
+        setattr_(self, 'data', data if data is not None else {})
+        # Solo se toma el reloj monotónico; el datetime se construye al leer .timestamp
+        setattr_(self, 'monotonic', time.monotonic())
+        setattr_(self, '_timestamp', timestamp)
+        setattr_(self, '_source', source)
+        # Se guardan solo los globals del módulo publicador (no el frame, que
+        # retendría sus variables locales); el nombre se resuelve al leer .source
+        setattr_(self, '_source_globals', source_globals)
+        setattr_(self, '_compact', None)
     
-    def __post_init__(self):
-        # Hacerlo inmutable después de creación
-        object.__setattr__(self, '_frozen', True)
+    @property
+    def timestamp(self) -> datetime:
+        if self._timestamp is None:
+            object.__setattr__(self, '_timestamp', datetime.fromtimestamp(_WALL_OFFSET + self.monotonic))
+        return self._timestamp
+    
+    @property
+    def source(self) -> Optional[str]:
+        if self._source is None and self._source_globals is not None:
+            object.__setattr__(self, '_source', self._source_globals.get('__name__', 'unknown'))
+            object.__setattr__(self, '_source_globals', None)
+        return self._source
+    
+    def compact_data(self) -> Dict[str, Any]:
+        """Datos en forma JSON para journal e IPC; se calcula una sola vez por evento"""
+        if self._compact is None:
+            object.__setattr__(self, '_compact', compact_jsonable(self.data))
+        return self._compact
     
     def __setattr__(self, key, value):
-        if hasattr(self, '_frozen'):
-            raise AttributeError("Event is immutable")
-        super().__setattr__(key, value)
+        raise AttributeError("Event is immutable")
+    
+    def __delattr__(self, key):
+        raise AttributeError("Event is immutable")
+    
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return (self.name, self.timestamp, self.data, self.source) == \
+               (other.name, other.timestamp, other.data, other.source)
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return (f"Event(name={self.name!r}, timestamp={self.timestamp!r}, "
+                f"data={self.data!r}, source={self.source!r})")
+
+
+# Límites superiores (ms) de los buckets del histograma de latencia por handler
+LATENCY_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class HandlerMetrics:
+    __slots__ = ('calls', 'errors', 'total_ms', 'max_ms', 'buckets')
+    
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    
+    def record(self, elapsed_ms: float, failed: bool):
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+    
+    def percentile(self, q: float) -> Optional[float]:
+        """Cota superior del bucket donde cae el percentil q (0-1)"""
+        if not self.calls:
+            return None
+        objetivo = q * self.calls
+        acumulado = 0
+        for idx, count in enumerate(self.buckets):
+            acumulado += count
+            if acumulado >= objetivo:
+                return LATENCY_BUCKETS_MS[idx] if idx < len(LATENCY_BUCKETS_MS) else round(self.max_ms)
+        return round(self.max_ms)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        etiquetas = [f"<={b}ms" for b in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_ms': round(self.total_ms / self.calls, 3) if self.calls else 0.0,
+            'max_ms': round(self.max_ms, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'histogram': dict(zip(etiquetas, self.buckets))
+        }
+
+
+DISPATCH_MODES = ('sync', 'thread', 'asyncio')
+OVERFLOW_POLICIES = ('block', 'drop_oldest', 'drop_new')
+
+
+class AsyncDispatcher:
+    """Cola acotada + pool de workers para handlers que no deben frenar al publicador"""
+    
+    def __init__(self, bus: 'EventBus', workers: int = 2, max_queue: int = 1000,
+                 overflow: str = 'block'):
+        self._bus = bus
+        self.workers = workers
+        self.max_queue = max_queue
+        self.overflow = overflow
+        self.dropped = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self._threads: List[threading.Thread] = []
+        self._closed = False
+        self._loop = None
+        self._loop_thread = None
+    
+    def submit(self, event: 'Event', handler_info: dict) -> bool:
+        return self.submit_call(
+            lambda: self._bus._invoke(event, handler_info),
+            event.name,
+            handler_info.get('overflow')
+        )
+    
+    def submit_call(self, job: Callable[[], None], event_name: str,
+                    overflow: Optional[str] = None) -> bool:
+        with self._cond:
+            inline = self._closed or threading.current_thread() in self._threads
+            if not inline:
+                policy = overflow or self.overflow
+                while len(self._queue) >= self.max_queue:
+                    if policy == 'drop_new':
+                        self._drop(event_name)
+                        return False
+                    if policy == 'drop_oldest':
+                        _, dropped_name = self._queue.popleft()
+                        self._unfinished -= 1
+                        # Un flush() puede estar esperando justo este descenso
+                        self._cond.notify_all()
+                        self._drop(dropped_name)
+                        break
+                    self._cond.wait()
+                
+                self._queue.append((job, event_name))
+                self._unfinished += 1
+                self._start_workers()
+                self._cond.notify_all()
+                return True
+        
+        # Tras shutdown, o si un handler asíncrono publica con la cola llena,
+        # ejecutar en línea evita perder el evento o bloquear al propio worker
+        job()
+        return True
+    
+    def _drop(self, event_name: str):
+        self.dropped += 1
+        self._bus._logger.warning(f"Cola de eventos llena, descartado: {event_name}")
+    
+    def _start_workers(self):
+        self._threads = [t for t in self._threads if t.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"event-worker-{len(self._threads)}",
+                daemon=True
+            )
+            self._threads.append(thread)
+            thread.start()
+    
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if not self._queue:
+                    return
+                job, _ = self._queue.popleft()
+                self._cond.notify_all()
+            
+            try:
+                job()
+            finally:
+                with self._cond:
+                    self._unfinished -= 1
+                    self._cond.notify_all()
+    
+    def run_coroutine(self, coro):
+        with self._cond:
+            if self._loop is None or not self._loop_thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="event-loop",
+                    daemon=True
+                )
+                self._loop_thread.start()
+        
+        if threading.current_thread() is self._loop_thread:
+            # Publicado desde otra corrutina: no se puede esperar sin bloquear el loop
+            self._loop.create_task(coro)
+            return None
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+    
+    def pending(self) -> int:
+        with self._cond:
+            return self._unfinished
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._unfinished == 0, timeout)
+    
+    def shutdown(self, timeout: Optional[float] = 5.0) -> bool:
+        drained = self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        return drained
+
+
+class Subscription:
+    """Handle devuelto por subscribe(): unsubscribe() da de baja esa suscripción"""
+    
+    __slots__ = ('_bus', 'pattern', '_info')
+    
+    def __init__(self, bus: 'EventBus', pattern: str, handler_info: dict):
+        self._bus = bus
+        self.pattern = pattern
+        self._info = handler_info
+    
+    @property
+    def handler(self) -> Optional[Callable]:
+        return EventBus._resolve_handler(self._info)
+    
+    @property
+    def module(self) -> Optional[str]:
+        return self._info['module']
+    
+    @property
+    def active(self) -> bool:
+        return self._bus._is_subscribed(self.pattern, self._info)
+    
+    def unsubscribe(self) -> bool:
+        return self._bus._remove_handlers(self.pattern, lambda info: info is self._info) > 0
+    
+    def __repr__(self):
+        handler = self.handler
+        name = getattr(handler, '__qualname__', None) or repr(handler)
+        return f"<Subscription {self.pattern} -> {name}{'' if self.active else ' (inactiva)'}>"
+
+
+class EventCoalescer:
+    """Acota el flujo hacia un handler: como máximo uno cada N ms, solo el último
+    valor pendiente, o lotes de N eventos"""
+    
+    def __init__(self, bus: 'EventBus', handler_info: dict, throttle_ms: Optional[float] = None,
+                 latest_only: bool = False, batch_size: Optional[int] = None,
+                 batch_ms: Optional[float] = None):
+        self._bus = bus
+        self._info = handler_info
+        self.throttle = throttle_ms / 1000 if throttle_ms else None
+        self.latest_only = latest_only
+        self.batch_size = batch_size
+        self.batch_wait = batch_ms / 1000 if batch_ms else None
+        # Eventos absorbidos: descartados dentro de la ventana o reemplazados por uno más nuevo
+        self.coalesced = 0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+        self._trailing: Optional[Event] = None
+        self._latest: Optional[Event] = None
+        self._queued = False
+        self._batch: List[Event] = []
+        self._timer: Optional[threading.Timer] = None
+    
+    def offer(self, event: Event):
+        if self.batch_size:
+            self._offer_batch(event)
+        elif self.throttle:
+            self._offer_throttled(event)
+        else:
+            self._deliver(event)
+    
+    def _offer_throttled(self, event: Event):
+        now = time.monotonic()
+        with self._lock:
+            deliver = now >= self._next_at and self._trailing is None
+            if deliver:
+                self._next_at = now + self.throttle
+            elif self.latest_only:
+                # El último valor se entrega al cerrar la ventana: nunca se pierde el estado final
+                if self._trailing is not None:
+                    self.coalesced += 1
+                self._trailing = event
+                self._arm(self._next_at - now)
+            else:
+                self.coalesced += 1
+        
+        if deliver:
+            self._deliver(event)
+    
+    def _offer_batch(self, event: Event):
+        with self._lock:
+            self._batch.append(event)
+            if len(self._batch) >= self.batch_size:
+                events, self._batch = self._batch, []
+                self._cancel_timer()
+            else:
+                events = None
+                if self.batch_wait:
+                    self._arm(self.batch_wait)
+        
+        if events:
+            self._deliver(self._make_batch(events))
+    
+    @staticmethod
+    def _make_batch(events: List[Event]) -> Event:
+        last = events[-1]
+        return Event(
+            name=last.name,
+            timestamp=last.timestamp,
+            data={'events': events, 'count': len(events)},
+            source=last.source
+        )
+    
+    def _deliver(self, event: Event):
+        if self._info['dispatch'] == 'sync':
+            self._bus._invoke(event, self._info)
+        elif self.latest_only:
+            self._offer_latest(event)
+        else:
+            self._bus._dispatcher.submit(event, self._info)
+    
+    def _offer_latest(self, event: Event):
+        # Con el handler ocupado, a la cola va un único trabajo que toma el valor
+        # más reciente al ejecutarse: un handler lento nunca acumula atraso
+        with self._lock:
+            if self._latest is not None:
+                self.coalesced += 1
+            self._latest = event
+            if self._queued:
+                return
+            self._queued = True
+        
+        queued = self._bus._dispatcher.submit_call(
+            self._drain_latest, event.name, self._info.get('overflow')
+        )
+        if not queued:
+            with self._lock:
+                self._queued = False
+    
+    def _drain_latest(self):
+        with self._lock:
+            event, self._latest = self._latest, None
+            self._queued = False
+        if event is not None:
+            self._bus._invoke(event, self._info)
+    
+    def _arm(self, delay: float):
+        if self._timer is None:
+            self._timer = threading.Timer(max(0.0, delay), self._on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+    
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+    
+    def _take_pending(self) -> Optional[Event]:
+        if self._batch:
+            events, self._batch = self._batch, []
+            return self._make_batch(events)
+        event, self._trailing = self._trailing, None
+        if event is not None:
+            self._next_at = time.monotonic() + self.throttle
+        return event
+    
+    def _on_timer(self):
+        with self._lock:
+            self._timer = None
+            event = self._take_pending()
+        if event is not None:
+            self._deliver(event)
+    
+    def flush(self):
+        """Entrega ya lo retenido (lote parcial o último valor) sin esperar al timer"""
+        with self._lock:
+            self._cancel_timer()
+            event = self._take_pending()
+        if event is not None:
+            self._deliver(event)
+    
+    def close(self):
+        with self._lock:
+            self._cancel_timer()
+            self._batch = []
+            self._trailing = None
+            self._latest = None
 
 
 class EventBus:
    
+    # Tope de nombres de evento distintos en la caché de handlers
+    _MAX_CACHED_NAMES = 1024
+    
     def __init__(self):
-        self._subscribers: Dict[str, List[tuple]] = {}
+        self._subscribers: Dict[str, List[dict]] = {}
         self._logger = logging.getLogger('events')
-        self._event_history: List[Event] = []
-        self._max_history = 100
+        self.journal = EventJournal(max_memory=100)
+        self._lock = threading.RLock()
+        # Orden de alta de cada patrón: desempate estable entre prioridades iguales
+        self._pattern_order: Dict[str, int] = {}
+        self._pattern_seq = 0
+        # Trie por segmentos para patrones con '*': {segmento: nodo}; la clave '.'
+        # (nunca es un segmento) guarda el patrón que termina en ese nodo
+        self._wildcard_trie: Dict[str, Any] = {}
+        self._handler_cache: Dict[str, List[dict]] = {}
+        self._dispatcher = AsyncDispatcher(self)
+        self._metrics: Dict[str, HandlerMetrics] = {}
+        self._metrics_lock = threading.Lock()
+        # Umbral (ms) para avisar de handlers lentos; None lo desactiva
+        self.slow_handler_ms: Optional[float] = None
+        self._bridge = None
+        # Suscripciones cuyo método ligado fue recolectado, pendientes de baja
+        self._dead_handlers = deque()
     
     def subscribe(
         self,
         event_pattern: str,
         handler: Callable,
         priority: int = 10,
-        filter_fn: Optional[Callable[[Event], bool]] = None
-    ):
-
-        if event_pattern not in self._subscribers:
-            self._subscribers[event_pattern] = []
+        filter_fn: Optional[Callable[[Event], bool]] = None,
+        dispatch: str = 'sync',
+        overflow: Optional[str] = None,
+        throttle_ms: Optional[float] = None,
+        latest_only: bool = False,
+        batch_size: Optional[int] = None,
+        batch_ms: Optional[float] = None,
+        owner: Optional[str] = None,
+        weak: bool = False
+    ) -> Subscription:
+        """
+        dispatch: 'sync' ejecuta en el hilo que publica; 'thread' en el pool de
+        workers; 'asyncio' igual que 'thread' pero para handlers corrutina.
+        overflow: política con la cola llena ('block', 'drop_oldest', 'drop_new');
+        None usa la del bus.
+        throttle_ms: como máximo una entrega cada N ms; los eventos intermedios
+        se descartan, salvo con latest_only, que entrega el último al cerrar la ventana.
+        latest_only: en despacho asíncrono, un handler ocupado recibe solo el
+        valor más reciente en lugar de todos los pendientes.
+        batch_size: entrega un Event con data={'events': [...], 'count': n} cada
+        N eventos, o antes si pasan batch_ms desde el primero del lote.
+        owner: módulo dueño de la suscripción (por defecto handler.__module__);
+        unsubscribe_module() las da de baja al recargar ese módulo.
+        weak: guarda un método ligado por referencia débil, y la suscripción
+        desaparece sola cuando su objeto deja de existir. Por defecto la
+        suscripción mantiene vivo al objeto (ej. subscribe("x", Foo().handle)).
+        """
+        if dispatch not in DISPATCH_MODES:
+            raise ValueError(f"Modo de despacho inválido: {dispatch}")
+        if overflow is not None and overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desborde inválida: {overflow}")
+        if batch_size is not None and (batch_size < 1 or throttle_ms or latest_only):
+            raise ValueError("batch_size debe ser >= 1 y no se combina con throttle_ms/latest_only")
         
-        self._subscribers[event_pattern].append({
-            'handler': handler,
-            'priority': priority,
-            'filter': filter_fn
-        })
-        
-        # Ordenar por prioridad
-        self._subscribers[event_pattern].sort(
-            key=lambda x: x['priority'],
-            reverse=True
-        )
+        with self._lock:
+            if event_pattern not in self._subscribers:
+                self._subscribers[event_pattern] = []
+                self._pattern_order[event_pattern] = self._pattern_seq
+                self._pattern_seq += 1
+                if '*' in event_pattern:
+                    self._trie_insert(event_pattern)
+            
+            handler_info = {
+                'handler': handler,
+                'ref': None,
+                'module': owner or getattr(handler, '__module__', None),
+                'priority': priority,
+                'filter': filter_fn,
+                'dispatch': dispatch,
+                'overflow': overflow,
+                'coalescer': None
+            }
+            if throttle_ms or latest_only or batch_size:
+                handler_info['coalescer'] = EventCoalescer(
+                    self, handler_info, throttle_ms, latest_only, batch_size, batch_ms
+                )
+            if weak and inspect.ismethod(handler):
+                # El callback solo encola la baja: puede correr desde el GC en
+                # cualquier hilo, incluso en medio de una operación sobre _subscribers
+                handler_info['ref'] = weakref.WeakMethod(
+                    handler,
+                    lambda _ref, pattern=event_pattern, info=handler_info:
+                        self._dead_handlers.append((pattern, info))
+                )
+                handler_info['handler'] = None
+            self._subscribers[event_pattern].append(handler_info)
+            
+            # Ordenar por prioridad
+            self._subscribers[event_pattern].sort(
+                key=lambda x: x['priority'],
+                reverse=True
+            )
+            self._handler_cache.clear()
         
         self._logger.debug(
-            f"Subscribed: {handler.__name__} to '{event_pattern}' (priority {priority})"
+            f"Subscribed: {getattr(handler, '__name__', handler)} to '{event_pattern}' (priority {priority})"
         )
+        return Subscription(self, event_pattern, handler_info)
     
     def publish(self, event_name: str, **data) -> Event:
         # Crear evento inmutable
         event = Event(
             name=event_name,
             data=data,
-            source=self._get_caller_module()
+            source_globals=self._get_caller_globals()
         )
         
         # Guardar en historial
-        self._add_to_history(event)
+        self.journal.record(event)
+        
+        # Reenviar a otros procesos locales antes de correr handlers lentos
+        if self._bridge is not None:
+            self._bridge.forward(event)
+        
+        self._dispatch(event)
+        return event
+    
+    def publish_remote(self, event_name: str, data: Dict[str, Any],
+                       timestamp: Optional[datetime] = None, source: Optional[str] = None) -> Event:
+        """Entrega local de un evento recibido de otro proceso (no se reenvía)"""
+        event = Event(
+            name=event_name,
+            timestamp=timestamp,
+            data=data,
+            source=source
+        )
+        
+        # El proceso de origen ya lo persistió en su journal
+        self.journal.record(event, persist=False)
+        self._dispatch(event)
+        return event
+    
+    def attach_bridge(self, bridge):
+        self._bridge = bridge
+    
+    def detach_bridge(self):
+        self._bridge = None
+    
+    def _dispatch(self, event: Event):
+        if self._dead_handlers:
+            self._purge_dead_handlers()
         
         # Encontrar subscribers que coincidan
-        matching_handlers = self._find_matching_handlers(event_name)
+        matching_handlers = self._find_matching_handlers(event.name)
         
         if not matching_handlers:
-            self._logger.debug(f"No handlers for event: {event_name}")
-            return event
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug(f"No handlers for event: {event.name}")
+            return
         
         # Ejecutar handlers
         for handler_info in matching_handlers:
-            handler = handler_info['handler']
             filter_fn = handler_info['filter']
             
             # Aplicar filtro si existe
             if filter_fn and not filter_fn(event):
                 continue
             
-            try:
-                handler(event)
-            except Exception as e:
-                self._logger.error(
-                    f"Error in handler '{handler.__name__}' for event '{event_name}': {e}",
-                    exc_info=True
-                )
-                # Publicar evento de error
-                self.publish(
-                    "system.handler_error",
-                    original_event=event_name,
-                    handler=handler.__name__,
-                    error=str(e)
-                )
+            if handler_info['coalescer'] is not None:
+                handler_info['coalescer'].offer(event)
+            elif handler_info['dispatch'] == 'sync':
+                self._invoke(event, handler_info)
+            else:
+                self._dispatcher.submit(event, handler_info)
+    
+    @staticmethod
+    def _resolve_handler(handler_info: dict) -> Optional[Callable]:
+        ref = handler_info['ref']
+        return handler_info['handler'] if ref is None else ref()
+    
+    def _invoke(self, event: Event, handler_info: dict):
+        handler = self._resolve_handler(handler_info)
+        if handler is None:
+            return
+        failed = False
+        end = None
+        start = time.perf_counter()
+        try:
+            result = handler(event)
+            if asyncio.iscoroutine(result):
+                self._dispatcher.run_coroutine(result)
+        except Exception as e:
+            # La latencia no incluye el log ni el evento de error
+            end = time.perf_counter()
+            failed = True
+            self._logger.error(
+                f"Error in handler '{handler.__name__}' for event '{event.name}': {e}",
+                exc_info=True
+            )
+            # Publicar evento de error
+            self.publish(
+                "system.handler_error",
+                original_event=event.name,
+                handler=handler.__name__,
+                error=str(e)
+            )
+        finally:
+            self._record_metrics(handler, event.name, ((end or time.perf_counter()) - start) * 1000, failed)
+    
+    @staticmethod
+    def _handler_key(handler: Callable) -> str:
+        module = getattr(handler, '__module__', None) or 'unknown'
+        name = getattr(handler, '__qualname__', None) or getattr(handler, '__name__', repr(handler))
+        return f"{module}.{name}"
+    
+    def _record_metrics(self, handler: Callable, event_name: str, elapsed_ms: float, failed: bool):
+        key = self._handler_key(handler)
+        with self._metrics_lock:
+            metrics = self._metrics.get(key)
+            if metrics is None:
+                metrics = self._metrics[key] = HandlerMetrics()
+            metrics.record(elapsed_ms, failed)
         
-        return event
+        if self.slow_handler_ms is not None and elapsed_ms >= self.slow_handler_ms:
+            self._logger.warning(
+                f"Handler lento: '{key}' tardó {elapsed_ms:.0f} ms en '{event_name}' "
+                f"(umbral {self.slow_handler_ms:.0f} ms)"
+            )
+    
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Métricas por handler, ordenadas por tiempo total consumido"""
+        with self._metrics_lock:
+            items = sorted(self._metrics.items(), key=lambda kv: kv[1].total_ms, reverse=True)
+            return {key: metrics.to_dict() for key, metrics in items}
+    
+    def reset_metrics(self):
+        with self._metrics_lock:
+            self._metrics.clear()
+    
+    def set_slow_handler_threshold(self, threshold_ms: Optional[float]):
+        self.slow_handler_ms = threshold_ms if threshold_ms and threshold_ms > 0 else None
+    
+    def configure_async(self, workers: Optional[int] = None, max_queue: Optional[int] = None,
+                        overflow: Optional[str] = None):
+        if overflow is not None and overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desborde inválida: {overflow}")
+        with self._dispatcher._cond:
+            if workers is not None:
+                self._dispatcher.workers = max(1, workers)
+            if max_queue is not None:
+                self._dispatcher.max_queue = max(1, max_queue)
+            if overflow is not None:
+                self._dispatcher.overflow = overflow
+    
+    def _coalescers(self) -> List[EventCoalescer]:
+        with self._lock:
+            return [
+                info['coalescer']
+                for handlers in self._subscribers.values()
+                for info in handlers
+                if info['coalescer'] is not None
+            ]
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Entrega lo retenido por coalescencia y espera a los handlers asíncronos"""
+        for coalescer in self._coalescers():
+            coalescer.flush()
+        return self._dispatcher.flush(timeout)
+    
+    def shutdown(self, timeout: Optional[float] = 5.0) -> bool:
+        """Drena la cola y detiene los workers; lo publicado después corre en línea"""
+        for coalescer in self._coalescers():
+            coalescer.flush()
+        return self._dispatcher.shutdown(timeout)
+    
+    def get_dispatch_stats(self) -> Dict[str, int]:
+        return {
+            'pending': self._dispatcher.pending(),
+            'dropped': self._dispatcher.dropped,
+            'coalesced': sum(c.coalesced for c in self._coalescers()),
+            'workers': self._dispatcher.workers,
+            'max_queue': self._dispatcher.max_queue
+        }
     
     def _find_matching_handlers(self, event_name: str) -> List[dict]:
         """Encuentra handlers que coincidan con el evento (soporte para wildcards)"""
-        matching = []
-        
-        for pattern, handlers in self._subscribers.items():
-            if self._pattern_matches(pattern, event_name):
-                matching.extend(handlers)
-        
-        # Ordenar por prioridad global
-        matching.sort(key=lambda x: x['priority'], reverse=True)
-        return matching
-    
-    def _pattern_matches(self, pattern: str, event_name: str) -> bool:
-        if pattern == event_name:
-            return True
+        cached = self._handler_cache.get(event_name)
+        if cached is not None:
+            return cached
         
-        # Soporte para wildcards
-        if '*' in pattern:
-            pattern_parts = pattern.split('.')
-            event_parts = event_name.split('.')
+        with self._lock:
+            patterns = self._trie_match(event_name)
+            if '*' not in event_name and event_name in self._subscribers:
+                patterns.append(event_name)
             
-            if len(pattern_parts) != len(event_parts):
-                return False
+            patterns.sort(key=self._pattern_order.__getitem__)
+            matching = []
+            for pattern in patterns:
+                matching.extend(self._subscribers[pattern])
             
-            for p, e in zip(pattern_parts, event_parts):
-                if p != '*' and p != e:
-                    return False
+            # Ordenar por prioridad global
+            matching.sort(key=lambda x: x['priority'], reverse=True)
             
-            return True
+            if len(self._handler_cache) >= self._MAX_CACHED_NAMES:
+                self._handler_cache.clear()
+            self._handler_cache[event_name] = matching
+            return matching
+    
+    def _trie_insert(self, pattern: str):
+        node = self._wildcard_trie
+        for segment in pattern.split('.'):
+            node = node.setdefault(segment, {})
+        node['.'] = pattern
+    
+    def _trie_remove(self, pattern: str):
+        path = [self._wildcard_trie]
+        segments = pattern.split('.')
+        for segment in segments:
+            node = path[-1].get(segment)
+            if node is None:
+                return
+            path.append(node)
         
-        return False
+        path[-1].pop('.', None)
+        # Podar ramas vacías de abajo hacia arriba
+        for segment, node, parent in zip(reversed(segments), reversed(path[1:]), reversed(path[:-1])):
+            if node:
+                break
+            del parent[segment]
     
-    def _add_to_history(self, event: Event):
-        self._event_history.append(event)
-        if len(self._event_history) > self._max_history:
-            self._event_history.pop(0)
+    def _trie_match(self, event_name: str) -> List[str]:
+        nodes = [self._wildcard_trie]
+        for segment in event_name.split('.'):
+            next_nodes = []
+            for node in nodes:
+                if segment in node:
+                    next_nodes.append(node[segment])
+                if segment != '*' and '*' in node:
+                    next_nodes.append(node['*'])
+            if not next_nodes:
+                return []
+            nodes = next_nodes
+        
+        return [node['.'] for node in nodes if '.' in node]
     
-    def _get_caller_module(self) -> str:
-        import inspect
-        frame = inspect.currentframe()
+    def _pattern_matches(self, pattern: str, event_name: str) -> bool:
+        return pattern_matches(pattern, event_name)
+    
+    @staticmethod
+    def _get_caller_globals() -> Optional[dict]:
         try:
-            # Subir 3 frames: _get_caller -> publish -> caller
-            caller_frame = frame.f_back.f_back.f_back
-            return caller_frame.f_globals.get('__name__', 'unknown')
-        finally:
-            del frame
+            # Subir 2 frames: _get_caller_globals -> publish -> caller
+            return sys._getframe(2).f_globals
+        except ValueError:
+            return None
     
-    def get_history(self, event_pattern: Optional[str] = None) -> List[Event]:
-        if event_pattern:
-            return [
-                e for e in self._event_history
-                if self._pattern_matches(event_pattern, e.name)
-            ]
-        return self._event_history.copy()
+    def get_history(
+        self,
+        event_pattern: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: Optional[int] = None
+    ) -> List[Event]:
+        return self.journal.get_history(event_pattern, since, until, limit)
+    
+    def replay(
+        self,
+        event_pattern: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        """Eventos del log persistente; sobrevive a reinicios del proceso"""
+        return self.journal.replay(event_pattern, since, until)
     
-    def unsubscribe(self, event_pattern: str, handler: Callable):
+    def unsubscribe(self, event_pattern: str, handler: Callable) -> int:
         """Desuscribe un handler específico"""
-        if event_pattern in self._subscribers:
-            self._subscribers[event_pattern] = [
-                h for h in self._subscribers[event_pattern]
-                if h['handler'] != handler
+        return self._remove_handlers(
+            event_pattern,
+            lambda info: self._resolve_handler(info) == handler
+        )
+    
+    def unsubscribe_module(self, module_name: str) -> int:
+        """Da de baja todo lo que registró un módulo (antes de re-ejecutarlo)"""
+        with self._lock:
+            removed = sum(
+                self._remove_handlers(pattern, lambda info: info['module'] == module_name)
+                for pattern in list(self._subscribers)
+            )
+        if removed:
+            self._logger.debug(f"Desuscritos {removed} handlers del módulo '{module_name}'")
+        return removed
+    
+    def get_subscriptions(self, module_name: Optional[str] = None) -> List[Subscription]:
+        with self._lock:
+            return [
+                Subscription(self, pattern, info)
+                for pattern, handlers in self._subscribers.items()
+                for info in handlers
+                if module_name is None or info['module'] == module_name
             ]
+    
+    def _is_subscribed(self, event_pattern: str, handler_info: dict) -> bool:
+        with self._lock:
+            return any(info is handler_info for info in self._subscribers.get(event_pattern, ()))
+    
+    def _purge_dead_handlers(self):
+        while self._dead_handlers:
+            try:
+                pattern, dead = self._dead_handlers.popleft()
+            except IndexError:
+                break
+            if self._remove_handlers(pattern, lambda info: info is dead):
+                self._logger.debug(f"Baja de un handler débil de '{pattern}': su objeto fue recolectado")
+    
+    def _remove_handlers(self, event_pattern: str, predicate: Callable[[dict], bool]) -> int:
+        with self._lock:
+            if event_pattern not in self._subscribers:
+                return 0
+            
+            remaining = []
+            removed = 0
+            for h in self._subscribers[event_pattern]:
+                if not predicate(h):
+                    remaining.append(h)
+                    continue
+                removed += 1
+                if h['coalescer'] is not None:
+                    h['coalescer'].close()
+            
+            if not removed:
+                return 0
+            
+            if remaining:
+                self._subscribers[event_pattern] = remaining
+            else:
+                del self._subscribers[event_pattern]
+                del self._pattern_order[event_pattern]
+                if '*' in event_pattern:
+                    self._trie_remove(event_pattern)
+            
+            self._handler_cache.clear()
+            return removed
 
-event_bus = EventBus()
\ No newline at end of file
+event_bus = EventBus()
+atexit.register(event_bus.shutdown)
\ No newline at end of file
@@ -0,0 +1,201 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Union
+from dataclasses import dataclass
+import logging
+import os
+import threading
+import time
+from .cancellation import CancellationToken, PipelineCancelledError, run_process
+from .events import event_bus
+
+HOOK_TIMEOUT_SECONDS = 60.0
+# Puntos del pipeline de backup; "snapshot" es el tramo inventario + compresión
+BACKUP_HOOK_POINTS = ('before_snapshot', 'after_snapshot', 'after_upload')
+
+_logger = logging.getLogger('pipeline')
+
+
+class HookError(RuntimeError):
+    """Falló un hook marcado como required"""
+
+
+@dataclass
+class Hook:
+    name: str
+    # Callable que recibe el contexto, o comando de shell (str) / argv (lista)
+    action: Union[Callable[[Any], Any], str, Sequence[str]]
+    timeout: Optional[float] = HOOK_TIMEOUT_SECONDS
+    # Si falla, el punto lanza HookError; si no, solo queda registrado
+    required: bool = False
+
+    @classmethod
+    def from_config(cls, data: Dict[str, Any], default_timeout: Optional[float] = HOOK_TIMEOUT_SECONDS) -> 'Hook':
+        """Hook desde config (ej: {"command": "...", "timeout_seconds": 30, "required": true})"""
+        command = data['command']
+        return cls(
+            name=data.get('name') or _default_name(command),
+            action=command,
+            timeout=data.get('timeout_seconds', default_timeout),
+            required=bool(data.get('required', False))
+        )
+
+
+def _default_name(action) -> str:
+    if callable(action):
+        return getattr(action, '__name__', repr(action))
+    text = action if isinstance(action, str) else ' '.join(action)
+    return text if len(text) <= 40 else text[:37] + "..."
+
+
+class HookRegistry:
+    """Acciones propias de cada instalación en puntos con nombre de un pipeline"""
+
+    def __init__(self, points: Iterable[str]):
+        self.points = tuple(points)
+        self._hooks: Dict[str, List[Hook]] = {point: [] for point in self.points}
+        self._lock = threading.Lock()
+
+    def register(self, point: str, action, name: Optional[str] = None,
+                 timeout: Optional[float] = HOOK_TIMEOUT_SECONDS, required: bool = False) -> Hook:
+        """Agrega un callable o comando; con el mismo nombre reemplaza al anterior"""
+        if point not in self._hooks:
+            raise ValueError(f"Punto de hook desconocido: {point} (válidos: {', '.join(self.points)})")
+        hook = Hook(name or _default_name(action), action, timeout, required)
+        with self._lock:
+            hooks = [h for h in self._hooks[point] if h.name != hook.name]
+            hooks.append(hook)
+            self._hooks[point] = hooks
+        return hook
+
+    def unregister(self, point: str, name: str) -> bool:
+        with self._lock:
+            hooks = self._hooks.get(point, [])
+            remaining = [h for h in hooks if h.name != name]
+            self._hooks[point] = remaining
+        return len(remaining) != len(hooks)
+
+    def hooks(self, point: str) -> List[Hook]:
+        with self._lock:
+            return list(self._hooks.get(point, ()))
+
+    def run(self, point: str, context=None, cancel_token: Optional[CancellationToken] = None,
+            env: Optional[Dict[str, str]] = None, extra: Iterable[Hook] = ()) -> List[Dict[str, Any]]:
+        """Corre en orden los hooks registrados y después los de `extra`; devuelve el tiempo de cada uno"""
+        results = []
+        for hook in self.hooks(point) + list(extra):
+            if cancel_token is not None:
+                cancel_token.check()
+            start = time.perf_counter()
+            error = None
+            try:
+                self._call(hook, context, cancel_token, env)
+            except PipelineCancelledError:
+                raise
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            seconds = time.perf_counter() - start
+            results.append({
+                'hook': hook.name,
+                'seconds': round(seconds, 3),
+                'ok': error is None,
+                'error': error
+            })
+
+            if error is None:
+                _logger.info(f"Hook {point}/{hook.name}: {seconds:.2f}s")
+                continue
+            _logger.warning(f"Hook {point}/{hook.name} falló tras {seconds:.2f}s: {error}")
+            if hook.required:
+                raise HookError(f"Hook '{hook.name}' ({point}) falló: {error}")
+        return results
+
+    def close_on_abort(self, pipeline: str, point: str, **run_kwargs) -> Callable[[], None]:
+        """Si la corrida falla o se cancela antes de llegar a `point`, lo corre igual.
+
+        Para cerrar lo que abrió el punto anterior (ej: reactivar el guardado del
+        mundo). Devuelve la función que lo desarma cuando `point` corrió normalmente.
+        """
+        subscriptions = []
+        fired = threading.Event()
+
+        def disarm():
+            for subscription in subscriptions:
+                subscription.unsubscribe()
+
+        def on_abort(event):
+            if fired.is_set():
+                return
+            fired.set()
+            disarm()
+            # El token de la corrida ya está cancelado: el cierre no debe cortarse por eso
+            kwargs = dict(run_kwargs, cancel_token=None)
+            try:
+                self.run(point, event.data.get('context'), **kwargs)
+            except Exception as e:
+                _logger.error(f"No se pudo correr {point} tras abortar {pipeline}: {e}")
+
+        subscriptions.extend([
+            event_bus.subscribe(f"{pipeline}.failed", on_abort, priority=100),
+            event_bus.subscribe(f"{pipeline}.cancelled", on_abort, priority=100),
+            event_bus.subscribe(f"{pipeline}.finished", lambda event: disarm(), priority=100)
+        ])
+        return disarm
+
+    @staticmethod
+    def _call(hook: Hook, context, cancel_token: Optional[CancellationToken],
+              env: Optional[Dict[str, str]]):
+        if callable(hook.action):
+            if hook.timeout is None:
+                return hook.action(context)
+
+            outcome: Dict[str, Any] = {}
+
+            def target():
+                try:
+                    outcome['result'] = hook.action(context)
+                except BaseException as e:
+                    outcome['error'] = e
+
+            # Como en los pasos: un callable no se puede matar, el hilo se abandona
+            thread = threading.Thread(target=target, daemon=True, name=f"hook-{hook.name}")
+            thread.start()
+            thread.join(hook.timeout)
+            if thread.is_alive():
+                raise TimeoutError(f"superó {hook.timeout:g}s")
+            if 'error' in outcome:
+                raise outcome['error']
+            return outcome.get('result')
+
+        result = run_process(
+            hook.action,
+            cancel_token,
+            timeout=hook.timeout,
+            shell=isinstance(hook.action, str),
+            capture_output=True,
+            text=True,
+            env={**os.environ, **(env or {})}
+        )
+        if result.returncode != 0:
+            detail = (result.stderr or result.stdout or "").strip().splitlines()
+            raise RuntimeError(
+                f"salió con código {result.returncode}" + (f": {detail[-1]}" if detail else "")
+            )
+        return result.stdout
+
+
+def hooks_from_config(data: Optional[Dict[str, Any]], point: str) -> List[Hook]:
+    """Hooks de comandos para `point` desde config (ej: CONFIG['backup_hooks'])"""
+    if not data:
+        return []
+    default_timeout = data.get('timeout_seconds', HOOK_TIMEOUT_SECONDS)
+    hooks = []
+    for item in data.get(point) or []:
+        if isinstance(item, str):
+            item = {'command': item}
+        try:
+            hooks.append(Hook.from_config(item, default_timeout))
+        except (KeyError, TypeError) as e:
+            _logger.warning(f"Hook inválido en {point}: {item} ({e})")
+    return hooks
+
+
+backup_hooks = HookRegistry(BACKUP_HOOK_POINTS)
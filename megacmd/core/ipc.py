@@ -0,0 +1,369 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import atexit
+import errno
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+
+SOCKET_PATH = os.path.expanduser('~/.d0ce3_addons/events.sock')
+FORWARD_PREFIXES: Tuple[str, ...] = ('backup.', 'system.')
+REMOTE_SOURCE_PREFIX = "ipc:"
+
+# Mensajes: 4 bytes big-endian con el largo + JSON utf-8
+_HEADER = struct.Struct('>I')
+MAX_FRAME_BYTES = 4 * 1024 * 1024
+SEND_TIMEOUT_SECONDS = 5.0
+RECONNECT_SECONDS = 2.0
+# Mensajes recibidos a la espera de los handlers locales; pasado el límite se descartan
+MAX_PENDING_FRAMES = 1000
+
+_logger = logging.getLogger('events.ipc')
+
+
+def _set_send_timeout(sock: socket.socket, seconds: float):
+    # Timeout solo para escrituras: settimeout() afectaría también al hilo lector
+    sec = int(seconds)
+    usec = int((seconds - sec) * 1_000_000)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, struct.pack('ll', sec, usec))
+
+
+def _close(sock: socket.socket):
+    # shutdown() despierta a los hilos bloqueados en recv/accept; close() solo no
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    try:
+        sock.close()
+    except OSError:
+        pass
+
+
+def send_frame(sock: socket.socket, payload: Dict[str, Any]):
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(body) > MAX_FRAME_BYTES:
+        raise ValueError(f"Mensaje demasiado grande: {len(body)} bytes")
+    sock.sendall(_HEADER.pack(len(body)) + body)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = sock.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def recv_frame(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    header = _recv_exact(sock, _HEADER.size)
+    if header is None:
+        return None
+    (size,) = _HEADER.unpack(header)
+    if size > MAX_FRAME_BYTES:
+        raise ValueError(f"Mensaje demasiado grande: {size} bytes")
+    body = _recv_exact(sock, size)
+    if body is None:
+        return None
+    return json.loads(body.decode('utf-8'))
+
+
+def is_remote(event) -> bool:
+    """True si el evento llegó desde otro proceso a través del broker"""
+    source = event.source
+    return bool(source) and source.startswith(REMOTE_SOURCE_PREFIX)
+
+
+class EventBroker:
+    """Broker local: reenvía cada mensaje a todos los clientes salvo al emisor"""
+
+    def __init__(self, path: str = SOCKET_PATH):
+        self.path = path
+        self._server: Optional[socket.socket] = None
+        self._clients: List[socket.socket] = []
+        self._lock = threading.Lock()
+        self._running = False
+
+    def start(self) -> bool:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            server.bind(self.path)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE or self._alive():
+                server.close()
+                return False
+            # Socket huérfano de un broker que terminó sin limpiar
+            try:
+                os.unlink(self.path)
+                server.bind(self.path)
+            except OSError:
+                server.close()
+                return False
+
+        os.chmod(self.path, 0o600)
+        server.listen(16)
+        self._server = server
+        self._running = True
+        threading.Thread(target=self._accept_loop, name="event-broker", daemon=True).start()
+        _logger.debug(f"Broker de eventos escuchando en {self.path}")
+        return True
+
+    def _alive(self) -> bool:
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.path)
+            return True
+        except OSError:
+            return False
+        finally:
+            probe.close()
+
+    def _accept_loop(self):
+        while self._running:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                break
+            _set_send_timeout(conn, SEND_TIMEOUT_SECONDS)
+            with self._lock:
+                self._clients.append(conn)
+            threading.Thread(target=self._client_loop, args=(conn,), daemon=True).start()
+
+    def _client_loop(self, conn: socket.socket):
+        try:
+            while True:
+                header = _recv_exact(conn, _HEADER.size)
+                if header is None:
+                    break
+                (size,) = _HEADER.unpack(header)
+                if size > MAX_FRAME_BYTES:
+                    break
+                body = _recv_exact(conn, size)
+                if body is None:
+                    break
+                # Reenvío sin decodificar: el broker no necesita entender el mensaje
+                self._fan_out(conn, header + body)
+        except OSError:
+            pass
+        finally:
+            self._drop(conn)
+
+    def _fan_out(self, sender: socket.socket, frame: bytes):
+        with self._lock:
+            targets = [c for c in self._clients if c is not sender]
+        for client in targets:
+            try:
+                client.sendall(frame)
+            except OSError:
+                # Cliente colgado o cerrado: se descarta para no frenar al resto
+                self._drop(client)
+
+    def _drop(self, conn: socket.socket):
+        with self._lock:
+            if conn in self._clients:
+                self._clients.remove(conn)
+        _close(conn)
+
+    def stop(self):
+        self._running = False
+        if self._server is not None:
+            _close(self._server)
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for conn in clients:
+            _close(conn)
+
+
+class EventBridge:
+    """Conecta un EventBus local al broker; si no hay broker, este proceso lo levanta"""
+
+    def __init__(self, bus, path: str = SOCKET_PATH, prefixes: Tuple[str, ...] = FORWARD_PREFIXES):
+        self.bus = bus
+        self.path = path
+        self.prefixes = tuple(prefixes)
+        self.broker: Optional[EventBroker] = None
+        self._sock: Optional[socket.socket] = None
+        self._send_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._reconnecting = False
+        self._closed = False
+        self._origin = f"{os.getpid()}"
+        # El lector solo encola: los handlers lentos no frenan la lectura del socket
+        # (si el buffer se llena, el broker corta a este cliente por timeout)
+        self._inbox: "queue.Queue[Dict[str, Any]]" = queue.Queue(MAX_PENDING_FRAMES)
+        self._dispatcher: Optional[threading.Thread] = None
+
+    @property
+    def connected(self) -> bool:
+        return self._sock is not None
+
+    def start(self) -> bool:
+        connected = self._connect()
+        self.bus.attach_bridge(self)
+        if not connected:
+            self._schedule_reconnect()
+        return connected
+
+    def _connect(self) -> bool:
+        with self._state_lock:
+            if self._closed:
+                return False
+
+            sock = self._try_connect()
+            if sock is None:
+                broker = EventBroker(self.path)
+                if broker.start():
+                    self.broker = broker
+                sock = self._try_connect()
+            if sock is None:
+                return False
+
+            _set_send_timeout(sock, SEND_TIMEOUT_SECONDS)
+            self._sock = sock
+            threading.Thread(target=self._reader, args=(sock,), name="event-bridge", daemon=True).start()
+            return True
+
+    def _try_connect(self) -> Optional[socket.socket]:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            return sock
+        except OSError:
+            sock.close()
+            return None
+
+    def forward(self, event):
+        if self._sock is None or not event.name.startswith(self.prefixes):
+            return
+
+        payload = {
+            'type': 'publish',
+            'name': event.name,
+            't': event.timestamp.timestamp(),
+            'source': f"{self._origin}:{event.source}",
+            'data': event.compact_data()
+        }
+        try:
+            with self._send_lock:
+                send_frame(self._sock, payload)
+        except (OSError, ValueError) as e:
+            _logger.warning(f"No se pudo reenviar {event.name} al broker: {e}")
+            if isinstance(e, OSError):
+                self._disconnect()
+
+    def _reader(self, sock: socket.socket):
+        try:
+            while True:
+                frame = recv_frame(sock)
+                if frame is None:
+                    break
+                if frame.get('type') != 'publish':
+                    continue
+                try:
+                    self._inbox.put_nowait(frame)
+                except queue.Full:
+                    _logger.warning(f"Cola de eventos remotos llena: se descarta {frame.get('name')}")
+                    continue
+                self._ensure_dispatcher()
+        except OSError:
+            pass
+        except Exception as e:
+            _logger.warning(f"Lector del broker terminó por un mensaje inválido: {e}")
+        finally:
+            if self._sock is sock:
+                self._disconnect()
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is not None:
+            return
+        with self._state_lock:
+            if self._dispatcher is not None:
+                return
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="event-bridge-dispatch",
+                                                daemon=True)
+            self._dispatcher.start()
+
+    def _dispatch_loop(self):
+        while not self._closed:
+            frame = self._inbox.get()
+            if frame is None:
+                break
+            try:
+                self.bus.publish_remote(
+                    frame['name'],
+                    frame.get('data') or {},
+                    timestamp=datetime.fromtimestamp(frame['t']) if frame.get('t') else None,
+                    source=f"{REMOTE_SOURCE_PREFIX}{frame.get('source', 'unknown')}"
+                )
+            except Exception as e:
+                _logger.warning(f"No se pudo entregar el evento remoto {frame.get('name')}: {e}")
+
+    def _disconnect(self):
+        with self._state_lock:
+            sock, self._sock = self._sock, None
+        if sock is not None:
+            _close(sock)
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self):
+        with self._state_lock:
+            if self._reconnecting or self._closed:
+                return
+            self._reconnecting = True
+        threading.Thread(target=self._reconnect_loop, daemon=True).start()
+
+    def _reconnect_loop(self):
+        # Si el proceso broker terminó, el primero en reconectar toma su lugar
+        while not self._closed and not self._connect():
+            time.sleep(RECONNECT_SECONDS)
+        with self._state_lock:
+            self._reconnecting = False
+
+    def close(self):
+        with self._state_lock:
+            self._closed = True
+            sock, self._sock = self._sock, None
+        if self.bus._bridge is self:
+            self.bus.detach_bridge()
+        if sock is not None:
+            _close(sock)
+        if self._dispatcher is not None:
+            try:
+                self._inbox.put_nowait(None)
+            except queue.Full:
+                pass
+        if self.broker is not None:
+            self.broker.stop()
+            self.broker = None
+
+
+_bridge: Optional[EventBridge] = None
+
+
+def connect_event_bus(bus=None, path: str = SOCKET_PATH) -> EventBridge:
+    """Une el event_bus de este proceso al de los demás procesos locales"""
+    global _bridge
+    if _bridge is not None:
+        return _bridge
+
+    if bus is None:
+        from .events import event_bus as bus
+
+    _bridge = EventBridge(bus, path)
+    _bridge.start()
+    atexit.register(_bridge.close)
+    return _bridge
@@ -0,0 +1,336 @@
+from typing import Any, Dict, Iterator, List, Optional, Union
+from collections import deque
+from collections.abc import Mapping
+from contextlib import contextmanager
+from dataclasses import is_dataclass, asdict
+from datetime import datetime
+import atexit
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+TimeBound = Union[datetime, float, None]
+
+# Cada cuánto el hilo escritor vuelca a disco los eventos pendientes
+FLUSH_INTERVAL_SECONDS = 0.5
+
+
+def pattern_matches(pattern: str, event_name: str) -> bool:
+    if pattern == event_name:
+        return True
+
+    # Soporte para wildcards
+    if '*' in pattern:
+        pattern_parts = pattern.split('.')
+        event_parts = event_name.split('.')
+
+        if len(pattern_parts) != len(event_parts):
+            return False
+
+        for p, e in zip(pattern_parts, event_parts):
+            if p != '*' and p != e:
+                return False
+
+        return True
+
+    return False
+
+
+def to_jsonable(value: Any) -> Any:
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Mapping):
+        return {str(k): to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset, deque)):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if is_dataclass(value) and not isinstance(value, type):
+        return to_jsonable(asdict(value))
+    return str(value)
+
+
+# Claves que el journal y el broker guardan solo como resumen (listados remotos)
+SUMMARIZED_KEYS = frozenset({'remote_listing'})
+MAX_COMPACT_ITEMS = 50
+
+
+def _summary(value: Any) -> Dict[str, Any]:
+    return {'omitted': type(value).__name__, 'items': len(value) if hasattr(value, '__len__') else None}
+
+
+def compact_jsonable(value: Any, max_items: int = MAX_COMPACT_ITEMS) -> Any:
+    """to_jsonable para persistir/reenviar: resume SUMMARIZED_KEYS y las colecciones largas"""
+    if isinstance(value, Mapping):
+        return {
+            str(k): _summary(v) if k in SUMMARIZED_KEYS else compact_jsonable(v, max_items)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple, set, frozenset, deque)):
+        if len(value) > max_items:
+            return _summary(value)
+        return [compact_jsonable(v, max_items) for v in value]
+    return to_jsonable(value)
+
+
+def _as_datetime(value: TimeBound) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromtimestamp(value)
+
+
+class EventJournal:
+    """Historial de eventos: anillo en memoria + log JSONL opcional con segmentos rotados.
+
+    La escritura a disco la hace un hilo aparte por lotes; varios procesos comparten
+    los segmentos y se turnan con un flock sobre LOCK_NAME para escribir y rotar.
+    """
+
+    SEGMENT_PREFIX = "events-"
+    SEGMENT_SUFFIX = ".jsonl"
+    LOCK_NAME = ".segments.lock"
+
+    def __init__(self, max_memory: int = 100):
+        self.max_memory = max_memory
+        self._ring = deque()
+        # Índice por nombre; cada deque respeta el orden de llegada del anillo
+        self._by_name: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+        self._logger = logging.getLogger('events')
+
+        self.directory: Optional[str] = None
+        self.segment_bytes = 512 * 1024
+        self.max_segments = 4
+        self._persist_patterns: Optional[List[str]] = None
+        self.flush_interval = FLUSH_INTERVAL_SECONDS
+        self._pending = deque()
+        self._write_lock = threading.Lock()
+        self._writer: Optional[threading.Thread] = None
+
+    def record(self, event, persist: bool = True):
+        with self._lock:
+            self._ring.append(event)
+            self._by_name.setdefault(event.name, deque()).append(event)
+
+            if len(self._ring) > self.max_memory:
+                old = self._ring.popleft()
+                same_name = self._by_name[old.name]
+                same_name.popleft()
+                if not same_name:
+                    del self._by_name[old.name]
+
+            if persist and self.directory is not None and self._should_persist(event.name):
+                self._pending.append(event)
+                if self._writer is None:
+                    self._start_writer()
+
+    def get_history(
+        self,
+        event_pattern: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None,
+        limit: Optional[int] = None
+    ) -> List[Any]:
+        since, until = _as_datetime(since), _as_datetime(until)
+
+        with self._lock:
+            if not event_pattern:
+                candidates = list(self._ring)
+            elif '*' not in event_pattern:
+                candidates = list(self._by_name.get(event_pattern, ()))
+            else:
+                streams = [
+                    list(events) for name, events in self._by_name.items()
+                    if pattern_matches(event_pattern, name)
+                ]
+                candidates = list(heapq.merge(*streams, key=lambda e: e.monotonic))
+
+        if since is not None or until is not None:
+            candidates = [
+                e for e in candidates
+                if (since is None or e.timestamp >= since) and (until is None or e.timestamp <= until)
+            ]
+
+        if limit is not None:
+            candidates = candidates[-limit:] if limit > 0 else []
+        return candidates
+
+    def clear(self):
+        with self._lock:
+            self._ring.clear()
+            self._by_name.clear()
+
+    def enable_persistence(
+        self,
+        directory: str,
+        segment_bytes: int = 512 * 1024,
+        max_segments: int = 4,
+        patterns: Optional[List[str]] = None
+    ):
+        # Lo pendiente va al directorio anterior antes de cambiar
+        self.flush()
+        with self._write_lock, self._lock:
+            self.directory = os.path.expanduser(directory)
+            os.makedirs(self.directory, exist_ok=True)
+            self.segment_bytes = segment_bytes
+            self.max_segments = max(1, max_segments)
+            self._persist_patterns = patterns
+
+    def disable_persistence(self):
+        self.flush()
+        with self._write_lock, self._lock:
+            self.directory = None
+
+    def _should_persist(self, event_name: str) -> bool:
+        if not self._persist_patterns:
+            return True
+        return any(pattern_matches(p, event_name) for p in self._persist_patterns)
+
+    def _segments(self) -> List[str]:
+        if not self.directory or not os.path.isdir(self.directory):
+            return []
+        names = [
+            n for n in os.listdir(self.directory)
+            if n.startswith(self.SEGMENT_PREFIX) and n.endswith(self.SEGMENT_SUFFIX)
+        ]
+        return [os.path.join(self.directory, n) for n in sorted(names, key=self._segment_number)]
+
+    def _segment_number(self, path: str) -> int:
+        name = os.path.basename(path)
+        try:
+            return int(name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+        except ValueError:
+            return 0
+
+    def _segment_path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"{self.SEGMENT_PREFIX}{seq:06d}{self.SEGMENT_SUFFIX}")
+
+    def _start_writer(self):
+        self._writer = threading.Thread(target=self._writer_loop, name="event-journal", daemon=True)
+        self._writer.start()
+        atexit.register(self.flush)
+
+    def _writer_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self):
+        """Escribe en disco los eventos pendientes (el hilo escritor lo hace cada flush_interval)"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, deque()
+                directory = self.directory
+            if not batch or directory is None:
+                return
+
+            lines = []
+            for event in batch:
+                try:
+                    lines.append(json.dumps({
+                        'n': event.name,
+                        't': event.timestamp.timestamp(),
+                        's': event.source,
+                        'd': event.compact_data()
+                    }, ensure_ascii=False, separators=(',', ':')) + "\n")
+                except Exception as e:
+                    self._logger.warning(f"No se pudo persistir evento {event.name}: {e}")
+
+            try:
+                with self._segments_lock(directory):
+                    self._write_lines(lines)
+            except Exception as e:
+                self._logger.warning(f"No se pudieron persistir {len(lines)} eventos: {e}")
+
+    @contextmanager
+    def _segments_lock(self, directory: str):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(directory, self.LOCK_NAME), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Cerrar el descriptor libera el flock
+            os.close(fd)
+
+    def _write_lines(self, lines: List[str]):
+        # El último segmento se relee en cada lote: otro proceso pudo haber rotado
+        segments = self._segments()
+        seq = self._segment_number(segments[-1]) if segments else 1
+        path = self._segment_path(seq)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+
+        f = open(path, 'a', encoding='utf-8')
+        try:
+            for line in lines:
+                line_size = len(line.encode('utf-8'))
+                if size and size + line_size > self.segment_bytes:
+                    f.close()
+                    seq += 1
+                    f = open(self._segment_path(seq), 'a', encoding='utf-8')
+                    size = 0
+                f.write(line)
+                size += line_size
+        finally:
+            f.close()
+
+        # Rotación: conservar solo los segmentos más recientes
+        for old in self._segments()[:-self.max_segments]:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+    def replay(
+        self,
+        event_pattern: Optional[str] = None,
+        since: TimeBound = None,
+        until: TimeBound = None
+    ) -> Iterator[Any]:
+        """Relee el log en disco (del más antiguo al más reciente) como objetos Event"""
+        from .events import Event
+
+        since, until = _as_datetime(since), _as_datetime(until)
+        since_ts = since.timestamp() if since else None
+        until_ts = until.timestamp() if until else None
+
+        self.flush()
+        with self._lock:
+            segments = self._segments()
+
+        for path in segments:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            raw = json.loads(line)
+                        except ValueError:
+                            # Línea truncada por un corte de proceso
+                            continue
+
+                        if event_pattern and not pattern_matches(event_pattern, raw['n']):
+                            continue
+                        if since_ts is not None and raw['t'] < since_ts:
+                            continue
+                        if until_ts is not None and raw['t'] > until_ts:
+                            continue
+
+                        yield Event(
+                            name=raw['n'],
+                            timestamp=datetime.fromtimestamp(raw['t']),
+                            data=raw.get('d') or {},
+                            source=raw.get('s')
+                        )
+            except FileNotFoundError:
+                # Segmento rotado mientras se leía
+                continue
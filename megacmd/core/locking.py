@@ -0,0 +1,225 @@
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+LOCK_DIR = os.path.expanduser('~/.d0ce3_addons/locks')
+POLL_SECONDS = 0.5
+
+# wait: espera hasta el timeout y toma el lock el primero que lo encuentre libre
+# skip: si está tomado, no espera
+# queue: espera en orden de llegada, también hasta el timeout si lo hay (sin timeout, sin límite)
+LOCK_POLICIES = ('wait', 'skip', 'queue')
+
+_logger = logging.getLogger('pipeline')
+
+
+class LockBusyError(RuntimeError):
+    """El lock está tomado por otro proceso (o hilo) y la política no permite esperar más"""
+
+    def __init__(self, name: str, holder: Optional[Dict[str, Any]]):
+        self.name = name
+        self.holder = holder
+        super().__init__(f"'{name}' en uso por {describe_holder(holder)}")
+
+
+def describe_holder(holder: Optional[Dict[str, Any]]) -> str:
+    if not holder:
+        return "otro proceso"
+    text = f"{holder.get('owner') or 'desconocido'} (PID {holder.get('pid')}"
+    if holder.get('stage'):
+        text += f", paso '{holder['stage']}'"
+    return text + ")"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except (OSError, TypeError):
+        # Sin permiso para señalarlo: existe
+        return isinstance(pid, int)
+
+
+class ProcessLock:
+    """Exclusión mutua entre procesos (y entre hilos: cada acquire abre su propio descriptor).
+
+    Con fcntl usa flock, que el kernel libera solo si el proceso muere. Sin fcntl
+    (Windows) cae a un archivo creado con O_EXCL que guarda el PID del dueño.
+    """
+
+    def __init__(self, name: str, directory: str = LOCK_DIR):
+        self.name = name
+        self.directory = directory
+        self.path = os.path.join(directory, f"{name}.lock")
+        self.holder_path = os.path.join(directory, f"{name}.holder.json")
+        self.queue_dir = os.path.join(directory, f"{name}.queue")
+        self._fd: Optional[int] = None
+        self._info: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def holder(self) -> Optional[Dict[str, Any]]:
+        """Quién tiene el lock (pid, owner, stage, since); None si está libre"""
+        try:
+            with open(self.holder_path, 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        # Un proceso que murió con el lock deja el archivo pero no el flock
+        return info if _pid_alive(info.get('pid')) else None
+
+    def acquire(self, policy: str = 'wait', timeout: Optional[float] = None, owner: Optional[str] = None,
+                stage: Optional[str] = None, cancel_token=None,
+                on_wait: Optional[Callable[[Optional[Dict[str, Any]]], None]] = None) -> bool:
+        """Toma el lock según la política; lanza LockBusyError si no lo consigue.
+
+        on_wait(holder) se llama al empezar a esperar y cada vez que el dueño cambia de paso.
+        """
+        if policy not in LOCK_POLICIES:
+            raise ValueError(f"Política de lock desconocida: {policy}")
+        if self.held:
+            raise RuntimeError(f"El lock '{self.name}' ya está tomado por esta instancia")
+
+        os.makedirs(self.directory, exist_ok=True)
+        ticket = self._take_ticket() if policy == 'queue' else None
+        # Al vencer, el finally retira el ticket: los de atrás no quedan esperando a alguien que se fue
+        limit = time.monotonic() + timeout if timeout is not None and policy != 'skip' else None
+        last_seen = None
+        try:
+            while True:
+                if (ticket is None or self._first_in_queue(ticket)) and self._try_lock():
+                    break
+
+                holder = self.holder()
+                if policy == 'skip' or (limit is not None and time.monotonic() >= limit):
+                    raise LockBusyError(self.name, holder)
+
+                seen = (holder or {}).get('pid'), (holder or {}).get('stage')
+                if on_wait is not None and seen != last_seen:
+                    on_wait(holder)
+                last_seen = seen
+
+                if cancel_token is not None:
+                    if cancel_token.wait(POLL_SECONDS):
+                        cancel_token.check()
+                else:
+                    time.sleep(POLL_SECONDS)
+        finally:
+            if ticket is not None:
+                self._remove(ticket)
+
+        self._info = {
+            'pid': os.getpid(),
+            'thread': threading.current_thread().name,
+            'owner': owner,
+            'stage': stage,
+            'since': time.time()
+        }
+        self._write_holder()
+        return True
+
+    def update_stage(self, stage: Optional[str]):
+        if not self.held:
+            return
+        self._info['stage'] = stage
+        self._write_holder()
+
+    def release(self):
+        with self._lock:
+            fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        self._remove(self.holder_path)
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        else:
+            self._remove(self.path)
+        os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def _try_lock(self) -> bool:
+        if fcntl is not None:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+        else:
+            try:
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            except FileExistsError:
+                if self.holder() is None and time.time() - os.path.getmtime(self.path) > POLL_SECONDS * 4:
+                    # Huérfano de un proceso que terminó sin liberarlo
+                    self._remove(self.path)
+                return False
+            os.write(fd, str(os.getpid()).encode())
+
+        with self._lock:
+            self._fd = fd
+        return True
+
+    def _write_holder(self):
+        tmp_path = f"{self.holder_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._info, f)
+            os.replace(tmp_path, self.holder_path)
+        except OSError as e:
+            _logger.debug(f"No se pudo actualizar el dueño de '{self.name}': {e}")
+
+    def _take_ticket(self) -> str:
+        os.makedirs(self.queue_dir, exist_ok=True)
+        ticket = os.path.join(
+            self.queue_dir, f"{time.time_ns():020d}-{os.getpid()}-{threading.get_ident()}"
+        )
+        open(ticket, 'w').close()
+        return ticket
+
+    def _queue(self) -> List[str]:
+        try:
+            names = sorted(os.listdir(self.queue_dir))
+        except OSError:
+            return []
+        alive = []
+        for name in names:
+            try:
+                pid = int(name.split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if _pid_alive(pid):
+                alive.append(os.path.join(self.queue_dir, name))
+            else:
+                self._remove(os.path.join(self.queue_dir, name))
+        return alive
+
+    def _first_in_queue(self, ticket: str) -> bool:
+        queue = self._queue()
+        return not queue or queue[0] == ticket
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -1,105 +1,1175 @@
-from typing import Callable, List, Any, Dict
+from typing import Callable, Iterator, List, Any, Dict, Optional, Set, Tuple, Type
+from collections.abc import Mapping
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from .cancellation import CancellationToken, PipelineCancelledError
 from .events import event_bus
+from .journal import to_jsonable
+from .locking import LOCK_DIR, LOCK_POLICIES, LockBusyError, ProcessLock, describe_holder
+from .profiling import StepProfiler, merge_profiles, profile_history
+import builtins
+import json
+import logging
+import os
+import queue
+import random
+import threading
 import time
 
+CHECKPOINT_DIR = os.path.expanduser('~/.d0ce3_addons/checkpoints')
+# Un checkpoint más viejo que esto ya no se reanuda (el estado del servidor cambió)
+CHECKPOINT_MAX_AGE_SECONDS = 24 * 3600
+
+# Claves de una estimación (dry run); el resto de lo que devuelve estimate va al contexto.
+# fallback_seconds solo se usa si el paso no tiene historial de perfiles
+ESTIMATE_KEYS = ('seconds', 'fallback_seconds', 'disk_bytes', 'remote_bytes', 'basis')
+
+# Corridas en curso por run_id, para poder cancelarlas desde el menú
+_active_runs: Dict[str, 'Pipeline'] = {}
+_active_lock = threading.Lock()
+
+class StepTimeoutError(TimeoutError):
+    """El paso superó su timeout; el hilo del intento se abandona, no se puede matar"""
+
+class StreamClosedError(RuntimeError):
+    """El consumidor dejó de leer el stream antes de que el productor terminara"""
+
+class StepStream:
+    """Canal acotado entre un paso generador y el paso que lo consume.
+    
+    put() bloquea mientras el buffer está lleno: el productor nunca se adelanta
+    más de `buffer` elementos al consumidor.
+    """
+    
+    _END = object()
+    POLL_SECONDS = 0.1
+    
+    def __init__(self, producer: str, buffer: int = 8,
+                 cancel_token: Optional[CancellationToken] = None):
+        self.producer = producer
+        self.items = 0
+        # Tiempo que el productor pasó esperando lugar en el buffer
+        self.blocked_seconds = 0.0
+        self.error: Optional[BaseException] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, buffer))
+        self._closed = threading.Event()
+        self._done = False
+        # Ambos lados cortan al cancelarse la corrida, aunque el paso no consulte el token
+        self._cancel_token = cancel_token
+    
+    def __iter__(self) -> 'StepStream':
+        return self
+    
+    def __next__(self):
+        while not self._done:
+            if self._cancel_token is not None:
+                self._cancel_token.check()
+            if self.error is not None:
+                raise self.error
+            if self._closed.is_set():
+                raise StreamClosedError(f"El stream de '{self.producer}' fue cerrado")
+            try:
+                item = self._queue.get(timeout=self.POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is self._END:
+                self._done = True
+                break
+            return item
+        raise StopIteration
+    
+    def put(self, item):
+        if self._cancel_token is not None:
+            self._cancel_token.check()
+        try:
+            self._queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        
+        waiting_since = time.perf_counter()
+        try:
+            while True:
+                if self._closed.is_set():
+                    raise StreamClosedError(f"El consumidor de '{self.producer}' dejó de leer")
+                if self._cancel_token is not None:
+                    self._cancel_token.check()
+                try:
+                    self._queue.put(item, timeout=self.POLL_SECONDS)
+                    return
+                except queue.Full:
+                    continue
+        finally:
+            self.blocked_seconds += time.perf_counter() - waiting_since
+    
+    def pump(self, iterable) -> Any:
+        """Vuelca el generador del productor en el canal; devuelve su valor de return"""
+        if not isinstance(iterable, Iterator):
+            raise TypeError(f"El paso '{self.producer}' alimenta un stream pero no devolvió un generador")
+        
+        try:
+            while True:
+                try:
+                    item = next(iterable)
+                except StopIteration as stop:
+                    result = stop.value
+                    break
+                self.put(item)
+                self.items += 1
+        finally:
+            # Si se cortó antes, close() corre los finally del generador
+            close = getattr(iterable, 'close', None)
+            if close is not None:
+                close()
+        
+        try:
+            self.put(self._END)
+        except StreamClosedError:
+            pass
+        return result
+    
+    def fail(self, error: BaseException):
+        self.error = error
+    
+    def close(self):
+        self._closed.set()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'items': self.items,
+            'buffer': self._queue.maxsize,
+            'blocked_seconds': round(self.blocked_seconds, 3)
+        }
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 1
+    backoff_seconds: float = 2.0
+    backoff_factor: float = 2.0
+    max_backoff_seconds: float = 300.0
+    # Variación aleatoria ±jitter sobre cada espera, para no reintentar en sincronía
+    jitter: float = 0.2
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+    # Reintentar tras un timeout lanzaría un intento nuevo con el anterior aún vivo
+    retry_timeouts: bool = False
+    
+    def should_retry(self, error: BaseException, attempt: int) -> bool:
+        if attempt >= self.max_attempts:
+            return False
+        if isinstance(error, StepTimeoutError) and not self.retry_timeouts:
+            return False
+        return isinstance(error, self.retry_on)
+    
+    def delay(self, attempt: int) -> float:
+        base = min(self.max_backoff_seconds, self.backoff_seconds * self.backoff_factor ** (attempt - 1))
+        return max(0.0, base * (1 + random.uniform(-self.jitter, self.jitter)))
+    
+    @classmethod
+    def from_config(cls, data: Optional[Dict[str, Any]]) -> Optional['RetryPolicy']:
+        """Política desde config (ej: CONFIG['retry_policies']['upload']); None si no hay"""
+        if not data:
+            return None
+        
+        retry_on = []
+        for name in data.get('retry_on') or ['Exception']:
+            exc_type = getattr(builtins, name, None)
+            if isinstance(exc_type, type) and issubclass(exc_type, BaseException):
+                retry_on.append(exc_type)
+            else:
+                logging.getLogger('pipeline').warning(f"Excepción desconocida en retry_on: {name}")
+        
+        defaults = cls()
+        return cls(
+            max_attempts=max(1, int(data.get('max_attempts', defaults.max_attempts))),
+            backoff_seconds=float(data.get('backoff_seconds', defaults.backoff_seconds)),
+            backoff_factor=float(data.get('backoff_factor', defaults.backoff_factor)),
+            max_backoff_seconds=float(data.get('max_backoff_seconds', defaults.max_backoff_seconds)),
+            jitter=float(data.get('jitter', defaults.jitter)),
+            retry_on=tuple(retry_on) or defaults.retry_on,
+            retry_timeouts=bool(data.get('retry_timeouts', defaults.retry_timeouts))
+        )
+
 @dataclass
 class PipelineStep:
     name: str
     function: Callable
     required: bool = True
+    # Claves del contexto que lee/escribe; None = sin declarar (el paso actúa como barrera)
+    reads: Optional[Tuple[str, ...]] = None
+    writes: Optional[Tuple[str, ...]] = None
+    # Orden explícito cuando la dependencia no pasa por el contexto
+    after: Tuple[str, ...] = ()
+    # Al reanudar: True si lo que produjo el paso sigue siendo válido
+    validate: Optional[Callable[['PipelineContext'], bool]] = None
+    retry: Optional[RetryPolicy] = None
+    # Timeout de reloj por intento, en segundos
+    timeout: Optional[float] = None
+    # Paso generador cuyo stream recibe como segundo argumento. Corre a la par de
+    # él y lo relanza en cada intento; lo que el productor devuelve al terminar
+    # recién llega al contexto cuando termina el consumidor
+    consumes: Optional[str] = None
+    buffer: int = 8
+    # Predicción sin efectos para execute(dry_run=True): ver ESTIMATE_KEYS
+    estimate: Optional[Callable[['PipelineContext'], Optional[Dict[str, Any]]]] = None
+    # False: al reanudar se repite siempre (ej. releer la config), sin invalidar a los que dependen de él
+    resumable: bool = True
+    
+    @property
+    def declared(self) -> bool:
+        return self.reads is not None or self.writes is not None
+
+class ContextSnapshot(Mapping):
+    """Versión inmutable del contexto: comparte las capas con él en lugar de copiarlas"""
+    
+    __slots__ = ('_layers', 'version')
+    
+    def __init__(self, layers: Tuple[dict, ...], version: int):
+        self._layers = layers
+        self.version = version
+    
+    def __getitem__(self, key: str):
+        for layer in reversed(self._layers):
+            if key in layer:
+                return layer[key]
+        raise KeyError(key)
+    
+    def __iter__(self) -> Iterator[str]:
+        seen = set()
+        for layer in reversed(self._layers):
+            for key in layer:
+                if key not in seen:
+                    seen.add(key)
+                    yield key
+    
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+    
+    def to_dict(self) -> dict:
+        data = {}
+        for layer in self._layers:
+            data.update(layer)
+        return data
+    
+    def __repr__(self):
+        return f"<ContextSnapshot v{self.version} {len(self)} claves>"
 
 class PipelineContext:
+    # Pasado este número de capas se compactan en una (una copia amortizada)
+    MAX_LAYERS = 32
+    
     def __init__(self, **initial_data):
-        self._data = initial_data
+        # Capas congeladas (nunca se modifican) + una capa abierta para set()
+        self._layers: Tuple[dict, ...] = (initial_data,) if initial_data else ()
+        self._head: dict = {}
+        self._version = 0
+        self._lock = threading.Lock()
         self._start_time = time.time()
+        # Execute lo reemplaza por el de la corrida; los pasos largos lo consultan
+        self.cancel_token = CancellationToken()
     
     def get(self, key: str, default=None):
-        return self._data.get(key, default)
+        head = self._head
+        if key in head:
+            return head[key]
+        for layer in reversed(self._layers):
+            if key in layer:
+                return layer[key]
+        return default
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._head or any(key in layer for layer in self._layers)
     
     def set(self, key: str, value):
-        self._data[key] = value
+        with self._lock:
+            self._head[key] = value
+            self._version += 1
     
     def update(self, data: dict):
-        self._data.update(data)
+        # Copia superficial solo de lo nuevo; el resto del contexto no se toca
+        with self._lock:
+            self._freeze()
+            self._push(dict(data))
+            self._version += 1
+    
+    def snapshot(self) -> ContextSnapshot:
+        """Vista de solo lectura de la versión actual, sin copiar valores"""
+        with self._lock:
+            self._freeze()
+            return ContextSnapshot(self._layers, self._version)
+    
+    def _freeze(self):
+        if self._head:
+            self._push(self._head)
+            self._head = {}
+    
+    def _push(self, layer: dict):
+        layers = self._layers + (layer,)
+        if len(layers) > self.MAX_LAYERS:
+            # Los snapshots previos conservan su tupla de capas: siguen siendo válidos
+            merged = {}
+            for old in layers:
+                merged.update(old)
+            layers = (merged,)
+        self._layers = layers
+    
+    @property
+    def version(self) -> int:
+        return self._version
     
     def to_dict(self) -> dict:
-        return self._data.copy()
+        return self.snapshot().to_dict()
     
     def elapsed_time(self) -> float:
         return time.time() - self._start_time
 
+_SINGLE_ATTEMPT = RetryPolicy()
+
 class Pipeline:
-    def __init__(self, name: str):
+    def __init__(self, name: str, max_workers: int = 4,
+                 checkpoint_dir: Optional[str] = CHECKPOINT_DIR):
         self.name = name
         self.steps: List[PipelineStep] = []
+        self.max_workers = max(1, max_workers)
+        # None desactiva los checkpoints
+        self.checkpoint_dir = checkpoint_dir
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.last_run_id: Optional[str] = None
+        self.last_profile: Dict[str, Dict[str, Any]] = {}
+        self.last_estimate: Optional[Dict[str, Any]] = None
+        self.cancel_token: Optional[CancellationToken] = None
+        self.started_at: Optional[float] = None
+        # None desactiva el historial de perfiles
+        self.history = profile_history
+        # Exclusión entre corridas (with_lock); None = sin lock
+        self.lock: Optional[ProcessLock] = None
+        self.lock_policy = 'wait'
+        self.lock_timeout: Optional[float] = None
+        self.lock_on_wait: Optional[Callable] = None
+        # Recibe el contexto de un checkpoint que se descarta (vencido o reemplazado por
+        # una corrida nueva): lo que dejó en disco ya no lo va a limpiar ningún paso
+        self.on_checkpoint_discarded: Optional[Callable[[Dict[str, Any]], None]] = None
+        self._logger = logging.getLogger('pipeline')
     
-    def add_step(self, name: str, function: Callable, required: bool = True):
-        self.steps.append(PipelineStep(name, function, required))
+    def with_lock(self, name: str, policy: str = 'wait', timeout: Optional[float] = None,
+                  on_wait: Optional[Callable] = None, directory: str = LOCK_DIR):
+        """Excluye a otras corridas que usen el mismo lock, en este u otro proceso.
+        
+        policy: 'wait' (hasta timeout), 'skip' (LockBusyError enseguida) o 'queue' (en orden de llegada, hasta timeout).
+        """
+        if policy not in LOCK_POLICIES:
+            raise ValueError(f"Política de lock desconocida: {policy}")
+        self.lock = ProcessLock(name, directory)
+        self.lock_policy = policy
+        self.lock_timeout = timeout
+        self.lock_on_wait = on_wait
         return self
     
-    def execute(self, **initial_context) -> Dict[str, Any]:
-        context = PipelineContext(**initial_context)
+    def add_step(self, name: str, function: Callable, required: bool = True,
+                 reads: Optional[Tuple[str, ...]] = None, writes: Optional[Tuple[str, ...]] = None,
+                 after: Tuple[str, ...] = (), validate: Optional[Callable] = None,
+                 retry: Optional[RetryPolicy] = None, timeout: Optional[float] = None,
+                 consumes: Optional[str] = None, buffer: int = 8,
+                 estimate: Optional[Callable] = None, resumable: bool = True):
+        self.steps.append(PipelineStep(
+            name, function, required,
+            tuple(reads) if reads is not None else None,
+            tuple(writes) if writes is not None else None,
+            tuple(after),
+            validate,
+            retry,
+            timeout if timeout and timeout > 0 else None,
+            consumes,
+            max(1, buffer),
+            estimate,
+            resumable
+        ))
+        return self
+    
+    def execute(self, resume: bool = False, run_id: Optional[str] = None,
+                cancel_token: Optional[CancellationToken] = None,
+                deadline_seconds: Optional[float] = None, dry_run: bool = False,
+                **initial_context) -> Dict[str, Any]:
+        """
+        resume: retoma el último checkpoint de este pipeline (o el de run_id) y
+        saltea los pasos cuyo resultado sigue siendo válido.
+        deadline_seconds: plazo total; al vencer la corrida se cancela igual que con cancel().
+        Con with_lock, el plazo incluye la espera del lock. Si además se pasa cancel_token,
+        la corrida usa un token hijo: se corta con el que se pasó o al vencer el plazo.
+        dry_run: no corre los pasos; devuelve la estimación de _estimate (sin lock ni checkpoints).
+        """
+        if dry_run:
+            return self._estimate(initial_context)
+        
+        if cancel_token is None:
+            token = CancellationToken(deadline_seconds)
+        else:
+            # Un hijo y no el token ajeno: release() al terminar no toca el plazo de quien llama
+            token = cancel_token.child(deadline_seconds)
+        if self.lock is None:
+            return self._execute(resume, run_id, token, initial_context)
+        
+        try:
+            self._acquire_lock(token)
+        except BaseException:
+            token.release()
+            raise
+        try:
+            return self._execute(resume, run_id, token, initial_context)
+        finally:
+            self.lock.release()
+    
+    def _acquire_lock(self, token: CancellationToken):
+        def on_wait(holder):
+            self._logger.info(
+                f"{self.name} espera el lock '{self.lock.name}', en uso por {describe_holder(holder)}"
+            )
+            event_bus.publish(
+                f"{self.name}.lock_waiting",
+                pipeline=self.name,
+                lock=self.lock.name,
+                policy=self.lock_policy,
+                holder=holder
+            )
+            if self.lock_on_wait is not None:
+                self.lock_on_wait(holder)
+        
+        try:
+            self.lock.acquire(self.lock_policy, self.lock_timeout, owner=self.name,
+                              cancel_token=token, on_wait=on_wait)
+        except LockBusyError as e:
+            event_bus.publish(
+                f"{self.name}.lock_busy",
+                pipeline=self.name,
+                lock=self.lock.name,
+                policy=self.lock_policy,
+                holder=e.holder
+            )
+            raise
+        except KeyboardInterrupt as e:
+            token.cancel("Interrumpido por el usuario (Ctrl+C)")
+            raise PipelineCancelledError(token.reason) from e
+    
+    def _execute(self, resume: bool, run_id: Optional[str], token: CancellationToken,
+                 initial_context: Dict[str, Any]) -> Dict[str, Any]:
+        checkpoint = self._load_checkpoint(run_id) if resume else None
+        if checkpoint is None:
+            run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+            # Una corrida nueva invalida los checkpoints anteriores de este pipeline
+            self._clear_checkpoints()
+            context = PipelineContext(**initial_context)
+            completed: Dict[str, List[str]] = {}
+        else:
+            run_id = checkpoint['run_id']
+            context = PipelineContext(**checkpoint['context'])
+            context.update(initial_context)
+            completed = checkpoint['completed']
+        
+        context.cancel_token = token
+        self.cancel_token = token
+        self.started_at = time.time()
+        self.last_run_id = run_id
+        with _active_lock:
+            _active_runs[run_id] = self
+        timings: Dict[int, Tuple[float, float]] = {}
+        self.last_profile = {}
+        status = 'failed'
+        deps, waves, feeds = self._plan()
+        skipped = self._resumable(deps, feeds, completed, context) if checkpoint else set()
+        completed = {self.steps[i].name: completed[self.steps[i].name] for i in skipped}
+        self.last_report = None
         
         event_bus.publish(
             f"{self.name}.started",
             pipeline=self.name,
-            initial_context=context.to_dict()
+            run_id=run_id,
+            resumed_steps=[self.steps[i].name for i in sorted(skipped)],
+            initial_context=context.snapshot()
         )
         
         try:
-            for step in self.steps:
-                self._execute_step(step, context)
+            for wave in waves:
+                token.check()
+                for i in wave:
+                    if i in skipped:
+                        event_bus.publish(
+                            f"{self.name}.step.{self.steps[i].name}.skipped",
+                            step_name=self.steps[i].name,
+                            run_id=run_id
+                        )
+                # Un productor corre dentro del intento de su consumidor
+                pending = [i for i in wave if i not in skipped and i not in feeds]
+                if pending:
+                    self._execute_wave(pending, context, timings, completed)
+                    self._save_checkpoint(run_id, context, completed)
+            
+            self._remove_checkpoint(run_id)
             
             duration = context.elapsed_time()
+            self.last_report = self._critical_path(deps, timings, duration)
+            status = 'success'
             event_bus.publish(
                 f"{self.name}.success",
                 pipeline=self.name,
-                result=context.to_dict(),
-                duration_seconds=duration
+                result=context.snapshot(),
+                duration_seconds=duration,
+                critical_path=self.last_report,
+                step_profiles=self.last_profile
             )
             
             return context.to_dict()
-            
+        
+        except (PipelineCancelledError, KeyboardInterrupt) as e:
+            status = 'cancelled'
+            raise self._cancelled(e, token, run_id, completed, context)
+        
         except Exception as e:
+            if token.cancelled:
+                # El paso cortó con su propio error (ej: proceso hijo terminado)
+                status = 'cancelled'
+                raise self._cancelled(e, token, run_id, completed, context)
             event_bus.publish(
                 f"{self.name}.failed",
                 pipeline=self.name,
                 error=str(e),
                 error_type=type(e).__name__,
-                context=context.to_dict()
+                context=context.snapshot()
             )
             raise
-            
+        
         finally:
+            token.release()
+            with _active_lock:
+                _active_runs.pop(run_id, None)
             duration = context.elapsed_time()
+            if self.last_report is None:
+                self.last_report = self._critical_path(deps, timings, duration)
+            if self.history is not None and self.last_profile:
+                self.history.append({
+                    'pipeline': self.name,
+                    'run_id': run_id,
+                    'timestamp': time.time(),
+                    'status': status,
+                    'wall_seconds': round(duration, 3),
+                    'steps': self.last_profile
+                })
             event_bus.publish(
                 f"{self.name}.finished",
                 pipeline=self.name,
                 duration_seconds=duration
             )
     
-    def _execute_step(self, step: PipelineStep, context: PipelineContext):
+    def _estimate(self, initial_context: Dict[str, Any]) -> Dict[str, Any]:
+        """Predice duración, disco y espacio remoto de cada paso sin ejecutarlo.
+        
+        Los pasos con estimate aportan su predicción y lo que el resto necesita del
+        contexto; los demás usan la mediana de su historial de perfiles.
+        """
+        context = PipelineContext(**initial_context)
+        history = self.history.summarize(self.name) if self.history is not None else {}
+        deps, waves, _ = self._plan()
+        timings: Dict[int, Tuple[float, float]] = {}
+        steps: Dict[str, Dict[str, Any]] = {}
+        unknown: List[str] = []
+        disk = disk_peak = remote = 0
+        
+        for wave in waves:
+            # En orden de declaración: el productor de un stream se estima antes que su consumidor
+            for i in wave:
+                step = self.steps[i]
+                predicted = self._estimate_step(step, context, history.get(step.name))
+                steps[step.name] = predicted
+                if predicted['seconds'] is None:
+                    unknown.append(step.name)
+                timings[i] = (0.0, predicted['seconds'] or 0.0)
+                disk += predicted['disk_bytes']
+                disk_peak = max(disk_peak, disk)
+                remote += predicted['remote_bytes']
+        
+        critical = self._critical_path(deps, timings, 0.0)
+        self.last_estimate = {
+            'dry_run': True,
+            'pipeline': self.name,
+            'seconds': critical['path_seconds'],
+            'serial_seconds': critical['serial_seconds'],
+            'path': critical['path'],
+            'disk_peak_bytes': disk_peak,
+            'disk_bytes': disk,
+            'remote_bytes': remote,
+            'unknown_steps': unknown,
+            'steps': steps,
+            'context': context.to_dict()
+        }
+        return self.last_estimate
+    
+    def _estimate_step(self, step: PipelineStep, context: PipelineContext,
+                       past: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        predicted: Dict[str, Any] = {}
+        measured = None
+        if step.estimate is not None:
+            start = time.perf_counter()
+            try:
+                result = step.estimate(context)
+            except Exception as e:
+                # Un paso requerido que ya no puede estimarse fallaría también de verdad
+                if step.required:
+                    raise
+                self._logger.warning(f"No se pudo estimar '{step.name}': {e}")
+                result = None
+            if step.estimate is step.function:
+                # El paso es su propia estimación (no tiene efectos): lo medido es lo que tarda
+                measured = time.perf_counter() - start
+            if isinstance(result, dict):
+                result = dict(result)
+                predicted = {key: result.pop(key) for key in ESTIMATE_KEYS if key in result}
+                self._merge(step, result or None, context)
+        
+        if predicted.get('seconds') is None and past and past.get('wall_p50') is not None:
+            predicted['seconds'] = past['wall_p50']
+            if 'fallback_seconds' in predicted or not predicted.get('basis'):
+                predicted['basis'] = f"historial ({past['runs']} corridas)"
+        elif predicted.get('seconds') is None:
+            # Sin historial: lo que el paso dedujo (ej. del inventario), o lo medido si se estimó a sí mismo
+            fallback = predicted.get('fallback_seconds')
+            predicted['seconds'] = fallback if fallback is not None else measured
+            if measured is not None and fallback is None:
+                predicted['basis'] = predicted.get('basis') or "medido en el dry run"
+        
+        return {
+            'seconds': round(predicted['seconds'], 3) if predicted.get('seconds') is not None else None,
+            'disk_bytes': int(predicted.get('disk_bytes') or 0),
+            'remote_bytes': int(predicted.get('remote_bytes') or 0),
+            'basis': predicted.get('basis')
+        }
+    
+    def cancel(self, reason: str = "Cancelado por el usuario") -> bool:
+        """Pide cortar la corrida en curso; False si no hay ninguna o ya se había cancelado"""
+        token = self.cancel_token
+        if token is None or self.last_run_id not in _active_runs:
+            return False
+        return token.cancel(reason)
+    
+    def _cancelled(self, error: BaseException, token: CancellationToken, run_id: str,
+                   completed: Dict[str, List[str]], context: PipelineContext) -> PipelineCancelledError:
+        if isinstance(error, KeyboardInterrupt):
+            token.cancel("Interrumpido por el usuario (Ctrl+C)")
+        reason = token.reason or str(error)
+        self._logger.warning(f"Pipeline {self.name} cancelado: {reason}")
+        # El checkpoint de las olas terminadas queda: la próxima corrida puede retomarlo
+        event_bus.publish(
+            f"{self.name}.cancelled",
+            pipeline=self.name,
+            run_id=run_id,
+            reason=reason,
+            deadline_exceeded=token.deadline_exceeded,
+            completed_steps=sorted(completed),
+            context=context.snapshot()
+        )
+        if isinstance(error, PipelineCancelledError):
+            return error
+        cancelled = PipelineCancelledError(reason, token.deadline_exceeded)
+        cancelled.__cause__ = error
+        return cancelled
+    
+    @staticmethod
+    def _depends(step: PipelineStep, earlier: PipelineStep) -> bool:
+        if not step.declared or not earlier.declared or earlier.name in step.after:
+            return True
+        
+        # Un resultado que no es dict se guarda bajo el nombre del paso
+        reads = set(step.reads or ())
+        writes = set(step.writes or ()) | {step.name}
+        earlier_reads = set(earlier.reads or ())
+        earlier_writes = set(earlier.writes or ()) | {earlier.name}
+        
+        return bool(
+            reads & earlier_writes         # lee lo que el anterior produce
+            or writes & earlier_writes     # ambos escriben la misma clave
+            or writes & earlier_reads      # pisaría algo que el anterior todavía lee
+        )
+    
+    def _plan(self) -> Tuple[Dict[int, Set[int]], List[List[int]], Dict[int, int]]:
+        """Agrupa los pasos en olas: cada ola solo depende de olas anteriores.
+        
+        Un stream (productor -> consumidor) va entero en la ola de su último consumidor.
+        """
+        deps: Dict[int, Set[int]] = {}
+        feeds: Dict[int, int] = {}
+        for i, step in enumerate(self.steps):
+            deps[i] = {j for j in range(i) if self._depends(step, self.steps[j])}
+            source = self._source_of(i)
+            if source is None:
+                continue
+            if source in feeds:
+                raise ValueError(
+                    f"'{self.steps[source].name}' ya alimenta a '{self.steps[feeds[source]].name}': "
+                    f"un stream tiene un solo consumidor"
+                )
+            deps[i].add(source)
+            feeds[source] = i
+        
+        def host(i: int) -> int:
+            while i in feeds:
+                i = feeds[i]
+            return i
+        
+        levels: Dict[int, int] = {}
+        visiting: Set[int] = set()
+        
+        def level(i: int) -> int:
+            h = host(i)
+            if h in levels:
+                return levels[h]
+            if h in visiting:
+                raise ValueError(f"Dependencia circular alrededor del stream de '{self.steps[h].name}'")
+            visiting.add(h)
+            members = [h] + self._producers(h)
+            group_deps = {host(j) for m in members for j in deps[m]} - {h}
+            levels[h] = 1 + max((level(j) for j in group_deps), default=-1)
+            visiting.discard(h)
+            return levels[h]
+        
+        step_levels = [level(i) for i in range(len(self.steps))]
+        waves: List[List[int]] = [[] for _ in range(max(step_levels, default=-1) + 1)]
+        for i, lvl in enumerate(step_levels):
+            waves[lvl].append(i)
+        return deps, waves, feeds
+    
+    def _source_of(self, index: int) -> Optional[int]:
+        name = self.steps[index].consumes
+        if name is None:
+            return None
+        for j in range(index):
+            if self.steps[j].name == name:
+                return j
+        raise ValueError(f"El paso '{self.steps[index].name}' consume '{name}', que no está declarado antes")
+    
+    def _producers(self, index: int) -> List[int]:
+        """Pasos que alimentan a este, directa o indirectamente (cadena de streams)"""
+        chain = []
+        source = self._source_of(index)
+        while source is not None:
+            chain.append(source)
+            source = self._source_of(source)
+        return sorted(chain)
+    
+    def _execute_wave(self, wave: List[int], context: PipelineContext,
+                      timings: Dict[int, Tuple[float, float]], completed: Dict[str, List[str]]):
+        # Resultados de los productores de streams, que corren fuera del pool
+        stream_results: Dict[int, Any] = {}
+        if len(wave) == 1:
+            outcomes = [self._run_step(wave[0], context, timings, stream_results)]
+        else:
+            workers = min(self.max_workers, len(wave))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.name) as pool:
+                futures = [pool.submit(self._run_step, i, context, timings, stream_results) for i in wave]
+                try:
+                    outcomes = [f.result() for f in futures]
+                except KeyboardInterrupt:
+                    # Los pasos en paralelo se enteran por el token en su próximo chequeo
+                    context.cancel_token.cancel("Interrumpido por el usuario (Ctrl+C)")
+                    raise
+        
+        # Merge determinista: en orden de declaración y recién al cerrar la ola,
+        # así ningún paso ve resultados parciales de otro que corre en paralelo
+        error = None
+        for i, (result, exc) in zip(wave, outcomes):
+            step = self.steps[i]
+            if exc is None:
+                members = [(j, stream_results.get(j)) for j in self._producers(i)] + [(i, result)]
+                for j, member_result in members:
+                    self._merge(self.steps[j], member_result, context)
+                    completed[self.steps[j].name] = (
+                        sorted(member_result) if isinstance(member_result, dict)
+                        else [self.steps[j].name] if member_result is not None else []
+                    )
+            elif (step.required or context.cancel_token.cancelled) and error is None:
+                # Lo que sí terminó en esta ola queda guardado para reanudar
+                self._save_checkpoint(self.last_run_id, context, completed)
+                error = exc
+        
+        if error is not None:
+            raise error
+    
+    def _run_step(self, index: int, context: PipelineContext,
+                  timings: Dict[int, Tuple[float, float]], stream_results: Dict[int, Any]):
+        step = self.steps[index]
         step_event_prefix = f"{self.name}.step.{step.name}"
         
         event_bus.publish(f"{step_event_prefix}.started", step_name=step.name)
+        if self.lock is not None:
+            self.lock.update_stage(step.name)
         
+        policy = step.retry or _SINGLE_ATTEMPT
+        token = context.cancel_token
+        attempt = 1
+        profiles: List[StepProfiler] = []
+        start = time.time()
+        while True:
+            profiler = StepProfiler()
+            profiles.append(profiler)
+            try:
+                token.check()
+                result = self._attempt(index, context, profiler, timings, stream_results)
+                break
+            except Exception as e:
+                if token.cancelled:
+                    timings[index] = (start, time.time())
+                    event_bus.publish(
+                        f"{step_event_prefix}.cancelled",
+                        step_name=step.name,
+                        reason=token.reason,
+                        attempts=attempt,
+                        profile=self._record_profile(step, profiles, attempt)
+                    )
+                    return None, e
+                
+                if policy.should_retry(e, attempt):
+                    delay = policy.delay(attempt)
+                    event_bus.publish(
+                        f"{step_event_prefix}.retrying",
+                        step_name=step.name,
+                        attempt=attempt,
+                        max_attempts=policy.max_attempts,
+                        error=str(e),
+                        error_type=type(e).__name__,
+                        delay_seconds=round(delay, 2)
+                    )
+                    # Un cancel durante la espera se ve en el próximo intento
+                    token.wait(delay)
+                    attempt += 1
+                    continue
+                
+                timings[index] = (start, time.time())
+                profile = self._record_profile(step, profiles, attempt)
+                event_bus.publish(
+                    f"{step_event_prefix}.failed",
+                    step_name=step.name,
+                    error=str(e),
+                    attempts=attempt,
+                    profile=profile
+                )
+                
+                if not step.required:
+                    logging.warning(f"Paso '{step.name}' falló pero no es crítico: {e}")
+                return None, e
+        
+        timings[index] = (start, time.time())
+        profile = self._record_profile(step, profiles, attempt)
+        event_bus.publish(
+            f"{step_event_prefix}.success",
+            step_name=step.name,
+            # Vista de solo lectura: un handler no puede alterar lo que se mergea al contexto
+            result=MappingProxyType(result) if isinstance(result, dict) else result,
+            attempts=attempt,
+            profile=profile
+        )
+        return result, None
+    
+    def _record_profile(self, step: PipelineStep, profiles: List[StepProfiler], attempts: int) -> Dict[str, Any]:
+        profile = merge_profiles(profiles)
+        profile['attempts'] = attempts
+        self.last_profile[step.name] = profile
+        return profile
+    
+    def _attempt(self, index: int, context: PipelineContext, profiler: StepProfiler,
+                 timings: Dict[int, Tuple[float, float]], stream_results: Dict[int, Any],
+                 outlet: Optional[StepStream] = None):
+        step = self.steps[index]
+        source = self._source_of(index)
+        if source is None:
+            return self._call_step(step, context, profiler, outlet=outlet)
+        
+        # Cada intento relanza al productor: un stream no se puede rebobinar
+        stream = StepStream(self.steps[source].name, step.buffer, context.cancel_token)
+        feeder = threading.Thread(
+            target=self._feed,
+            args=(source, stream, context, timings, stream_results),
+            name=f"{self.name}.{self.steps[source].name}",
+            daemon=True
+        )
+        feeder.start()
         try:
-            result = step.function(context)
-            
-            if result is not None:
-                if isinstance(result, dict):
-                    context.update(result)
-                else:
-                    context.set(step.name, result)
-            
-            event_bus.publish(f"{step_event_prefix}.success", step_name=step.name, result=result)
-            
-        except Exception as e:
-            event_bus.publish(f"{step_event_prefix}.failed", step_name=step.name, error=str(e))
-            
-            if step.required:
-                raise
+            result = self._call_step(step, context, profiler, stream, outlet)
+        finally:
+            # Si el consumidor terminó antes, el productor se corta en su próximo put
+            stream.close()
+            feeder.join(step.timeout)
+        
+        error = stream.error
+        if error is not None and not isinstance(error, StreamClosedError) and self.steps[source].required:
+            raise error
+        return result
+    
+    def _feed(self, index: int, stream: StepStream, context: PipelineContext,
+              timings: Dict[int, Tuple[float, float]], stream_results: Dict[int, Any]):
+        step = self.steps[index]
+        step_event_prefix = f"{self.name}.step.{step.name}"
+        
+        event_bus.publish(f"{step_event_prefix}.started", step_name=step.name)
+        
+        profiler = StepProfiler()
+        start = time.time()
+        try:
+            result = self._attempt(index, context, profiler, timings, stream_results, outlet=stream)
+        except BaseException as e:
+            stream.fail(e)
+            timings[index] = (start, time.time())
+            outcome = "cancelled" if context.cancel_token.cancelled else "failed"
+            event_bus.publish(
+                f"{step_event_prefix}.{outcome}",
+                step_name=step.name,
+                error=str(e),
+                attempts=1,
+                profile=self._record_profile(step, [profiler], 1),
+                stream=stream.stats()
+            )
+            return
+        
+        timings[index] = (start, time.time())
+        stream_results[index] = result
+        event_bus.publish(
+            f"{step_event_prefix}.success",
+            step_name=step.name,
+            result=MappingProxyType(result) if isinstance(result, dict) else result,
+            attempts=1,
+            profile=self._record_profile(step, [profiler], 1),
+            stream=stream.stats()
+        )
+    
+    def _call_step(self, step: PipelineStep, context: PipelineContext, profiler: StepProfiler,
+                   stream: Optional[StepStream] = None, outlet: Optional[StepStream] = None):
+        # El perfilador corre en el hilo del paso: CPU e I/O se miden por hilo
+        def run():
+            with profiler:
+                result = step.function(context, stream) if stream is not None else step.function(context)
+                if outlet is not None:
+                    # El generador avanza en este hilo: lo que produce se mide en este paso
+                    result = outlet.pump(result)
+                return result
+        
+        if step.timeout is None:
+            return run()
+        
+        outcome: Dict[str, Any] = {}
+        
+        def target():
+            try:
+                outcome['result'] = run()
+            except BaseException as e:
+                outcome['error'] = e
+        
+        worker = threading.Thread(target=target, name=f"{self.name}.{step.name}", daemon=True)
+        worker.start()
+        limit = time.monotonic() + step.timeout
+        token = context.cancel_token
+        while worker.is_alive() and time.monotonic() < limit:
+            worker.join(min(StepStream.POLL_SECONDS, max(0.0, limit - time.monotonic())))
+            if token.cancelled and worker.is_alive():
+                # Igual que con el timeout: el hilo se abandona si el paso no coopera
+                token.check()
+        if worker.is_alive():
+            raise StepTimeoutError(f"Paso '{step.name}' superó el timeout de {step.timeout:g}s")
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome.get('result')
+    
+    def _merge(self, step: PipelineStep, result: Any, context: PipelineContext):
+        if result is None:
+            return
+        
+        if not isinstance(result, dict):
+            context.set(step.name, result)
+            return
+        
+        if step.writes is not None:
+            undeclared = set(result) - set(step.writes)
+            if undeclared:
+                self._logger.debug(
+                    f"Paso '{step.name}' escribió claves no declaradas: {sorted(undeclared)}"
+                )
+        context.update(result)
+    
+    def _resumable(self, deps: Dict[int, Set[int]], feeds: Dict[int, int],
+                   completed: Dict[str, List[str]], context: PipelineContext) -> Set[int]:
+        """Pasos del checkpoint que no hace falta repetir"""
+        skipped: Set[int] = set()
+        # Se repiten igual, pero para sus dependientes cuentan como vigentes
+        refresh = {i for i, step in enumerate(self.steps) if not step.resumable}
+        for i, step in enumerate(self.steps):
+            if i in refresh:
+                skipped.add(i)
+                continue
+            keys = completed.get(step.name)
+            if keys is None or any(k not in context for k in keys):
+                # No terminó, o produjo algo que no sobrevive al checkpoint (no es JSON)
+                continue
+            if not deps[i] <= skipped:
+                # Se repite algo de lo que depende: su resultado ya no sirve
+                continue
+            if step.validate is not None:
+                try:
+                    if not step.validate(context):
+                        continue
+                except Exception as e:
+                    self._logger.warning(f"No se pudo validar '{step.name}' del checkpoint: {e}")
+                    continue
+            skipped.add(i)
+        
+        # Un stream se repite entero: si su consumidor corre, el productor también
+        changed = True
+        while changed:
+            changed = False
+            for i in sorted(skipped):
+                if (i in feeds and feeds[i] not in skipped) or not deps[i] <= skipped:
+                    skipped.discard(i)
+                    changed = True
+        return skipped - refresh
+    
+    def _checkpoint_path(self, run_id: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{self.name}.{run_id}.json")
+    
+    def _checkpoints(self) -> List[str]:
+        if not self.checkpoint_dir or not os.path.isdir(self.checkpoint_dir):
+            return []
+        prefix = f"{self.name}."
+        paths = [
+            os.path.join(self.checkpoint_dir, n) for n in os.listdir(self.checkpoint_dir)
+            if n.startswith(prefix) and n.endswith('.json') and '.' not in n[len(prefix):-5]
+        ]
+        return sorted(paths, key=os.path.getmtime)
+    
+    def _load_checkpoint(self, run_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not self.checkpoint_dir:
+            return None
+        
+        paths = [self._checkpoint_path(run_id)] if run_id else self._checkpoints()[-1:]
+        for path in paths:
+            try:
+                if time.time() - os.path.getmtime(path) > CHECKPOINT_MAX_AGE_SECONDS:
+                    self._logger.info(f"Checkpoint vencido, se descarta: {path}")
+                    self._discard_checkpoint(path)
+                    return None
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('pipeline') == self.name:
+                    return data
+            except (OSError, ValueError) as e:
+                self._logger.warning(f"No se pudo leer checkpoint {path}: {e}")
+        return None
+    
+    def _save_checkpoint(self, run_id: str, context: PipelineContext, completed: Dict[str, List[str]]):
+        if not self.checkpoint_dir:
+            return
+        
+        # Solo valores que vuelven idénticos de JSON; lo demás se recalcula al reanudar
+        data = {}
+        for key, value in context.to_dict().items():
+            try:
+                if to_jsonable(value) == value:
+                    data[key] = value
+            except Exception:
+                pass
+        
+        payload = {
+            'pipeline': self.name,
+            'run_id': run_id,
+            'updated': time.time(),
+            'completed': completed,
+            'context': data
+        }
+        path = self._checkpoint_path(run_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            self._logger.warning(f"No se pudo guardar checkpoint de {self.name}: {e}")
+    
+    def _remove_checkpoint(self, run_id: str):
+        if not self.checkpoint_dir:
+            return
+        try:
+            os.remove(self._checkpoint_path(run_id))
+        except OSError:
+            pass
+    
+    def _clear_checkpoints(self):
+        for path in self._checkpoints():
+            self._discard_checkpoint(path)
+    
+    def _discard_checkpoint(self, path: str):
+        if self.on_checkpoint_discarded is not None:
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.on_checkpoint_discarded(data.get('context') or {})
+            except Exception as e:
+                self._logger.warning(f"No se pudo limpiar lo que dejó el checkpoint {path}: {e}")
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def _critical_path(self, deps: Dict[int, Set[int]], timings: Dict[int, Tuple[float, float]],
+                       wall_seconds: float) -> Dict[str, Any]:
+        """Cadena de dependencias más larga según lo que tardó cada paso"""
+        durations = {i: end - start for i, (start, end) in timings.items()}
+        finish: Dict[int, float] = {}
+        previous: Dict[int, Optional[int]] = {}
+        
+        begin: Dict[int, float] = {}
+        
+        for i in range(len(self.steps)):
+            if i not in durations:
+                continue
+            source = self._source_of(i)
+            ran = [j for j in deps[i] if j in finish and j != source]
+            before = max(ran, key=finish.__getitem__) if ran else None
+            begin[i] = finish[before] if before is not None else 0.0
+            if source in finish:
+                # Arranca junto con su productor y no puede terminar antes que él
+                begin[i] = max(begin[i], begin[source])
+                finish[i] = max(begin[i] + durations[i], finish[source])
+                previous[i] = source
             else:
-                import logging
-                logging.warning(f"Paso '{step.name}' falló pero no es crítico: {e}")
\ No newline at end of file
+                finish[i] = begin[i] + durations[i]
+                previous[i] = before
+        
+        path: List[int] = []
+        node = max(finish, key=finish.__getitem__) if finish else None
+        while node is not None:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+        
+        return {
+            'path': [self.steps[i].name for i in path],
+            'path_seconds': round(finish[path[-1]], 3) if path else 0.0,
+            'bottleneck': self.steps[max(path, key=durations.__getitem__)].name if path else None,
+            'wall_seconds': round(wall_seconds, 3),
+            'serial_seconds': round(sum(durations.values()), 3),
+            'steps': {self.steps[i].name: round(durations[i], 3) for i in sorted(durations)}
+        }
+
+def active_runs() -> List[Dict[str, Any]]:
+    """Corridas en curso de este proceso"""
+    with _active_lock:
+        runs = list(_active_runs.items())
+    return [
+        {
+            'pipeline': pipeline.name,
+            'run_id': run_id,
+            'started_at': pipeline.started_at,
+            'cancelling': bool(pipeline.cancel_token and pipeline.cancel_token.cancelled)
+        }
+        for run_id, pipeline in runs
+    ]
+
+def cancel_runs(prefix: Optional[str] = None, reason: str = "Cancelado por el usuario") -> int:
+    """Cancela las corridas cuyo pipeline empieza con `prefix` (todas si es None)"""
+    with _active_lock:
+        pipelines = [p for p in _active_runs.values() if prefix is None or p.name.startswith(prefix)]
+    return sum(1 for pipeline in pipelines if pipeline.cancel(reason))
\ No newline at end of file
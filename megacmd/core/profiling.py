@@ -0,0 +1,255 @@
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+PROFILE_HISTORY_FILE = os.path.expanduser('~/.d0ce3_addons/pipeline_profiles.jsonl')
+RSS_SAMPLE_SECONDS = 0.2
+
+_logger = logging.getLogger('pipeline')
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Percentil por rango más cercano; None si no hay valores"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _current_rss() -> Optional[int]:
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # Sin /proc solo queda el máximo histórico del proceso (KB en Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def _thread_io() -> Optional[Dict[str, int]]:
+    # Contadores del hilo actual: con pasos en paralelo no se mezclan entre sí
+    try:
+        counters = {}
+        with open('/proc/thread-self/io', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                counters[key] = int(value)
+        return {'read': counters.get('rchar', 0), 'written': counters.get('wchar', 0)}
+    except (OSError, ValueError):
+        return None
+
+
+class _RssSampler:
+    """Un solo hilo muestrea el RSS mientras haya pasos perfilándose"""
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self._active: List['StepProfiler'] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profiler: 'StepProfiler'):
+        with self._lock:
+            self._active.append(profiler)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profiler: 'StepProfiler'):
+        with self._lock:
+            if profiler in self._active:
+                self._active.remove(profiler)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                active = list(self._active)
+            rss = _current_rss()
+            for profiler in active:
+                profiler.observe_rss(rss)
+            time.sleep(self.interval)
+
+
+_sampler = _RssSampler()
+
+
+class StepProfiler:
+    """Tiempo de reloj, CPU del hilo, pico de RSS y bytes leídos/escritos de un paso.
+
+    Debe usarse en el mismo hilo que ejecuta el paso: CPU e I/O se miden por hilo.
+    """
+
+    def __init__(self):
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss = None
+        self.bytes_read = None
+        self.bytes_written = None
+        self._start = None
+        self._cpu_start = None
+        self._io_start = None
+
+    def observe_rss(self, rss: Optional[int]):
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def __enter__(self):
+        self._io_start = _thread_io()
+        self._cpu_start = time.thread_time()
+        self.observe_rss(_current_rss())
+        _sampler.add(self)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_seconds = time.perf_counter() - self._start
+        self.cpu_seconds = time.thread_time() - self._cpu_start
+        _sampler.remove(self)
+        self.observe_rss(_current_rss())
+        io_end = _thread_io()
+        if self._io_start is not None and io_end is not None:
+            self.bytes_read = io_end['read'] - self._io_start['read']
+            self.bytes_written = io_end['written'] - self._io_start['written']
+        return False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'wall_seconds': round(self.wall_seconds, 3),
+            'cpu_seconds': round(self.cpu_seconds, 3),
+            'peak_rss_mb': round(self.peak_rss / (1024 * 1024), 1) if self.peak_rss else None,
+            'bytes_read': self.bytes_read,
+            'bytes_written': self.bytes_written
+        }
+
+
+def merge_profiles(profiles: List[StepProfiler]) -> Dict[str, Any]:
+    """Suma los intentos de un paso; el pico de RSS es el máximo entre ellos"""
+    merged = StepProfiler()
+    for profiler in profiles:
+        merged.wall_seconds += profiler.wall_seconds
+        merged.cpu_seconds += profiler.cpu_seconds
+        merged.observe_rss(profiler.peak_rss)
+        if profiler.bytes_read is not None:
+            merged.bytes_read = (merged.bytes_read or 0) + profiler.bytes_read
+            merged.bytes_written = (merged.bytes_written or 0) + profiler.bytes_written
+    return merged.to_dict()
+
+
+class ProfileHistory:
+    """Perfiles de cada corrida en JSONL; se recorta a las últimas max_runs líneas"""
+
+    def __init__(self, path: str = PROFILE_HISTORY_FILE, max_runs: int = 500):
+        self.path = path
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n"
+        with self._lock:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line)
+                # Recorte amortizado: recién al duplicar el tope
+                if os.path.getsize(self.path) > len(line) * self.max_runs * 2:
+                    self._trim()
+            except OSError as e:
+                _logger.warning(f"No se pudo guardar el perfil del pipeline: {e}")
+
+    def _trim(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        if len(lines) <= self.max_runs:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines[-self.max_runs:])
+        os.replace(tmp_path, self.path)
+
+    def load(self, pipeline: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        runs = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if pipeline is None or record.get('pipeline') == pipeline:
+                        runs.append(record)
+        except FileNotFoundError:
+            return []
+        return runs[-limit:] if limit else runs
+
+    def pipelines(self) -> List[str]:
+        return sorted({run.get('pipeline') for run in self.load() if run.get('pipeline')})
+
+    def summarize(self, pipeline: str, window: int = 20) -> Dict[str, Dict[str, Any]]:
+        """Percentiles por paso sobre las últimas `window` corridas"""
+        runs = self.load(pipeline, limit=window)
+        per_step: Dict[str, Dict[str, List[float]]] = {}
+        for run in runs:
+            for name, profile in run.get('steps', {}).items():
+                values = per_step.setdefault(name, {'wall': [], 'cpu': [], 'rss': [], 'bytes': []})
+                values['wall'].append(profile.get('wall_seconds') or 0.0)
+                values['cpu'].append(profile.get('cpu_seconds') or 0.0)
+                if profile.get('peak_rss_mb') is not None:
+                    values['rss'].append(profile['peak_rss_mb'])
+                if profile.get('bytes_read') is not None:
+                    values['bytes'].append(profile['bytes_read'] + (profile.get('bytes_written') or 0))
+
+        return {
+            name: {
+                'runs': len(values['wall']),
+                'wall_p50': percentile(values['wall'], 50),
+                'wall_p95': percentile(values['wall'], 95),
+                'cpu_p50': percentile(values['cpu'], 50),
+                'rss_p95_mb': percentile(values['rss'], 95),
+                'bytes_p50': percentile(values['bytes'], 50)
+            }
+            for name, values in per_step.items()
+        }
+
+    def regressions(self, pipeline: str, baseline: int = 10, factor: float = 1.5,
+                    min_seconds: float = 1.0) -> List[Dict[str, Any]]:
+        """Pasos de la última corrida más lentos que `factor` x la mediana de las `baseline` anteriores"""
+        runs = [r for r in self.load(pipeline, limit=baseline + 1) if r.get('status') == 'success']
+        if len(runs) < 3:
+            return []
+
+        latest, previous = runs[-1], runs[:-1]
+        flagged = []
+        for name, profile in latest.get('steps', {}).items():
+            history = [r['steps'][name]['wall_seconds'] for r in previous if name in r.get('steps', {})]
+            median = percentile(history, 50)
+            current = profile.get('wall_seconds') or 0.0
+            # Mediana 0 (ej. un hook sin comandos): no hay base contra la cual comparar
+            if median is None or median <= 0 or len(history) < 2:
+                continue
+            # El mínimo absoluto evita alertas por pasos de milisegundos
+            if current > median * factor and current - median >= min_seconds:
+                flagged.append({
+                    'step': name,
+                    'wall_seconds': current,
+                    'baseline_seconds': median,
+                    'ratio': round(current / median, 2)
+                })
+        return flagged
+
+
+profile_history = ProfileHistory()
@@ -0,0 +1,175 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import os
+import shutil
+import hashlib
+
+@dataclass
+class StorageEntry:
+    name: str
+    path: str
+    size: int = 0
+    is_dir: bool = False
+    modified: Optional[float] = None
+
+
+class StorageBackend(ABC):
+    name = "base"
+
+    @abstractmethod
+    def put(self, local_file: str, remote_folder: str, show_progress: bool = False,
+            cancel_token=None) -> bool:
+        """cancel_token (core.cancellation): si se cancela, la subida se corta y lanza PipelineCancelledError"""
+        pass
+
+    @abstractmethod
+    def get(self, remote_path: str, local_path: str = ".") -> bool:
+        pass
+
+    @abstractmethod
+    def list(self, remote_folder: str) -> Optional[List[StorageEntry]]:
+        """Lista el contenido de una carpeta; None si no se pudo listar"""
+        pass
+
+    @abstractmethod
+    def delete(self, remote_path: str) -> bool:
+        pass
+
+    @abstractmethod
+    def stat(self, remote_path: str) -> Optional[StorageEntry]:
+        pass
+
+    def checksum(self, remote_path: str) -> Optional[str]:
+        """SHA-256 del objeto remoto, o None si el backend no lo expone"""
+        return None
+
+    def quota(self) -> Optional[Dict[str, int]]:
+        """Espacio en bytes {'used', 'total', 'free'}, o None si no se conoce"""
+        return None
+
+    @staticmethod
+    def join(remote_folder: str, name: str) -> str:
+        return f"{remote_folder.rstrip('/')}/{name}"
+
+
+class LocalStorageBackend(StorageBackend):
+    """Backend sobre un directorio local o montaje NFS (pruebas y benchmarks sin MEGA)"""
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(os.path.expanduser(root))
+        os.makedirs(self.root, exist_ok=True)
+
+    def _resolve(self, remote_path: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, remote_path.lstrip('/')))
+        if path != self.root and not path.startswith(self.root + os.sep):
+            raise ValueError(f"Ruta fuera del almacenamiento: {remote_path}")
+        return path
+
+    def _entry(self, remote_path: str, local_path: str) -> StorageEntry:
+        st = os.stat(local_path)
+        is_dir = os.path.isdir(local_path)
+        return StorageEntry(
+            name=os.path.basename(local_path.rstrip(os.sep)) or '/',
+            path=remote_path,
+            size=0 if is_dir else st.st_size,
+            is_dir=is_dir,
+            modified=st.st_mtime
+        )
+
+    def put(self, local_file: str, remote_folder: str, show_progress: bool = False,
+            cancel_token=None) -> bool:
+        tmp_target = None
+        try:
+            target_dir = self._resolve(remote_folder)
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, os.path.basename(local_file))
+
+            # Copia a temporal + rename para no dejar archivos a medio escribir
+            tmp_target = f"{target}.part"
+            if cancel_token is None:
+                shutil.copyfile(local_file, tmp_target)
+            else:
+                self._copy_cancellable(local_file, tmp_target, cancel_token)
+            os.replace(tmp_target, target)
+            return True
+        except BaseException as e:
+            # Un .part a medio copiar (disco lleno, permisos, cancelación) no queda en el destino
+            if tmp_target and os.path.exists(tmp_target):
+                try:
+                    os.remove(tmp_target)
+                except OSError:
+                    pass
+            if not isinstance(e, Exception) or (cancel_token is not None and cancel_token.cancelled):
+                raise
+            return False
+
+    @staticmethod
+    def _copy_cancellable(source: str, target: str, cancel_token, chunk_size: int = 4 * 1024 * 1024):
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            while True:
+                cancel_token.check()
+                chunk = src.read(chunk_size)
+                if not chunk:
+                    break
+                dst.write(chunk)
+
+    def get(self, remote_path: str, local_path: str = ".") -> bool:
+        try:
+            source = self._resolve(remote_path)
+            if os.path.isdir(local_path):
+                local_path = os.path.join(local_path, os.path.basename(source))
+            shutil.copyfile(source, local_path)
+            return True
+        except Exception:
+            return False
+
+    def list(self, remote_folder: str) -> Optional[List[StorageEntry]]:
+        try:
+            folder = self._resolve(remote_folder)
+            entries = []
+            for item in os.scandir(folder):
+                if item.name.endswith('.part'):
+                    continue
+                entries.append(self._entry(self.join(remote_folder, item.name), item.path))
+            return sorted(entries, key=lambda e: e.name)
+        except Exception:
+            return None
+
+    def delete(self, remote_path: str) -> bool:
+        try:
+            path = self._resolve(remote_path)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except Exception:
+            return False
+
+    def stat(self, remote_path: str) -> Optional[StorageEntry]:
+        try:
+            path = self._resolve(remote_path)
+            if not os.path.exists(path):
+                return None
+            return self._entry(remote_path, path)
+        except Exception:
+            return None
+
+    def checksum(self, remote_path: str) -> Optional[str]:
+        try:
+            sha = hashlib.sha256()
+            with open(self._resolve(remote_path), 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    sha.update(chunk)
+            return sha.hexdigest()
+        except Exception:
+            return None
+
+    def quota(self) -> Optional[Dict[str, int]]:
+        try:
+            usage = shutil.disk_usage(self.root)
+            return {'used': usage.used, 'total': usage.total, 'free': usage.free}
+        except Exception:
+            return None
@@ -236,6 +236,7 @@ class ModuleLoader:
                 'SCRIPT_BASE_DIR': BASE_DIR
             })
             
+            ModuleLoader._drop_event_subscriptions(module_name)
             exec(source_code, module.__dict__)
             
             sys.modules[module_name] = module
@@ -246,6 +247,14 @@ class ModuleLoader:
             print(f"⚠  Error cargando modulo {module_name}: {e}")
             return None
     
+    @staticmethod
+    def _drop_event_subscriptions(module_name):
+        # Al re-ejecutar un módulo sus handlers se suscriben de nuevo: sin esto,
+        # cada "Actualizar módulos" duplicaría las notificaciones
+        events = sys.modules.get('core.events')
+        if events is not None:
+            events.event_bus.unsubscribe_module(module_name)
+    
     @staticmethod
     def reload_all():
         remote_version = ConfigManager.get_remote_version()
@@ -258,7 +267,8 @@ class ModuleLoader:
         for key in list(sys.modules.keys()):
             if key in ['config', 'utils', 'megacmd', 'backup', 'files', 'autobackup', 
                       'logger', 'menu', 'package_manager', 'dc_menu', 'dc_codespace', 
-                      'discord_notifier']:
+                      'discord_notifier', 'transfer_queue', 'bandwidth', 'storage_backends',
+                      'remote_tree']:
                 del sys.modules[key]
         
         pm = ModuleLoader._ensure_package_manager_available()
@@ -269,6 +279,10 @@ class ModuleLoader:
         
         if success:
             AutobackupManager.clear_flag()
+            try:
+                setup_event_observers()
+            except Exception as e:
+                print(f"⚠  No se pudieron registrar observadores de eventos: {e}")
         
         return success
 
@@ -327,6 +341,17 @@ def actualizar_modulos():
     
     input("Enter para continuar...")
 
+def setup_event_observers():
+    logger_observer = ModuleLoader.load_module("logger_observer")
+    discord_observer = ModuleLoader.load_module("discord_observer")
+    if logger_observer:
+        logger_observer.setup_logger_observer()
+    if discord_observer:
+        discord_observer.setup_discord_observer()
+    remote_tree = ModuleLoader.load_module("remote_tree")
+    if remote_tree:
+        remote_tree.setup_remote_tree_observer()
+
 def init():
     ConfigManager.load()
     
@@ -348,18 +373,33 @@ def init():
 
     utils = ModuleLoader.load_module("utils")
     try:
-        logger_observer = ModuleLoader.load_module("logger_observer")
-        discord_observer = ModuleLoader.load_module("discord_observer")
-        if logger_observer:
-            logger_observer.setup_logger_observer()
-        if discord_observer:
-            discord_observer.setup_discord_observer()
+        setup_event_observers()
+        from core.events import event_bus
+        event_bus.set_slow_handler_threshold(config.CONFIG.get("event_slow_handler_ms", 500))
+        journal_cfg = config.CONFIG.get("event_journal", {})
+        if journal_cfg.get("enabled", True):
+            event_bus.journal.enable_persistence(
+                os.path.join(os.path.expanduser("~"), ".d0ce3_addons", "events"),
+                segment_bytes=journal_cfg.get("max_segment_kb", 512) * 1024,
+                max_segments=journal_cfg.get("max_segments", 4)
+            )
+        if config.CONFIG.get("event_ipc", {}).get("enabled", True):
+            from core.ipc import connect_event_bus
+            connect_event_bus()
         if utils and hasattr(utils, "logger"):
             utils.logger.debug("Sistema de eventos inicializado")
     except Exception as e:
         if utils and hasattr(utils, "logger"):
             utils.logger.warning(f"No se pudo inicializar eventos: {e}")
 
+    try:
+        transfer_queue = ModuleLoader.load_module("transfer_queue")
+        if transfer_queue:
+            transfer_queue.queue.resume()
+    except Exception as e:
+        if utils and hasattr(utils, "logger"):
+            utils.logger.warning(f"No se pudo reanudar la cola de transferencias: {e}")
+
     if AutobackupManager.is_initialized():
         return
     
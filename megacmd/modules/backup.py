@@ -1,7 +1,10 @@
 import os
 import subprocess
+import contextlib
+import threading
 import time
 import zipfile
+import zlib
 from datetime import datetime, timedelta, timezone
 
 TIMEZONE_ARG = timezone(timedelta(hours=-3))
@@ -37,90 +40,154 @@ def encontrar_carpeta_servidor(nombre_carpeta="servidor_minecraft"):
     utils.logger.error(f"No se pudo encontrar la carpeta '{nombre_carpeta}'")
     return None
 
-def comprimir_con_manejo_archivos_activos(carpeta_origen, archivo_destino, max_intentos=3):
-    parent_dir = os.path.dirname(carpeta_origen)
+def inventariar_archivos(carpeta_origen):
+    """Genera (ruta, nombre dentro del zip, tamaño) de cada archivo a medida que recorre"""
     folder_name = os.path.basename(carpeta_origen)
+    for root, dirs, files in os.walk(carpeta_origen):
+        for file in files:
+            file_path = os.path.join(root, file)
+            arcname = os.path.join(folder_name, os.path.relpath(file_path, carpeta_origen))
+            try:
+                tamano = os.path.getsize(file_path)
+            except OSError:
+                tamano = 0
+            yield file_path, arcname, tamano
+
+def estimar_compresion(archivos, muestras=24, bytes_por_muestra=1024 * 1024):
+    """Comprime una muestra de los archivos (ponderada por tamaño) para estimar el zip"""
+    total = sum(a[2] for a in archivos)
+    # Encabezado local + entrada del directorio central por archivo, y el fin de directorio
+    overhead = sum(76 + 2 * len(a[1].encode()) for a in archivos) + 22
+    if total == 0:
+        return {'ratio': 1.0, 'bytes_por_segundo': None, 'bytes_zip': overhead, 'muestras': 0}
+    
+    # Archivos en posiciones equiespaciadas del total de bytes; cada uno pesa
+    # tantos tramos como cubre, así las regiones grandes dominan la muestra
+    tramo = total / muestras
+    objetivo = tramo / 2
+    acumulado = 0
+    elegidos = []
+    for entrada in sorted(archivos, key=lambda a: a[2]):
+        acumulado += entrada[2]
+        peso = 0
+        while objetivo <= acumulado:
+            peso += 1
+            objetivo += tramo
+        if peso:
+            elegidos.append((entrada[0], peso))
+    
+    ponderado = pesos = 0.0
+    leidos = 0
+    inicio = time.perf_counter()
+    for ruta, peso in elegidos:
+        try:
+            with open(ruta, 'rb') as f:
+                datos = f.read(bytes_por_muestra)
+        except OSError:
+            continue
+        if not datos:
+            continue
+        compresor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        comprimido = len(compresor.compress(datos)) + len(compresor.flush())
+        ponderado += peso * min(1.0, comprimido / len(datos))
+        pesos += peso
+        leidos += len(datos)
+    duracion = time.perf_counter() - inicio
+    
+    ratio = ponderado / pesos if pesos else 1.0
+    return {
+        'ratio': round(ratio, 4),
+        'bytes_por_segundo': leidos / duracion if leidos and duracion > 0 else None,
+        'bytes_zip': int(total * ratio) + overhead,
+        'muestras': len(elegidos)
+    }
+
+def comprimir_con_manejo_archivos_activos(carpeta_origen, archivo_destino, archivos=None, cancel_token=None):
+    """Un solo intento: devuelve la ruta del zip o lanza RuntimeError.
+    
+    Los reintentos son de quien llama (en el pipeline, la RetryPolicy del paso).
+    """
+    # archivos: inventario ya en curso (stream del pipeline); se consume una sola vez
+    parent_dir = os.path.dirname(carpeta_origen)
     backup_path = os.path.join(parent_dir, archivo_destino)
     
-    for intento in range(1, max_intentos + 1):
+    if os.path.exists(backup_path):
         try:
-            utils.logger.info(f"Intento {intento}/{max_intentos} de compresión")
-            
-            if os.path.exists(backup_path):
+            os.remove(backup_path)
+            utils.logger.info(f"Archivo previo eliminado: {backup_path}")
+        except Exception as e:
+            utils.logger.warning(f"No se pudo eliminar archivo previo: {e}")
+    
+    try:
+        entradas = archivos if archivos is not None else inventariar_archivos(carpeta_origen)
+        with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for file_path, arcname, _ in entradas:
+                if cancel_token is not None:
+                    cancel_token.check()
                 try:
-                    os.remove(backup_path)
-                    utils.logger.info(f"Archivo previo eliminado: {backup_path}")
+                    zipf.write(file_path, arcname)
                 except Exception as e:
-                    utils.logger.warning(f"No se pudo eliminar archivo previo: {e}")
-            
-            with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                for root, dirs, files in os.walk(carpeta_origen):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, carpeta_origen)
-                        arcname = os.path.join(folder_name, arcname)
-                        
-                        try:
-                            zipf.write(file_path, arcname)
-                        except Exception as e:
-                            if intento == max_intentos:
-                                utils.logger.debug(f"No se pudo agregar {file}: {e}")
-            
-            if os.path.exists(backup_path):
-                size = os.path.getsize(backup_path)
-                
-                if size < 1024:
-                    error = "ZIP muy pequeño (< 1KB)"
-                    utils.logger.error(error)
-                    if intento < max_intentos:
-                        time.sleep(intento * 2)
-                        continue
-                    return (False, None, error)
-                
-                try:
-                    with zipfile.ZipFile(backup_path, 'r') as zipf:
-                        bad_file = zipf.testzip()
-                        if bad_file:
-                            if intento < max_intentos:
-                                time.sleep(intento * 2)
-                                continue
-                            return (False, None, f"ZIP corrupto: {bad_file}")
-                except zipfile.BadZipFile:
-                    if intento < max_intentos:
-                        time.sleep(intento * 2)
-                        continue
-                    return (False, None, "ZIP corrupto")
-                
-                size_mb = size / (1024 * 1024)
-                utils.logger.info(f"Compresión exitosa: {archivo_destino} ({size_mb:.1f} MB)")
-                return (True, backup_path, None)
-            else:
-                if intento < max_intentos:
-                    time.sleep(intento * 2)
-                    continue
-                return (False, None, "No se pudo crear el archivo")
+                    # Archivo activo (el servidor lo está escribiendo): se omite
+                    utils.logger.debug(f"No se pudo agregar {os.path.basename(file_path)}: {e}")
         
-        except Exception as e:
-            error = f"Error inesperado en compresión: {e}"
-            utils.logger.error(error)
-            
-            if intento < max_intentos:
-                time.sleep(intento * 2)
-                continue
-            else:
-                return (False, None, error)
+        if not os.path.exists(backup_path):
+            raise RuntimeError("No se pudo crear el archivo")
+        if os.path.getsize(backup_path) < 1024:
+            raise RuntimeError("ZIP muy pequeño (< 1KB)")
+        try:
+            with zipfile.ZipFile(backup_path, 'r') as zipf:
+                bad_file = zipf.testzip()
+        except zipfile.BadZipFile:
+            raise RuntimeError("ZIP corrupto")
+        if bad_file:
+            raise RuntimeError(f"ZIP corrupto: {bad_file}")
     
-    if os.path.exists(backup_path):
+    except BaseException as e:
+        # Un zip a medio escribir no sirve ni para reanudar ni para el próximo intento
+        if os.path.exists(backup_path):
+            try:
+                os.remove(backup_path)
+            except OSError:
+                pass
+        if cancel_token is not None and cancel_token.cancelled:
+            utils.logger.warning(f"Compresión cancelada: {archivo_destino}")
+        else:
+            utils.logger.error(f"Error en compresión de {archivo_destino}: {e}")
+        raise
+    
+    size_mb = os.path.getsize(backup_path) / (1024 * 1024)
+    utils.logger.info(f"Compresión exitosa: {archivo_destino} ({size_mb:.1f} MB)")
+    return backup_path
+
+def comprimir_con_reintentos(carpeta_origen, archivo_destino):
+    """(exito, ruta, error) reintentando según config["retry_policies"]["compress"].
+    
+    Para quien no pasa por el pipeline (el modo legacy y BackupCore); el mismo
+    presupuesto que usa la RetryPolicy del paso compress.
+    """
+    datos = config.CONFIG.get("retry_policies", {}).get("compress") or {}
+    intentos = max(1, int(datos.get("max_attempts", 3)))
+    espera = float(datos.get("backoff_seconds", 2))
+    factor = float(datos.get("backoff_factor", 2))
+    
+    error = None
+    for intento in range(1, intentos + 1):
         try:
-            os.remove(backup_path)
-            utils.logger.info("Archivo corrupto eliminado tras todos los intentos")
+            return True, comprimir_con_manejo_archivos_activos(carpeta_origen, archivo_destino), None
         except Exception as e:
-            utils.logger.error(f"No se pudo eliminar archivo corrupto: {e}")
-    
-    return (False, None, "Todos los intentos de compresión fallaron")
+            error = str(e)
+            if intento < intentos:
+                utils.logger.warning(f"Intento {intento}/{intentos} de compresión falló: {e}")
+                time.sleep(espera * factor ** (intento - 1))
+    return False, None, error
 
 def listar_carpetas_mega(ruta="/"):
     try:
+        remote_tree = CloudModuleLoader.load_module("remote_tree")
+        nodo = remote_tree.tree.get(ruta) if remote_tree else None
+        if nodo is not None:
+            return [carpeta.name for carpeta in nodo.carpetas()]
+        
         result = megacmd.list_files(ruta)
         
         if result.returncode != 0:
@@ -142,6 +209,11 @@ def listar_carpetas_mega(ruta="/"):
 
 def navegar_carpetas_mega(ruta_inicial="/"):
     ruta_actual = ruta_inicial
+    remote_tree = CloudModuleLoader.load_module("remote_tree")
+    
+    if remote_tree and remote_tree.tree.antiguedad() is None:
+        print("⏳ Leyendo estructura de MEGA...")
+        remote_tree.tree.ensure()
     
     while True:
         utils.limpiar_pantalla()
@@ -150,7 +222,16 @@ def navegar_carpetas_mega(ruta_inicial="/"):
         print("=" * 60)
         print(f"📂 {ruta_actual}\n")
         
-        carpetas = listar_carpetas_mega(ruta_actual)
+        nodo = remote_tree.tree.get(ruta_actual) if remote_tree else None
+        if nodo is not None:
+            carpetas = [carpeta.name for carpeta in nodo.carpetas()]
+            detalles = [
+                f"{carpeta.file_count} archivos, {utils.formato_bytes(carpeta.total_size)}"
+                for carpeta in nodo.carpetas()
+            ]
+        else:
+            carpetas = listar_carpetas_mega(ruta_actual)
+            detalles = None
         
         if carpetas is None:
             utils.print_error("No se pudo obtener la lista de carpetas")
@@ -161,16 +242,23 @@ def navegar_carpetas_mega(ruta_inicial="/"):
             print("(Carpeta vacía)\n")
         else:
             for i, carpeta in enumerate(carpetas, 1):
-                print(f" {i}. 📁 {carpeta}")
+                if detalles:
+                    print(f" {i}. 📁 {carpeta}  ({detalles[i - 1]})")
+                else:
+                    print(f" {i}. 📁 {carpeta}")
         
         print("\n" + "-" * 60)
-        print("[número] Entrar | [0] Subir | [s] Seleccionar | [c] Cancelar")
+        print("[número] Entrar | [0] Subir | [s] Seleccionar | [r] Recargar | [c] Cancelar")
         print("-" * 60)
         
         opcion = input("\n> ").strip().lower()
         
         if opcion == 'c':
             return None
+        elif opcion == 'r':
+            if remote_tree:
+                print("⏳ Recargando estructura de MEGA...")
+                remote_tree.tree.refresh()
         elif opcion == 's':
             return ruta_actual
         elif opcion == '0':
@@ -261,11 +349,7 @@ def _ejecutar_backup_manual_legacy():
         print("⏳ Comprimiendo (puede tomar varios minutos)...")
         print("💡 Esto es normal si el servidor está en uso")
         
-        exito, backup_path, error = comprimir_con_manejo_archivos_activos(
-            server_folder, 
-            backup_name,
-            max_intentos=3
-        )
+        exito, backup_path, error = comprimir_con_reintentos(server_folder, backup_name)
         
         if not exito:
             utils.print_error(f"Error al comprimir: {error}")
@@ -388,11 +472,7 @@ def _ejecutar_backup_automatico_legacy():
         utils.logger.info(f"Nombre de backup: {backup_name}")
         utils.logger.info("Iniciando compresión automática con reintentos...")
         
-        exito, backup_path, error = comprimir_con_manejo_archivos_activos(
-            server_folder,
-            backup_name,
-            max_intentos=3
-        )
+        exito, backup_path, error = comprimir_con_reintentos(server_folder, backup_name)
         
         if not exito:
             error_msg = f"Error en compresión automática: {error}"
@@ -476,27 +556,15 @@ def limpiar_backups_antiguos():
         
         utils.logger.info(f"Limpiando backups antiguos (mantener {max_backups})...")
         
-        result = megacmd.list_files(backup_folder)
+        storage_backends = CloudModuleLoader.load_module("storage_backends")
+        storage = storage_backends.get_backend()
+        entries = storage.list(backup_folder)
         
-        if result.returncode != 0:
+        if entries is None:
             utils.logger.error("Error listando backups")
             return
         
-        archivos = [line.strip() for line in result.stdout.split('\n') 
-                   if backup_prefix in line and '.zip' in line]
-        
-        def extraer_fecha(nombre_archivo):
-            try:
-                partes = nombre_archivo.replace('.zip', '').split('_')
-                if len(partes) >= 3:
-                    fecha_str = partes[-2]
-                    hora_str = partes[-1]
-                    return datetime.strptime(f"{fecha_str}_{hora_str}", "%d-%m-%Y_%H-%M")
-            except:
-                pass
-            return datetime.min
-        
-        archivos.sort(key=extraer_fecha, reverse=True)
+        archivos = [e.name for e in storage_backends.filtrar_backups(entries, backup_prefix)]
         
         utils.logger.info(f"Backups encontrados: {len(archivos)}")
         
@@ -505,11 +573,13 @@ def limpiar_backups_antiguos():
         
         a_eliminar = archivos[max_backups:]
         
+        sidecars = {e.name for e in entries if e.name.endswith('.sha256')}
+        
         for archivo in a_eliminar:
-            result_rm = megacmd.remove_file(f"{backup_folder}/{archivo}")
-            
-            if result_rm.returncode == 0:
+            if storage.delete(storage.join(backup_folder, archivo)):
                 utils.logger.info(f"Eliminado: {archivo}")
+                if f"{archivo}.sha256" in sidecars:
+                    storage.delete(storage.join(backup_folder, f"{archivo}.sha256"))
             else:
                 utils.logger.warning(f"Error eliminando {archivo}")
         
@@ -519,127 +589,414 @@ def limpiar_backups_antiguos():
         utils.logger.error(f"Error en limpiar_backups_antiguos: {e}")
 
 try:
-    from core.pipeline import Pipeline, PipelineContext
+    from core.pipeline import Pipeline, PipelineContext, RetryPolicy
+    from core.cancellation import PipelineCancelledError
+    from core.locking import LockBusyError, describe_holder
+    from core.profiling import percentile
+    from core.hooks import BACKUP_HOOK_POINTS, backup_hooks, hooks_from_config
     from core.events import event_bus
     
-    def _crear_backup_pipeline(mode="manual"):
+    def _politica_reintentos(paso):
+        # Todo el presupuesto de reintentos/timeouts del backup vive en config["retry_policies"]
+        datos = config.CONFIG.get("retry_policies", {}).get(paso) or {}
+        return {
+            'retry': RetryPolicy.from_config(datos),
+            'timeout': datos.get('timeout_seconds')
+        }
+    
+    def _plazo_backup():
+        # Plazo total de la corrida; 0 lo desactiva
+        minutos = config.CONFIG.get("backup_deadline_minutes", 0) or 0
+        return minutos * 60 if minutos > 0 else None
+    
+    def velocidad_subida_historica(ultimas=10):
+        """Mediana en bytes/s de las últimas subidas exitosas según el journal, y cuántas se usaron"""
+        velocidades = []
+        for event in event_bus.replay("backup.*.success"):
+            resultado = event.data.get('result') or {}
+            if resultado.get('upload_queued'):
+                continue
+            if resultado.get('upload_rate_kbs'):
+                velocidades.append(resultado['upload_rate_kbs'] * 1024)
+                continue
+            perfil = (event.data.get('step_profiles') or {}).get('upload') or {}
+            if resultado.get('backup_size_bytes') and perfil.get('wall_seconds'):
+                velocidades.append(resultado['backup_size_bytes'] / perfil['wall_seconds'])
+        velocidades = velocidades[-ultimas:]
+        return percentile(velocidades, 50), len(velocidades)
+    
+    def _entorno_hooks(ctx, punto):
+        # Variables para los hooks de shell
+        valores = {
+            'BACKUP_HOOK': punto,
+            'BACKUP_SERVER_FOLDER': ctx.get('server_folder'),
+            'BACKUP_NAME': ctx.get('backup_name'),
+            'BACKUP_PATH': ctx.get('backup_path'),
+            'BACKUP_REMOTE_PATH': ctx.get('remote_path')
+        }
+        return {clave: str(valor) for clave, valor in valores.items() if valor is not None}
+    
+    def _opciones_hooks(ctx, punto):
+        return {
+            'env': _entorno_hooks(ctx, punto),
+            'extra': hooks_from_config(config.CONFIG.get("backup_hooks"), punto)
+        }
+    
+    # Los pasos de una misma ola corren en hilos distintos
+    _consola = threading.Lock()
+    
+    def _progreso(mensaje):
+        # Una línea entera por vez: sin mezclar la salida de pasos concurrentes
+        with _consola:
+            print(mensaje, flush=True)
+    
+    def _esperando_backup(holder):
+        _progreso(f"⏳ Otro backup en curso: {describe_holder(holder)}, esperando...")
+    
+    def _aplicar_lock(pipeline, mode):
+        # Manual y auto comparten el lock "backup", también entre procesos
+        datos = config.CONFIG.get("backup_lock") or {}
+        politica = datos.get(mode, "queue" if mode == "manual" else "skip")
+        pipeline.with_lock("backup", politica, timeout=datos.get("timeout_seconds"),
+                           on_wait=_esperando_backup if mode == "manual" else None)
+    
+    def crear_backup_pipeline(mode="manual"):
         pipeline = Pipeline(f"backup.{mode}")
+        _aplicar_lock(pipeline, mode)
+        
+        def descartar_checkpoint(contexto):
+            # El zip de una corrida que ya no se va a retomar no lo borra cleanup_local;
+            # si la subida quedó encolada, el archivo es de la cola de transferencias
+            backup_path = contexto.get('backup_path')
+            if not backup_path or contexto.get('upload_queued') or not os.path.exists(backup_path):
+                return
+            os.remove(backup_path)
+            utils.logger.info(f"Eliminado {backup_path}: su corrida no se va a retomar")
+        
+        pipeline.on_checkpoint_discarded = descartar_checkpoint
         
         def load_config(ctx):
-            print("📋 Cargando configuración...")
+            _progreso("📋 Cargando configuración...")
             return {
                 'server_folder_name': config.CONFIG.get("server_folder", "servidor_minecraft"),
                 'backup_folder': config.CONFIG.get("backup_folder", "/backups"),
                 'backup_prefix': config.CONFIG.get("backup_prefix", "MSX"),
-                'max_backups': config.CONFIG.get("max_backups", 5)
+                'max_backups': config.CONFIG.get("max_backups", 5),
+                'storage_backend': config.CONFIG.get("storage_backend", "mega")
             }
         
         def find_server(ctx):
-            print("📂 Buscando carpeta del servidor...")
+            _progreso("📂 Buscando carpeta del servidor...")
             folder_name = ctx.get('server_folder_name')
             server_folder = encontrar_carpeta_servidor(folder_name)
             if not server_folder:
                 raise FileNotFoundError(f"Carpeta '{folder_name}' no encontrada")
-            print(f"✓ Encontrada: {server_folder}")
+            _progreso(f"✓ Encontrada: {server_folder}")
             return {'server_folder': server_folder}
         
-        def calculate_size(ctx):
-            print("📊 Calculando tamaño...")
-            server_folder = ctx.get('server_folder')
+        # Estado del snapshot de esta corrida: inicio de la pausa y la guarda de after_snapshot
+        snapshot = {}
+        
+        def before_snapshot(ctx):
+            # La guarda va primero: si un hook pausa el guardado y el siguiente falla,
+            # o la corrida aborta antes de after_snapshot, el mundo igual se reanuda
+            snapshot['desarmar'] = backup_hooks.close_on_abort(
+                pipeline.name, 'after_snapshot', **_opciones_hooks(ctx, 'after_snapshot')
+            )
+            tiempos = backup_hooks.run('before_snapshot', ctx, cancel_token=ctx.cancel_token,
+                                       **_opciones_hooks(ctx, 'before_snapshot'))
+            snapshot['inicio'] = time.time()
+            return {'hooks_before_snapshot': tiempos}
+        
+        def after_snapshot(ctx):
+            desarmar = snapshot.pop('desarmar', None)
+            if desarmar:
+                desarmar()
+            resultado = {}
+            if 'inicio' in snapshot:
+                resultado['snapshot_hold_seconds'] = round(time.time() - snapshot.pop('inicio'), 2)
+            # Sin token: reanudar el guardado no se corta aunque se cancele el backup
+            resultado['hooks_after_snapshot'] = backup_hooks.run(
+                'after_snapshot', ctx, **_opciones_hooks(ctx, 'after_snapshot')
+            )
+            return resultado
+        
+        def after_upload(ctx):
+            if ctx.get('upload_queued'):
+                # La subida termina en segundo plano, fuera de esta corrida
+                utils.logger.info("Hooks after_upload omitidos: subida encolada")
+                return {'hooks_after_upload': []}
+            if not ctx.get('verified'):
+                # Ej. un espejo off-site no debe copiar una subida que no se pudo verificar
+                utils.logger.warning("Hooks after_upload omitidos: subida sin verificar")
+                return {'hooks_after_upload': []}
+            return {'hooks_after_upload': backup_hooks.run(
+                'after_upload', ctx, cancel_token=ctx.cancel_token, **_opciones_hooks(ctx, 'after_upload')
+            )}
+        
+        def estimar_hooks(punto):
+            def estimar(ctx):
+                if backup_hooks.hooks(punto) or _opciones_hooks(ctx, punto)['extra']:
+                    # Lo que tarda un hook solo se sabe por el historial
+                    return None
+                return {'fallback_seconds': 0.0, 'basis': "sin hooks"}
+            return estimar
+        
+        def inventory(ctx):
+            # Generador: compress agrega cada archivo al zip mientras se recorre el resto
             total_size = 0
-            for dirpath, _, filenames in os.walk(server_folder):
-                for filename in filenames:
-                    try:
-                        total_size += os.path.getsize(os.path.join(dirpath, filename))
-                    except:
-                        pass
+            cantidad = 0
+            for entrada in inventariar_archivos(ctx.get('server_folder')):
+                total_size += entrada[2]
+                cantidad += 1
+                yield entrada
             size_mb = total_size / (1024 * 1024)
-            print(f"✓ Tamaño total: {size_mb:.1f} MB")
-            return {'size_bytes': total_size, 'size_mb': round(size_mb, 2)}
+            _progreso(f"📊 Inventario: {cantidad} archivos, {size_mb:.1f} MB")
+            return {'size_bytes': total_size, 'size_mb': round(size_mb, 2), 'file_count': cantidad}
         
-        def compress(ctx):
+        def estimar_inventario(ctx):
+            inicio = time.perf_counter()
+            archivos = list(inventariar_archivos(ctx.get('server_folder')))
+            total_size = sum(a[2] for a in archivos)
+            return {
+                'seconds': time.perf_counter() - inicio,
+                'basis': "recorrido de la carpeta",
+                'size_bytes': total_size,
+                'size_mb': round(total_size / (1024 * 1024), 2),
+                'file_count': len(archivos),
+                'inventory_files': archivos
+            }
+        
+        def compress(ctx, archivos):
             server_folder = ctx.get('server_folder')
             prefix = ctx.get('backup_prefix')
             timestamp = datetime.now(TIMEZONE_ARG).strftime("%d-%m-%Y_%H-%M")
             backup_name = f"{prefix}_{timestamp}.zip"
             
-            print(f"\n⏳ Comprimiendo: {backup_name}")
-            print("💡 Esto puede tomar varios minutos...")
+            _progreso(f"\n⏳ Comprimiendo: {backup_name}")
+            _progreso("💡 Esto puede tomar varios minutos...")
             
-            exito, backup_path, error = comprimir_con_manejo_archivos_activos(
-                server_folder, backup_name, max_intentos=3
+            # Un solo intento: los reintentos los maneja la política del paso
+            backup_path = comprimir_con_manejo_archivos_activos(
+                server_folder, backup_name, archivos=archivos, cancel_token=ctx.cancel_token
             )
             
-            if not exito:
-                raise RuntimeError(f"Error en compresión: {error}")
-            
-            backup_size_mb = os.path.getsize(backup_path) / (1024 * 1024)
-            print(f"✓ Comprimido: {backup_size_mb:.1f} MB\n")
+            backup_size_bytes = os.path.getsize(backup_path)
+            backup_size_mb = backup_size_bytes / (1024 * 1024)
+            _progreso(f"✓ Comprimido: {backup_size_mb:.1f} MB\n")
             return {
                 'backup_name': backup_name,
                 'backup_path': backup_path,
-                'backup_size_mb': round(backup_size_mb, 2)
+                'backup_size_bytes': backup_size_bytes,
+                'backup_size_mb': round(backup_size_mb, 2),
+                'backup_sha256': utils.calcular_sha256(backup_path)
             }
         
+        def estimar_compress(ctx):
+            muestra = estimar_compresion(ctx.get('inventory_files') or [])
+            velocidad = muestra['bytes_por_segundo']
+            return {
+                'seconds': ctx.get('size_bytes') / velocidad if velocidad else None,
+                'disk_bytes': muestra['bytes_zip'],
+                'basis': f"muestra de {muestra['muestras']} archivos (ratio {muestra['ratio']:.2f})",
+                'backup_size_bytes': muestra['bytes_zip'],
+                'backup_size_mb': round(muestra['bytes_zip'] / (1024 * 1024), 2),
+                # Cota de lectura para los pasos sin historial que recorren el zip
+                'compress_rate_bps': velocidad
+            }
+        
+        def server_valido(ctx):
+            return os.path.isdir(ctx.get('server_folder') or '')
+        
+        def compress_valido(ctx):
+            # El zip de una corrida interrumpida sirve si sigue intacto en disco
+            backup_path = ctx.get('backup_path')
+            if not backup_path or not os.path.exists(backup_path):
+                return False
+            if os.path.getsize(backup_path) != ctx.get('backup_size_bytes'):
+                return False
+            return utils.calcular_sha256(backup_path) == ctx.get('backup_sha256')
+        
+        def ensure_space(ctx):
+            storage_backends = CloudModuleLoader.load_module("storage_backends")
+            storage = storage_backends.get_backend(ctx.get('storage_backend'))
+            
+            # Archivo + sidecar de checksum + margen del 2%
+            bytes_necesarios = int(ctx.get('backup_size_bytes', 0) * 1.02) + 4096
+            
+            resultado = storage_backends.liberar_espacio(
+                storage,
+                ctx.get('backup_folder'),
+                ctx.get('backup_prefix'),
+                ctx.get('max_backups'),
+                bytes_necesarios
+            )
+            
+            if resultado.get('space_pruned'):
+                _progreso(f"⚠️  Espacio insuficiente: eliminados {len(resultado['space_pruned'])} backups antiguos antes de subir")
+            
+            if resultado.get('quota_checked') and (resultado['space_pruned'] or not resultado['space_sufficient']):
+                event_bus.publish(
+                    f"backup.{mode}.space_pressure",
+                    backup_name=ctx.get('backup_name'),
+                    free_bytes=resultado['quota_free_bytes'],
+                    needed_bytes=bytes_necesarios,
+                    deleted_files=resultado['space_pruned'],
+                    sufficient=resultado['space_sufficient'],
+                    storage=storage.name
+                )
+            
+            return resultado
+        
         def upload(ctx):
             backup_path = ctx.get('backup_path')
             backup_folder = ctx.get('backup_folder')
             backup_name = ctx.get('backup_name')
             
-            print(f"☁️  Subiendo a MEGA: {backup_folder}/")
+            storage_backends = CloudModuleLoader.load_module("storage_backends")
+            storage = storage_backends.get_backend(ctx.get('storage_backend'))
+            
+            # Cola en segundo plano y límite de ancho de banda son propios de MEGAcmd
+            es_mega = storage_backends.is_mega(storage)
+            bandwidth = CloudModuleLoader.load_module("bandwidth") if es_mega else None
+            
+            if es_mega and config.CONFIG.get("background_upload", False):
+                decision = bandwidth.scheduler.aplicar() if bandwidth else None
+                transfer_queue = CloudModuleLoader.load_module("transfer_queue")
+                transfer_id = transfer_queue.queue.enqueue(
+                    backup_path,
+                    backup_folder,
+                    delete_local=True,
+                    pipeline=f"backup.{mode}",
+                    metadata={'backup_name': backup_name}
+                )
+                _progreso(f"☁️  Subida encolada en segundo plano (ID {transfer_id})\n")
+                resultado = {'upload_success': False, 'upload_queued': True, 'transfer_id': transfer_id}
+                if decision:
+                    resultado['upload_limit_kbs'] = decision['limit_kbs']
+                return resultado
+            
+            _progreso(f"☁️  Subiendo a {storage.name.upper()}: {backup_folder}/")
+            
+            sesion = bandwidth.scheduler.session() if bandwidth else None
             
-            proceso_upload = subprocess.Popen(
-                ["mega-put", "-c", backup_name, backup_folder + "/"],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                cwd=os.path.dirname(backup_path)
+            with sesion or contextlib.nullcontext():
+                subido = storage.put(backup_path, backup_folder, show_progress=True,
+                                     cancel_token=ctx.cancel_token)
+            
+            if not subido:
+                raise RuntimeError(f"Error al subir a {storage.name.upper()}")
+            
+            _progreso(f"✓ Subido exitosamente\n")
+            resultado = {'upload_success': True, 'remote_path': storage.join(backup_folder, backup_name)}
+            if sesion:
+                resultado.update(sesion.resultado(ctx.get('backup_size_bytes')))
+            return resultado
+        
+        def estimar_upload(ctx):
+            tamano = ctx.get('backup_size_bytes') or 0
+            velocidad, corridas = velocidad_subida_historica()
+            base = f"historial ({corridas} subidas)" if velocidad else None
+            
+            storage_backends = CloudModuleLoader.load_module("storage_backends")
+            es_mega = storage_backends.is_mega(storage_backends.get_backend(ctx.get('storage_backend')))
+            if es_mega:
+                bandwidth = CloudModuleLoader.load_module("bandwidth")
+                decision = bandwidth.scheduler.decision_actual() if bandwidth else None
+                if decision and decision['limit_kbs'] > 0 and (
+                        velocidad is None or decision['limit_kbs'] * 1024 < velocidad):
+                    velocidad = decision['limit_kbs'] * 1024
+                    base = f"límite actual de {decision['limit_kbs']} KB/s"
+            
+            resultado = {
+                'seconds': tamano / velocidad if velocidad else None,
+                # Más el sidecar .sha256
+                'remote_bytes': tamano + 128,
+                'basis': base
+            }
+            if velocidad is None and not es_mega and ctx.get('compress_rate_bps'):
+                # Copia a disco: como mucho tarda lo que leer y comprimir la muestra
+                resultado['fallback_seconds'] = tamano / ctx.get('compress_rate_bps')
+                resultado['basis'] = "copia local al ritmo de la muestra"
+            return resultado
+        
+        def estimar_verify(ctx):
+            # Sin historial: el sha256 relee el zip, acotado por la velocidad de la muestra
+            velocidad = ctx.get('compress_rate_bps')
+            if not velocidad:
+                return None
+            return {
+                'fallback_seconds': (ctx.get('backup_size_bytes') or 0) / velocidad,
+                'basis': "lectura del zip estimado"
+            }
+        
+        def verify(ctx):
+            if ctx.get('upload_queued'):
+                # La cola de transferencias verifica al completar la subida
+                return {'verified': None}
+            
+            _progreso("🔎 Verificando subida...")
+            backup_path = ctx.get('backup_path')
+            backup_folder = ctx.get('backup_folder')
+            
+            storage_backends = CloudModuleLoader.load_module("storage_backends")
+            storage = storage_backends.get_backend(ctx.get('storage_backend'))
+            
+            # Un solo listado sirve para verificar y para la retención posterior
+            entries = storage.list(backup_folder)
+            resultado = storage_backends.verificar_subida(
+                storage, backup_path, backup_folder, entries, sha_local=ctx.get('backup_sha256')
             )
             
-            spinner = utils.Spinner("Subiendo")
-            if not spinner.start(proceso_upload):
-                raise RuntimeError("Error al subir a MEGA")
+            if not resultado['verified']:
+                raise RuntimeError(f"Verificación fallida: {resultado.get('verify_error')}")
+            
+            resultado['checksum_uploaded'] = storage_backends.subir_checksum(
+                storage, backup_path, backup_folder, resultado['sha256']
+            )
+            resultado['remote_listing'] = entries
             
-            print(f"✓ Subido exitosamente\n")
-            return {'upload_success': True}
+            _progreso(f"✓ Verificado ({resultado['remote_size']} bytes)")
+            return resultado
         
         def cleanup_local(ctx):
-            print("🧹 Limpiando archivo local...")
             backup_path = ctx.get('backup_path')
+            if not ctx.get('verified'):
+                # Sin verificación (o subida encolada) el archivo local se conserva
+                return {'local_cleaned': False}
+            
+            _progreso("🧹 Limpiando archivo local...")
             try:
                 if os.path.exists(backup_path):
                     os.remove(backup_path)
-                print("✓ Archivo local eliminado")
+                _progreso("✓ Archivo local eliminado")
                 return {'local_cleaned': True}
             except:
                 return {'local_cleaned': False}
         
+        def estimar_cleanup_local(ctx):
+            # Con subida en segundo plano lo borra la cola al terminar: el efecto es el mismo
+            return {'disk_bytes': -(ctx.get('backup_size_bytes') or 0), 'fallback_seconds': 0.0,
+                    'basis': "borrado local"}
+        
         def cleanup_old(ctx):
-            print("🗑️  Limpiando backups antiguos...")
+            _progreso("🗑️  Limpiando backups antiguos...")
             try:
                 backup_folder = ctx.get('backup_folder')
                 backup_prefix = ctx.get('backup_prefix')
                 max_backups = ctx.get('max_backups')
                 current_backup = ctx.get('backup_name')
                 
-                result = megacmd.list_files(backup_folder)
-                if result.returncode != 0:
-                    return {'cleanup_error': 'No se pudo listar MEGA'}
-                
-                archivos = [line.strip() for line in result.stdout.split('\n')
-                           if backup_prefix in line and '.zip' in line]
-                
-                def extraer_fecha(nombre_archivo):
-                    try:
-                        partes = nombre_archivo.replace('.zip', '').split('_')
-                        if len(partes) >= 3:
-                            fecha_str = partes[-2]
-                            hora_str = partes[-1]
-                            return datetime.strptime(f"{fecha_str}_{hora_str}", "%d-%m-%Y_%H-%M")
-                    except:
-                        pass
-                    return datetime.min
+                storage_backends = CloudModuleLoader.load_module("storage_backends")
+                storage = storage_backends.get_backend(ctx.get('storage_backend'))
+                entries = ctx.get('remote_listing')
+                if entries is None:
+                    entries = storage.list(backup_folder)
+                if entries is None:
+                    return {'cleanup_error': f"No se pudo listar {storage.name.upper()}"}
                 
-                archivos.sort(key=extraer_fecha, reverse=True)
+                archivos = [e.name for e in storage_backends.filtrar_backups(entries, backup_prefix)]
+                sidecars = {e.name for e in entries if e.name.endswith('.sha256')}
                 
                 if current_backup not in archivos:
                     archivos.insert(0, current_backup)
@@ -650,27 +1007,73 @@ try:
                     for old in to_delete:
                         if old == current_backup:
                             continue
-                        result_rm = megacmd.remove_file(f"{backup_folder}/{old}")
-                        if result_rm.returncode == 0:
+                        if storage.delete(storage.join(backup_folder, old)):
                             deleted += 1
                             utils.logger.info(f"Eliminado backup antiguo: {old}")
-                    print(f"✓ Eliminados {deleted} backups antiguos")
-                    return {'old_backups_deleted': deleted}
+                            if f"{old}.sha256" in sidecars:
+                                storage.delete(storage.join(backup_folder, f"{old}.sha256"))
+                    _progreso(f"✓ Eliminados {deleted} backups antiguos")
+                    return {'old_backups_deleted': deleted, 'deleted_files': to_delete}
                 
-                print("✓ No hay backups para eliminar")
+                _progreso("✓ No hay backups para eliminar")
                 return {'old_backups_deleted': 0}
             except Exception as e:
                 utils.logger.error(f"Error en cleanup_old: {e}")
                 return {'cleanup_error': str(e)}
         
         pipeline \
-            .add_step("load_config", load_config, required=True) \
-            .add_step("find_server", find_server, required=True) \
-            .add_step("calculate_size", calculate_size, required=False) \
-            .add_step("compress", compress, required=True) \
-            .add_step("upload", upload, required=True) \
-            .add_step("cleanup_local", cleanup_local, required=False) \
-            .add_step("cleanup_old", cleanup_old, required=False)
+            .add_step("load_config", load_config, required=True,
+                      reads=(), writes=('server_folder_name', 'backup_folder', 'backup_prefix',
+                                        'max_backups', 'storage_backend'),
+                      estimate=load_config, resumable=False) \
+            .add_step("find_server", find_server, required=True,
+                      reads=('server_folder_name',), writes=('server_folder',),
+                      validate=server_valido, estimate=find_server) \
+            .add_step("before_snapshot", before_snapshot, required=True,
+                      reads=('server_folder',), writes=('hooks_before_snapshot',),
+                      validate=compress_valido, estimate=estimar_hooks('before_snapshot')) \
+            .add_step("inventory", inventory, required=True,
+                      reads=('server_folder',), writes=('size_bytes', 'size_mb', 'file_count'),
+                      after=('before_snapshot',), estimate=estimar_inventario) \
+            .add_step("compress", compress, required=True,
+                      reads=('server_folder', 'backup_prefix'),
+                      writes=('backup_name', 'backup_path', 'backup_size_bytes', 'backup_size_mb',
+                              'backup_sha256'),
+                      validate=compress_valido, consumes="inventory", estimate=estimar_compress,
+                      **_politica_reintentos("compress")) \
+            .add_step("after_snapshot", after_snapshot, required=False,
+                      reads=('backup_path',), writes=('hooks_after_snapshot', 'snapshot_hold_seconds'),
+                      estimate=estimar_hooks('after_snapshot')) \
+            .add_step("ensure_space", ensure_space, required=False,
+                      reads=('backup_size_bytes', 'backup_name', 'backup_folder', 'backup_prefix',
+                             'max_backups', 'storage_backend'),
+                      writes=('quota_checked', 'quota_free_bytes', 'quota_needed_bytes',
+                              'space_pruned', 'space_sufficient'),
+                      resumable=False) \
+            .add_step("upload", upload, required=True,
+                      reads=('backup_path', 'backup_folder', 'backup_name', 'backup_size_bytes',
+                             'storage_backend'),
+                      writes=('upload_success', 'upload_queued', 'transfer_id', 'remote_path',
+                              'upload_duration_seconds', 'upload_rate_kbs', 'upload_limit_kbs',
+                              'upload_limit_avg_kbs', 'upload_players', 'upload_window'),
+                      after=('ensure_space',), estimate=estimar_upload, **_politica_reintentos("upload")) \
+            .add_step("verify", verify, required=True,
+                      reads=('upload_queued', 'backup_path', 'backup_sha256', 'backup_folder',
+                             'storage_backend'),
+                      writes=('verified', 'verify_error', 'local_size', 'remote_size', 'sha256',
+                              'remote_hash_checked', 'checksum_uploaded', 'remote_listing'),
+                      estimate=estimar_verify, **_politica_reintentos("verify")) \
+            .add_step("after_upload", after_upload, required=False,
+                      reads=('upload_queued', 'upload_success', 'remote_path', 'verified'),
+                      writes=('hooks_after_upload',), after=('verify',),
+                      estimate=estimar_hooks('after_upload')) \
+            .add_step("cleanup_local", cleanup_local, required=False,
+                      reads=('backup_path', 'verified'), writes=('local_cleaned',),
+                      after=('after_upload',), estimate=estimar_cleanup_local) \
+            .add_step("cleanup_old", cleanup_old, required=False,
+                      reads=('backup_folder', 'backup_prefix', 'max_backups', 'backup_name',
+                             'storage_backend', 'remote_listing'),
+                      writes=('old_backups_deleted', 'deleted_files', 'cleanup_error'))
         
         return pipeline
     
@@ -683,8 +1086,9 @@ try:
             
             utils.logger.info("========== INICIO BACKUP MANUAL ==========")
             
-            pipeline = _crear_backup_pipeline("manual")
-            result = pipeline.execute()
+            # Si la corrida anterior quedó a medias (ej: falló la subida) se retoma sin recomprimir
+            pipeline = crear_backup_pipeline("manual")
+            result = pipeline.execute(resume=True, deadline_seconds=_plazo_backup())
             
             print("\n" + "=" * 60)
             print("✓ BACKUP COMPLETADO")
@@ -692,7 +1096,29 @@ try:
             print(f"Archivo: {result.get('backup_name')}")
             print(f"Tamaño: {result.get('backup_size_mb')} MB")
             print(f"Limpiados: {result.get('old_backups_deleted', 0)} backups antiguos")
+            for punto in BACKUP_HOOK_POINTS:
+                for hook in result.get(f"hooks_{punto}") or []:
+                    estado = "✓" if hook['ok'] else f"✗ {hook['error']}"
+                    print(f"Hook {punto}/{hook['hook']}: {hook['seconds']:.1f}s {estado}")
+            if result.get('snapshot_hold_seconds') is not None and result.get('hooks_before_snapshot'):
+                print(f"Mundo en pausa: {result['snapshot_hold_seconds']:.1f}s")
+            reporte = pipeline.last_report
+            if reporte and reporte['path']:
+                print(f"Ruta crítica: {' → '.join(reporte['path'])} "
+                      f"({reporte['path_seconds']:.1f}s; cuello de botella: {reporte['bottleneck']})")
+            print("=" * 60)
+            utils.pausar()
+            
+        except PipelineCancelledError as e:
+            print("\n" + "=" * 60)
+            print(f"⚠️  BACKUP CANCELADO: {e.reason}")
             print("=" * 60)
+            utils.logger.warning(f"Backup manual cancelado: {e.reason}")
+            utils.pausar()
+            
+        except LockBusyError as e:
+            utils.print_error(f"No se pudo iniciar el backup: {e}")
+            utils.logger.warning(f"Backup manual no iniciado: {e}")
             utils.pausar()
             
         except Exception as e:
@@ -715,8 +1141,8 @@ try:
                 utils.logger.info("Autobackup desactivado")
                 return
             
-            pipeline = _crear_backup_pipeline("auto")
-            result = pipeline.execute()
+            # Si el tick anterior falló (ej: en la subida) se retoma sin recomprimir
+            result = ejecutar_backup("auto")
             
             print("\n" + "="*60)
             print("| BACKUP AUTOMÁTICO COMPLETADO")
@@ -726,6 +1152,18 @@ try:
             
             logger_mod.log_backup_auto_exito(result.get('backup_name'), result.get('backup_size_mb'))
             
+        except PipelineCancelledError as e:
+            # Lo que alcanzó a terminar queda en el checkpoint para el próximo tick
+            utils.logger.warning(f"Backup automático cancelado: {e.reason}")
+            print(f"| BACKUP CANCELADO: {e.reason}")
+            print("="*60 + "\n")
+            
+        except LockBusyError as e:
+            # No es un error: ya hay un backup corriendo, este tick se salta
+            utils.logger.info(f"Backup automático omitido: {e}")
+            print(f"| OMITIDO: {e}")
+            print("="*60 + "\n")
+            
         except Exception as e:
             error_msg = str(e)
             utils.logger.error(f"Pipeline backup auto falló: {error_msg}")
@@ -743,9 +1181,65 @@ try:
             except:
                 pass
     
+    def ejecutar_backup(mode="manual"):
+        """Corrida sin interfaz (también la del paquete modules/backup); devuelve el contexto final"""
+        # Se retoma la corrida anterior del mismo modo si quedó a medias
+        return crear_backup_pipeline(mode).execute(resume=True, deadline_seconds=_plazo_backup())
+    
+    def estimar_backup(mode="auto"):
+        """Costo previsto del próximo backup (dry run): no comprime, no sube ni toma el lock"""
+        return crear_backup_pipeline(mode).execute(dry_run=True)
+    
+    def obtener_estadisticas_backup(dias=7):
+        # Se reconstruye desde el journal persistente, así sobrevive a reinicios
+        desde = datetime.now() - timedelta(days=dias) if dias else None
+        stats = {
+            'exitosos': 0,
+            'fallidos': 0,
+            'por_modo': {},
+            'duracion_promedio': None,
+            'tamano_promedio_mb': None,
+            'ultimo_exito': None,
+            'ultimo_error': None
+        }
+        duraciones = []
+        tamanos = []
+        
+        for event in event_bus.replay(since=desde):
+            partes = event.name.split('.')
+            if len(partes) != 3 or partes[0] != 'backup' or partes[2] not in ('success', 'failed'):
+                continue
+            
+            modo = stats['por_modo'].setdefault(partes[1], {'exitosos': 0, 'fallidos': 0})
+            if partes[2] == 'success':
+                stats['exitosos'] += 1
+                modo['exitosos'] += 1
+                stats['ultimo_exito'] = event.timestamp
+                if event.data.get('duration_seconds') is not None:
+                    duraciones.append(event.data['duration_seconds'])
+                tamano = (event.data.get('result') or {}).get('backup_size_mb')
+                if tamano is not None:
+                    tamanos.append(tamano)
+            else:
+                stats['fallidos'] += 1
+                modo['fallidos'] += 1
+                stats['ultimo_error'] = (event.timestamp, event.data.get('error'))
+        
+        if duraciones:
+            stats['duracion_promedio'] = round(sum(duraciones) / len(duraciones), 1)
+        if tamanos:
+            stats['tamano_promedio_mb'] = round(sum(tamanos) / len(tamanos), 2)
+        return stats
+    
     utils.logger.info("Sistema de Pipeline cargado correctamente")
     
 except ImportError as e:
     utils.logger.warning(f"Sistema Pipeline no disponible, usando legacy: {e}")
     ejecutar_backup_manual = _ejecutar_backup_manual_legacy
     ejecutar_backup_automatico = _ejecutar_backup_automatico_legacy
+    
+    def obtener_estadisticas_backup(dias=7):
+        return None
+    
+    def estimar_backup(mode="auto"):
+        return None
@@ -1,9 +1,10 @@
 from .core import BackupCore
-from .orchestrator import ejecutar_backup, ejecutar_backup_manual, ejecutar_backup_automatico
+from .orchestrator import ejecutar_backup, ejecutar_backup_manual, ejecutar_backup_automatico, estimar_backup
 
 __all__ = [
     'BackupCore',
     'ejecutar_backup', 
     'ejecutar_backup_manual', 
-    'ejecutar_backup_automatico'
+    'ejecutar_backup_automatico',
+    'estimar_backup'
 ]
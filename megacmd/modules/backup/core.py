@@ -1,8 +1,6 @@
 import os
-import zipfile
 from datetime import datetime, timedelta, timezone
 from typing import Tuple, Optional, List
-import time
 
 TIMEZONE_ARG = timezone(timedelta(hours=-3))
 
@@ -56,75 +54,24 @@ class BackupCore:
         return total_size
     
     @staticmethod
-    def compress_folder_fixed(source_folder: str, output_filename: str, max_attempts: int = 3) -> Tuple[bool, Optional[str], Optional[str]]:
-        parent_dir = os.path.dirname(source_folder)
-        folder_name = os.path.basename(source_folder)
-        backup_path = os.path.join(parent_dir, output_filename)
-        
-        for attempt in range(1, max_attempts + 1):
-            try:
-                if os.path.exists(backup_path):
-                    try:
-                        os.remove(backup_path)
-                    except:
-                        pass
-                
-                with zipfile.ZipFile(backup_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                    for root, dirs, files in os.walk(source_folder):
-                        for file in files:
-                            file_path = os.path.join(root, file)
-                            arcname = os.path.relpath(file_path, source_folder)
-                            arcname = os.path.join(folder_name, arcname)
-                            
-                            try:
-                                zipf.write(file_path, arcname)
-                            except Exception as e:
-                                if attempt == max_attempts:
-                                    import logging
-                                    logging.debug(f"No se pudo agregar {file}: {e}")
-                
-                if os.path.exists(backup_path):
-                    size = os.path.getsize(backup_path)
-                    
-                    if size < 1024:
-                        if attempt < max_attempts:
-                            time.sleep(attempt * 2)
-                            continue
-                        return (False, None, "ZIP muy pequeño (< 1KB)")
-                    
-                    try:
-                        with zipfile.ZipFile(backup_path, 'r') as zipf:
-                            bad_file = zipf.testzip()
-                            if bad_file:
-                                if attempt < max_attempts:
-                                    time.sleep(attempt * 2)
-                                    continue
-                                return (False, None, f"ZIP corrupto: {bad_file}")
-                    except zipfile.BadZipFile:
-                        if attempt < max_attempts:
-                            time.sleep(attempt * 2)
-                            continue
-                        return (False, None, "ZIP corrupto")
-                    
-                    return (True, backup_path, None)
-                else:
-                    if attempt < max_attempts:
-                        time.sleep(attempt * 2)
-                        continue
-                    return (False, None, "No se pudo crear el archivo")
-            
-            except Exception as e:
-                if attempt == max_attempts:
-                    return (False, None, f"Error: {str(e)}")
-                time.sleep(attempt * 2)
-        
-        if os.path.exists(backup_path):
-            try:
-                os.remove(backup_path)
-            except:
-                pass
-        
-        return (False, None, "Todos los intentos fallaron")
+    def compress_folder_fixed(source_folder: str, output_filename: str) -> Tuple[bool, Optional[str], Optional[str]]:
+        # Misma compresión y mismos reintentos (config["retry_policies"]["compress"]) que modules/backup.py
+        backup = CloudModuleLoader.load_module("backup")
+        return backup.comprimir_con_reintentos(source_folder, output_filename)
+    
+    @staticmethod
+    def extract_backup_date(backup_name: str) -> datetime:
+        try:
+            parts = backup_name.replace('.zip', '').split('_')
+            if len(parts) >= 3:
+                return datetime.strptime(f"{parts[-2]}_{parts[-1]}", "%d-%m-%Y_%H-%M")
+        except ValueError:
+            pass
+        return datetime.min
+    
+    @staticmethod
+    def sort_backups(backup_names: List[str]) -> List[str]:
+        return sorted(backup_names, key=BackupCore.extract_backup_date, reverse=True)
     
     @staticmethod
     def cleanup_local_backup(backup_path: str) -> bool:
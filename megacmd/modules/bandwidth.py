@@ -0,0 +1,214 @@
+import time
+import threading
+from datetime import datetime
+
+config = CloudModuleLoader.load_module("config")
+utils = CloudModuleLoader.load_module("utils")
+megacmd = CloudModuleLoader.load_module("megacmd")
+
+REEVALUAR_CADA_SEGUNDOS = 60
+
+
+def _minutos(hora_str):
+    horas, minutos = hora_str.strip().split(':')
+    return int(horas) * 60 + int(minutos)
+
+
+def ventana_activa(ventanas, ahora=None):
+    ahora = ahora or datetime.now()
+    minuto_actual = ahora.hour * 60 + ahora.minute
+
+    for ventana in ventanas:
+        try:
+            inicio = _minutos(ventana['inicio'])
+            fin = _minutos(ventana['fin'])
+        except (KeyError, ValueError):
+            utils.logger.warning(f"Ventana de ancho de banda inválida: {ventana}")
+            continue
+
+        if inicio <= fin:
+            dentro = inicio <= minuto_actual < fin
+        else:
+            # Ventana que cruza la medianoche (ej: 22:00 - 02:00)
+            dentro = minuto_actual >= inicio or minuto_actual < fin
+
+        if dentro:
+            return ventana
+
+    return None
+
+
+def calcular_limite(schedule, jugadores, ahora=None):
+    ventana = ventana_activa(schedule.get('windows', []), ahora)
+    limite = ventana.get('limite_kbs', 0) if ventana else schedule.get('default_kbs', 0)
+
+    if jugadores == 0:
+        limite = schedule.get('empty_server_kbs', 0)
+    elif jugadores and limite > 0:
+        por_jugador = schedule.get('per_player_kbs', 0)
+        if por_jugador > 0:
+            limite = max(schedule.get('min_kbs', 128), limite - por_jugador * jugadores)
+
+    return {
+        'limit_kbs': int(limite),
+        'players': jugadores,
+        'window': f"{ventana['inicio']}-{ventana['fin']}" if ventana else None
+    }
+
+
+class BandwidthScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ultimo_limite = None
+
+    def _schedule(self):
+        return config.CONFIG.get("bandwidth_schedule", {}) or {}
+
+    def is_enabled(self):
+        return bool(self._schedule().get('enabled', False))
+
+    def _contar_jugadores(self, schedule):
+        try:
+            dc_codespace = CloudModuleLoader.load_module("dc_codespace")
+            if not dc_codespace:
+                return None
+            return dc_codespace.obtener_jugadores_online(puerto=schedule.get('minecraft_port', 25565))
+        except Exception as e:
+            utils.logger.debug(f"No se pudo obtener cantidad de jugadores: {e}")
+            return None
+
+    def decision_actual(self):
+        """El límite que correspondería ahora, sin aplicarlo"""
+        if not self.is_enabled():
+            return None
+
+        schedule = self._schedule()
+        return calcular_limite(schedule, self._contar_jugadores(schedule))
+
+    def aplicar(self):
+        decision = self.decision_actual()
+        if decision is None:
+            return None
+
+        with self._lock:
+            if decision['limit_kbs'] != self._ultimo_limite:
+                result = megacmd.set_upload_speed_limit(decision['limit_kbs'])
+                if result.returncode == 0:
+                    self._ultimo_limite = decision['limit_kbs']
+                    utils.logger.info(
+                        f"Ancho de banda ajustado: {decision['limit_kbs'] or 'sin límite'} KB/s "
+                        f"(jugadores: {decision['players']}, ventana: {decision['window'] or 'ninguna'})"
+                    )
+
+        return decision
+
+    def restaurar(self, limit_kbs):
+        # El límite de MEGAcmd es global: afecta también a las transferencias manuales
+        with self._lock:
+            if limit_kbs == self._ultimo_limite:
+                return
+            result = megacmd.set_upload_speed_limit(limit_kbs)
+            if result.returncode == 0:
+                self._ultimo_limite = limit_kbs
+                utils.logger.info(f"Límite de subida restaurado: {limit_kbs or 'sin límite'} KB/s")
+
+    def session(self):
+        return UploadSession(self)
+
+
+class UploadSession:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self._muestras = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._inicio = None
+        self._fin = None
+        self._limite_previo = None
+
+    def _registrar(self, decision):
+        if decision is not None:
+            self._muestras.append((time.time(), decision))
+
+    def _monitor(self):
+        while not self._stop.wait(REEVALUAR_CADA_SEGUNDOS):
+            try:
+                self._registrar(self.scheduler.aplicar())
+            except Exception as e:
+                utils.logger.warning(f"Error reevaluando ancho de banda: {e}")
+
+    def __enter__(self):
+        self._inicio = time.time()
+        if self.scheduler.is_enabled():
+            # Para devolverlo al salir; None si no se pudo leer
+            self._limite_previo = megacmd.get_upload_speed_limit()
+        self._registrar(self.scheduler.aplicar())
+
+        if self._muestras:
+            self._thread = threading.Thread(target=self._monitor, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._fin = time.time()
+        self._stop.set()
+        if self._thread:
+            # Que una reevaluación en curso no vuelva a limitar después de restaurar
+            self._thread.join(15)
+        if self._limite_previo is not None and self._muestras:
+            try:
+                self.scheduler.restaurar(self._limite_previo)
+            except Exception as e:
+                utils.logger.warning(f"No se pudo restaurar el límite de subida: {e}")
+        return False
+
+    def resultado(self, bytes_transferidos=None):
+        fin = self._fin or time.time()
+        duracion = max(fin - (self._inicio or fin), 0.001)
+
+        resultado = {'upload_duration_seconds': round(duracion, 2)}
+
+        if bytes_transferidos:
+            resultado['upload_rate_kbs'] = round(bytes_transferidos / 1024 / duracion, 1)
+
+        if not self._muestras:
+            return resultado
+
+        # Promedio del límite ponderado por el tiempo que estuvo vigente
+        ponderado = 0.0
+        vigencia_total = 0.0
+        ilimitado = False
+        for idx, (inicio, decision) in enumerate(self._muestras):
+            hasta = self._muestras[idx + 1][0] if idx + 1 < len(self._muestras) else fin
+            vigencia = max(hasta - inicio, 0)
+            if decision['limit_kbs'] == 0:
+                ilimitado = True
+            ponderado += decision['limit_kbs'] * vigencia
+            vigencia_total += vigencia
+
+        ultima = self._muestras[-1][1]
+        if ilimitado:
+            promedio = None
+        elif vigencia_total > 0:
+            promedio = round(ponderado / vigencia_total, 1)
+        else:
+            promedio = ultima['limit_kbs']
+
+        resultado.update({
+            'upload_limit_kbs': ultima['limit_kbs'],
+            'upload_limit_avg_kbs': promedio,
+            'upload_players': ultima['players'],
+            'upload_window': ultima['window']
+        })
+        return resultado
+
+
+scheduler = BandwidthScheduler()
+
+__all__ = [
+    'BandwidthScheduler',
+    'UploadSession',
+    'calcular_limite',
+    'ventana_activa',
+    'scheduler'
+]
@@ -25,6 +25,40 @@ DEFAULT_CONFIG = {
     "backup_interval_minutes": 30,
     "backup_prefix": "MSX",
     "autobackup_enabled": False,
+    "storage_backend": "mega",
+    "storage_local_path": "",
+    "background_upload": False,
+    "bandwidth_schedule": {
+        "enabled": False,
+        "default_kbs": 0,
+        "empty_server_kbs": 0,
+        "per_player_kbs": 0,
+        "min_kbs": 128,
+        "minecraft_port": 25565,
+        "windows": []
+    },
+    "event_journal": {
+        "enabled": True,
+        "max_segment_kb": 512,
+        "max_segments": 4
+    },
+    "event_ipc": {
+        "enabled": True
+    },
+    "event_slow_handler_ms": 500,
+    "retry_policies": {
+        "compress": {"max_attempts": 3, "backoff_seconds": 2, "timeout_seconds": None},
+        "upload": {"max_attempts": 2, "backoff_seconds": 30, "retry_on": ["RuntimeError", "OSError"]},
+        "verify": {"max_attempts": 3, "backoff_seconds": 10, "retry_on": ["RuntimeError", "OSError"]}
+    },
+    # Plazo total de cada backup; 0 = sin plazo (las subidas limitadas pueden tardar horas)
+    "backup_deadline_minutes": 0,
+    # Un solo backup a la vez entre procesos: wait, skip o queue según el modo;
+    # timeout_seconds es la espera máxima de wait y queue
+    "backup_lock": {"manual": "queue", "auto": "skip", "timeout_seconds": 900},
+    # Comandos por punto del backup, además de los callables de core.hooks.backup_hooks.
+    # Ej: "before_snapshot": [{"command": "mcrcon save-off", "timeout_seconds": 30, "required": True}]
+    "backup_hooks": {"timeout_seconds": 60, "before_snapshot": [], "after_snapshot": [], "after_upload": []},
     "debug_enabled": False
 }
 
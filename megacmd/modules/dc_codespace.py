@@ -433,6 +433,64 @@ def verificar_java_corriendo():
         return False
 
 
+def _empaquetar_varint(valor):
+    datos = b""
+    while True:
+        byte = valor & 0x7F
+        valor >>= 7
+        if valor:
+            datos += bytes([byte | 0x80])
+        else:
+            return datos + bytes([byte])
+
+
+def _leer_varint(sock):
+    valor = 0
+    for i in range(5):
+        byte = sock.recv(1)
+        if not byte:
+            raise ConnectionError("Conexión cerrada")
+        valor |= (byte[0] & 0x7F) << (7 * i)
+        if not byte[0] & 0x80:
+            return valor
+    raise ValueError("VarInt demasiado largo")
+
+
+def obtener_jugadores_online(host="127.0.0.1", puerto=25565, timeout=2):
+    # Server List Ping: handshake (estado 1) + status request
+    import socket
+    import struct
+    
+    try:
+        with socket.create_connection((host, puerto), timeout=timeout) as sock:
+            host_bytes = host.encode('utf-8')
+            handshake = (
+                b"\x00" + _empaquetar_varint(-1 & 0xFFFFFFFF)
+                + _empaquetar_varint(len(host_bytes)) + host_bytes
+                + struct.pack('>H', puerto) + _empaquetar_varint(1)
+            )
+            sock.sendall(_empaquetar_varint(len(handshake)) + handshake)
+            sock.sendall(b"\x01\x00")
+            
+            _leer_varint(sock)
+            _leer_varint(sock)
+            longitud = _leer_varint(sock)
+            
+            datos = b""
+            while len(datos) < longitud:
+                chunk = sock.recv(longitud - len(datos))
+                if not chunk:
+                    break
+                datos += chunk
+        
+        estado = json.loads(datos.decode('utf-8'))
+        return int(estado.get('players', {}).get('online', 0))
+    
+    except Exception as e:
+        utils.logger.debug(f"No se pudo consultar jugadores en {host}:{puerto}: {e}")
+        return None
+
+
 def obtener_uso_recursos():
     recursos = {}
     
@@ -485,5 +543,6 @@ __all__ = [
     'generar_comando_discord',
     'mostrar_comando_sugerido',
     'verificar_java_corriendo',
+    'obtener_jugadores_online',
     'obtener_uso_recursos'
 ]
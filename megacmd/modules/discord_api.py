@@ -9,6 +9,14 @@ except ImportError:
     FLASK_AVAILABLE = False
     print("⚠️ Flask no disponible. Instalar con: pip install flask")
 
+try:
+    from core.events import event_bus
+    from core.ipc import connect_event_bus
+    from core.journal import to_jsonable
+except ImportError:
+    event_bus = None
+    connect_event_bus = None
+
 try:
     discord_queue_mod = CloudModuleLoader.load_module("discord_queue")
     discord_config_mod = CloudModuleLoader.load_module("discord_config")
@@ -145,6 +153,39 @@ class DiscordAPI:
                 'timestamp': datetime.now().isoformat()
             }), 200
         
+        @self.app.route('/events/recent', methods=['GET'])
+        def get_recent_events():
+            if event_bus is None:
+                return jsonify({
+                    'success': False,
+                    'error': 'Event bus not available'
+                }), 500
+            
+            pattern = request.args.get('pattern') or None
+            try:
+                limit = int(request.args.get('limit', 50))
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'limit must be an integer'
+                }), 400
+            limit = max(0, min(limit, 100))
+            events = event_bus.get_history(pattern, limit=limit)
+            
+            return jsonify({
+                'success': True,
+                'count': len(events),
+                'events': [
+                    {
+                        'name': e.name,
+                        'timestamp': e.timestamp.isoformat(),
+                        'source': e.source,
+                        'data': to_jsonable(e.data)
+                    }
+                    for e in events
+                ]
+            }), 200
+        
         @self.app.route('/discord/cleanup', methods=['POST'])
         def cleanup_old_events():
             try:
@@ -178,6 +219,13 @@ def create_standalone_app(host='0.0.0.0', port=8080, debug=False):
     app = Flask(__name__)
     api = DiscordAPI(app)
     
+    # Proceso aparte: se une al bus local para ver los eventos backup.* y system.*
+    if connect_event_bus is not None:
+        try:
+            connect_event_bus()
+        except Exception as e:
+            print(f"⚠️ Bus de eventos local no disponible: {e}")
+    
     @app.route('/', methods=['GET'])
     def index():
         return jsonify({
@@ -187,6 +235,7 @@ def create_standalone_app(host='0.0.0.0', port=8080, debug=False):
                 'GET /discord/health',
                 'GET /discord/stats',
                 'GET /discord/events',
+                'GET /events/recent',
                 'POST /discord/events/<id>/processed',
                 'POST /discord/events/<id>/failed',
                 'POST /discord/cleanup'
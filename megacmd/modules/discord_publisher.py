@@ -109,6 +109,20 @@ class EventPublisher:
         
         return EventPublisher.publish_event('codespace_status', payload)
     
+    @staticmethod
+    def publish_storage_pressure(free_bytes: int, needed_bytes: int,
+                                 deleted_files: Optional[list] = None,
+                                 sufficient: bool = True, storage: str = "mega") -> bool:
+        payload = {
+            'storage': storage,
+            'free_mb': round(free_bytes / (1024 * 1024), 2),
+            'needed_mb': round(needed_bytes / (1024 * 1024), 2),
+            'deleted_files': deleted_files or [],
+            'sufficient': sufficient
+        }
+        
+        return EventPublisher.publish_event('storage_pressure', payload)
+    
     @staticmethod
     def get_queue_stats() -> Dict:
         if not queue:
@@ -127,6 +141,7 @@ publish_backup_error = publisher.publish_backup_error
 publish_backup_success = publisher.publish_backup_success
 publish_minecraft_status = publisher.publish_minecraft_status
 publish_codespace_status = publisher.publish_codespace_status
+publish_storage_pressure = publisher.publish_storage_pressure
 
 
 __all__ = [
@@ -135,5 +150,6 @@ __all__ = [
     'publish_backup_error',
     'publish_backup_success',
     'publish_minecraft_status',
-    'publish_codespace_status'
+    'publish_codespace_status',
+    'publish_storage_pressure'
 ]
\ No newline at end of file
@@ -1,8 +1,14 @@
+import os
+import re
 import subprocess
+from datetime import datetime
 from shutil import which
 
 utils = CloudModuleLoader.load_module("utils")
 
+# Límite por defecto de mega-put/mega-get; quien llama puede pasar otro
+TRANSFER_TIMEOUT_SECONDS = 300
+
 def is_installed():
     return which("mega-login") is not None
 
@@ -217,7 +223,7 @@ def ensure_ready():
         return False
     return True
 
-def upload_file(local_file, remote_folder, silent=False):
+def upload_file(local_file, remote_folder, silent=False, timeout=TRANSFER_TIMEOUT_SECONDS, cancel_token=None):
     if not remote_folder.endswith("/"):
         remote_folder += "/"
     
@@ -226,16 +232,84 @@ def upload_file(local_file, remote_folder, silent=False):
         cmd.insert(1, "-q")
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        if cancel_token is not None:
+            # Al cancelar se termina mega-put en vez de esperar el timeout
+            from core.cancellation import run_process
+            result = run_process(cmd, cancel_token, capture_output=True, text=True, timeout=timeout)
+        else:
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
         utils.logger.info(f"Upload: {local_file} -> {remote_folder} (returncode: {result.returncode})")
         return result
     except subprocess.TimeoutExpired:
         utils.logger.error(f"Timeout subiendo {local_file}")
         return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr="Timeout")
     except Exception as e:
+        if cancel_token is not None and cancel_token.cancelled:
+            utils.logger.warning(f"Subida cancelada: {local_file}")
+            raise
         utils.logger.error(f"Error subiendo {local_file}: {e}")
         return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr=str(e))
 
+def enqueue_upload(local_file, remote_folder):
+    if not remote_folder.endswith("/"):
+        remote_folder += "/"
+    
+    # -q: MEGAcmd encola la subida en su motor de transferencias y retorna de inmediato
+    cmd = ["mega-put", "-c", "-q", local_file, remote_folder]
+    
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        utils.logger.info(f"Upload encolado: {local_file} -> {remote_folder} (returncode: {result.returncode})")
+        return result
+    except subprocess.TimeoutExpired:
+        utils.logger.error(f"Timeout encolando {local_file}")
+        return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr="Timeout")
+    except Exception as e:
+        utils.logger.error(f"Error encolando {local_file}: {e}")
+        return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr=str(e))
+
+def list_transfers():
+    cmd = [
+        "mega-transfers", "--only-uploads", "--show-completed",
+        "--output-cols=TAG,SOURCEPATH,DESTINYPATH,PROGRESS,STATE",
+        "--col-separator=|"
+    ]
+    
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=15)
+    except subprocess.TimeoutExpired:
+        utils.logger.error("Timeout listando transferencias")
+        return None
+    except Exception as e:
+        utils.logger.error(f"Error listando transferencias: {e}")
+        return None
+    
+    if result.returncode != 0:
+        utils.logger.warning(f"mega-transfers falló: {result.stderr}")
+        return None
+    
+    transfers = []
+    for line in result.stdout.split('\n'):
+        parts = [p.strip() for p in line.split('|')]
+        if len(parts) < 5 or parts[0] == 'TAG':
+            continue
+        transfers.append({
+            'tag': parts[0],
+            'source': parts[1],
+            'destination': parts[2],
+            'progress': parts[3],
+            'state': parts[4].upper()
+        })
+    
+    return transfers
+
+def remote_exists(remote_path):
+    try:
+        result = subprocess.run(["mega-ls", remote_path], capture_output=True, text=True, timeout=30)
+        return result.returncode == 0
+    except:
+        return False
+
 def list_files(remote_folder="/", detailed=False):
     cmd = ["mega-ls"]
     if detailed:
@@ -269,11 +343,11 @@ def remove_file(remote_path):
         utils.logger.error(f"Error eliminando {remote_path}: {e}")
         return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr=str(e))
 
-def download_file(remote_file, local_path="."):
+def download_file(remote_file, local_path=".", timeout=TRANSFER_TIMEOUT_SECONDS):
     cmd = ["mega-get", remote_file, local_path]
     
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
         if result.returncode == 0:
             utils.logger.info(f"Descargado: {remote_file} -> {local_path}")
         else:
@@ -286,8 +360,8 @@ def download_file(remote_file, local_path="."):
         utils.logger.error(f"Error descargando {remote_file}: {e}")
         return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr=str(e))
 
-def get_quota():
-    cmd = ["mega-df", "-h"]
+def get_quota(human=True):
+    cmd = ["mega-df", "-h"] if human else ["mega-df"]
     
     try:
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
@@ -299,6 +373,59 @@ def get_quota():
         utils.logger.error(f"Error obteniendo cuota: {e}")
         return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr=str(e))
 
+_UNIDADES = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4, 'PB': 1024 ** 5}
+
+def parse_quota(output):
+    # "USED STORAGE:   12345   0.06% of 21474836480" (o con unidades si se usó -h)
+    import re
+    match = re.search(
+        r'USED STORAGE:\s*([\d.]+)\s*([KMGTP]?B)?\s+[\d.]+%\s+of\s+([\d.]+)\s*([KMGTP]?B)?',
+        output
+    )
+    if not match:
+        return None
+    
+    used = int(float(match.group(1)) * _UNIDADES[(match.group(2) or '').upper()])
+    total = int(float(match.group(3)) * _UNIDADES[(match.group(4) or '').upper()])
+    return {'used': used, 'total': total, 'free': max(total - used, 0)}
+
+def set_upload_speed_limit(limit_kbs):
+    # mega-speedlimit recibe bytes/s; 0 = sin límite
+    cmd = ["mega-speedlimit", "-u", str(int(limit_kbs) * 1024)]
+    
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        if result.returncode == 0:
+            utils.logger.info(f"Límite de subida: {limit_kbs} KB/s" if limit_kbs else "Límite de subida: sin límite")
+        else:
+            utils.logger.warning(f"Error configurando límite de subida: {result.stderr}")
+        return result
+    except subprocess.TimeoutExpired:
+        utils.logger.error("Timeout configurando límite de subida")
+        return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr="Timeout")
+    except Exception as e:
+        utils.logger.error(f"Error configurando límite de subida: {e}")
+        return subprocess.CompletedProcess(cmd, returncode=-1, stdout="", stderr=str(e))
+
+def get_upload_speed_limit():
+    """Límite de subida vigente en KB/s (0 = sin límite); None si no se pudo leer"""
+    cmd = ["mega-speedlimit", "-u"]
+    
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+    except Exception as e:
+        utils.logger.debug(f"No se pudo leer el límite de subida: {e}")
+        return None
+    if result.returncode != 0:
+        return None
+    
+    # "Upload speed limit = 1048576" (bytes/s, o con unidades si se usó -h)
+    import re
+    match = re.search(r'=\s*([\d.]+)\s*([KMGTP]?B)?', result.stdout)
+    if not match:
+        return None
+    return int(float(match.group(1)) * _UNIDADES[(match.group(2) or '').upper()] / 1024)
+
 def get_account_email():
     cmd = ["mega-whoami"]
     
@@ -309,3 +436,152 @@ def get_account_email():
         return None
     except:
         return None
+
+def _parse_long_line(line):
+    # Formato de mega-ls -l: FLAGS VERS SIZE DATE TIME NAME
+    parts = line.split(None, 5)
+    if len(parts) < 6 or parts[0] == 'FLAGS':
+        return None
+    
+    flags, _, size, fecha, hora, nombre = parts
+    try:
+        modified = datetime.strptime(f"{fecha} {hora}", "%d%b%Y %H:%M:%S").timestamp()
+    except ValueError:
+        modified = None
+    
+    return {
+        'name': nombre,
+        'size': int(size) if size.isdigit() else 0,
+        'is_dir': flags.startswith('d'),
+        'modified': modified
+    }
+
+def parse_ls_long(output, remote_folder="/"):
+    entries = []
+    for line in output.split('\n'):
+        entry = _parse_long_line(line)
+        if entry is None:
+            continue
+        entry['path'] = f"{remote_folder.rstrip('/')}/{entry['name']}"
+        entries.append(entry)
+    
+    return entries
+
+def find_all(remote_folder="/", timeout=120):
+    # Un único recorrido recursivo en vez de un mega-ls por carpeta
+    cmd = ["mega-find", remote_folder, "-l"]
+    
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        if result.returncode != 0:
+            utils.logger.warning(f"Error recorriendo {remote_folder}: {result.stderr.strip()}")
+            return None
+    except subprocess.TimeoutExpired:
+        utils.logger.error(f"Timeout recorriendo {remote_folder}")
+        return None
+    except Exception as e:
+        utils.logger.error(f"Error recorriendo {remote_folder}: {e}")
+        return None
+    
+    entries = parse_find_long(result.stdout, remote_folder)
+    if entries is None:
+        utils.logger.warning(f"Formato de mega-find -l no reconocido al recorrer {remote_folder}")
+    return entries
+
+# Formato de mega-find -l: FLAGS [VERS] SIZE DATE TIME RUTA; la columna de versiones
+# no siempre está y la ruta puede tener espacios, por eso se ancla en la fecha
+_FIND_LONG = re.compile(
+    r'^(?P<flags>\S{4})\s+(?:\S+\s+)?(?P<size>\d+|-)\s+'
+    r'(?P<fecha>\d{2}[A-Za-z]{3}\d{4})\s+(?P<hora>\d{2}:\d{2}:\d{2})\s+(?P<ruta>.+)$'
+)
+
+def parse_find_long(output, remote_folder="/"):
+    """Entradas de mega-find -l con ruta completa; None si ninguna línea tiene el formato esperado"""
+    base = remote_folder.rstrip('/')
+    entries = []
+    no_reconocidas = 0
+    for line in output.split('\n'):
+        line = line.rstrip()
+        if not line or line.startswith('FLAGS'):
+            continue
+        match = _FIND_LONG.match(line)
+        if match is None:
+            no_reconocidas += 1
+            continue
+        
+        try:
+            modified = datetime.strptime(f"{match['fecha']} {match['hora']}", "%d%b%Y %H:%M:%S").timestamp()
+        except ValueError:
+            modified = None
+        
+        ruta = match['ruta']
+        if not ruta.startswith('/'):
+            ruta = f"{base}/{ruta}"
+        path = ruta.rstrip('/') or '/'
+        entries.append({
+            'name': path.rsplit('/', 1)[-1],
+            'path': path,
+            'size': int(match['size']) if match['size'].isdigit() else 0,
+            'is_dir': match['flags'].startswith('d'),
+            'modified': modified
+        })
+    
+    if no_reconocidas and not entries:
+        return None
+    return entries
+
+try:
+    from core.storage import StorageBackend, StorageEntry
+    
+    class MegaStorageBackend(StorageBackend):
+        name = "mega"
+        
+        def put(self, local_file, remote_folder, show_progress=False, cancel_token=None):
+            if not show_progress:
+                return upload_file(local_file, remote_folder, silent=False, cancel_token=cancel_token).returncode == 0
+            
+            proceso = subprocess.Popen(
+                ["mega-put", "-c", os.path.basename(local_file), remote_folder.rstrip('/') + "/"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=os.path.dirname(os.path.abspath(local_file))
+            )
+            return utils.Spinner("Subiendo").start(proceso, cancel_token=cancel_token)
+        
+        def get(self, remote_path, local_path="."):
+            return download_file(remote_path, local_path).returncode == 0
+        
+        def list(self, remote_folder):
+            result = list_files(remote_folder, detailed=True)
+            if result.returncode != 0:
+                return None
+            return [StorageEntry(**entry) for entry in parse_ls_long(result.stdout, remote_folder)]
+        
+        def delete(self, remote_path):
+            return remove_file(remote_path).returncode == 0
+        
+        def quota(self):
+            result = get_quota(human=False)
+            if result.returncode != 0:
+                return None
+            return parse_quota(result.stdout)
+        
+        def stat(self, remote_path):
+            result = list_files(remote_path, detailed=True)
+            if result.returncode != 0:
+                return None
+            
+            nombre = remote_path.rstrip('/').split('/')[-1]
+            carpeta = remote_path.rstrip('/').rsplit('/', 1)[0] or "/"
+            for entry in parse_ls_long(result.stdout, carpeta):
+                if entry['name'] == nombre:
+                    return StorageEntry(**entry)
+            
+            # mega-ls sobre una carpeta lista su contenido, no la carpeta en sí
+            return StorageEntry(name=nombre, path=remote_path, is_dir=True)
+    
+    storage_backend = MegaStorageBackend()
+
+except ImportError as e:
+    utils.logger.warning(f"Backend de almacenamiento no disponible: {e}")
+    storage_backend = None
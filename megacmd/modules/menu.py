@@ -1,7 +1,11 @@
 import os
 import subprocess
+import time
 from datetime import datetime
 
+# Vigencia de la estimación (dry run) antes de volver a calcularla
+ESTIMACION_TTL_SECONDS = 600
+
 class Tema:
     MORADO = "\033[95m"
     MORADO_CLARO = "\033[35m"
@@ -169,6 +173,9 @@ class MenuBackup:
         self.backup = backup
         self.autobackup = autobackup
         self.megacmd = CloudModuleLoader.load_module("megacmd")
+        # Última estimación (dry run) y cuándo se calculó; vale ESTIMACION_TTL_SECONDS
+        self._ultima_estimacion = None
+        self._estimada_en = 0
     
     def crear_backup_manual(self):
         try:
@@ -221,6 +228,7 @@ class MenuBackup:
             print(pad_linea("Carpeta", Tema.blanco(server_folder)))
             print(pad_linea("Destino", Tema.blanco(backup_folder)))
             print(pad_linea("Máximo", Tema.blanco(f"{max_backups} backups")))
+            print(pad_linea("Próximo", Tema.blanco(self._resumen_estimacion())))
             print(Tema.m("└" + "─" * 48 + "┘"))
             print()
             
@@ -233,9 +241,17 @@ class MenuBackup:
             opciones.extend([
                 "Cambiar intervalo",
                 "Cambiar destino",
-                "Cambiar máximo backups"
+                "Cambiar máximo backups",
+                "Ver estadísticas",
+                "Rendimiento por paso",
+                "Cancelar backup en curso",
+                "Estimar próximo backup"
             ])
             
+            debug_enabled = self.config.CONFIG.get("debug_enabled", False)
+            if debug_enabled:
+                opciones.append("Métricas de eventos (debug)")
+            
             opcion = InputHandler.seleccionar_opcion(opciones)
             
             if opcion == 'x' or opcion is None:
@@ -248,6 +264,16 @@ class MenuBackup:
                 self._cambiar_ruta_guardado(backup_folder)
             elif opcion == 4:
                 self._cambiar_max_backups(max_backups)
+            elif opcion == 5:
+                self._ver_estadisticas()
+            elif opcion == 6:
+                self._ver_rendimiento()
+            elif opcion == 7:
+                self._cancelar_backup()
+            elif opcion == 8:
+                self._estimar_backup()
+            elif opcion == 9 and debug_enabled:
+                self._ver_metricas_eventos()
     
     def _toggle_autobackup(self, estado_actual):
         if estado_actual:
@@ -298,6 +324,16 @@ class MenuBackup:
         )
         
         if nuevo_intervalo:
+            estimacion = self._estimar()
+            print(Tema.m(f"\n  Próximo backup: {self._resumen_estimacion()}"))
+            if estimacion and estimacion['seconds'] > nuevo_intervalo * 60:
+                Display.warning(
+                    f"Tarda más que {nuevo_intervalo} min: los ticks que lo encuentren en curso se saltean"
+                )
+                if not InputHandler.confirmar("¿Aplicar el intervalo igual?"):
+                    InputHandler.pausar()
+                    return
+            
             autobackup_estaba_activo = self.config.CONFIG.get("autobackup_enabled", False)
             
             if autobackup_estaba_activo:
@@ -324,28 +360,241 @@ class MenuBackup:
         ]
         
         opcion = InputHandler.seleccionar_opcion(opciones)
+        nuevo_destino = None
         
         if opcion == 1:
             print(f"\n📁 Cargando...")
-            nueva_ruta = self.backup.navegar_carpetas_mega(backup_folder)
-            if nueva_ruta:
-                self.config.set("backup_folder", nueva_ruta)
-                Display.msg(f"Destino: {nueva_ruta}")
-                self.utils.logger.info(f"Destino: {nueva_ruta}")
-            else:
+            nuevo_destino = self.backup.navegar_carpetas_mega(backup_folder)
+            if not nuevo_destino:
                 print("Cancelado")
         
         elif opcion == 2:
             nuevo_destino = InputHandler.input_texto("Nueva carpeta (ej: /backups)", requerido=False)
-            if nuevo_destino:
-                if not nuevo_destino.startswith("/"):
-                    nuevo_destino = "/" + nuevo_destino
+            if nuevo_destino and not nuevo_destino.startswith("/"):
+                nuevo_destino = "/" + nuevo_destino
+        
+        if nuevo_destino:
+            estimacion = self._estimar()
+            if estimacion:
+                max_backups = self.config.CONFIG.get("max_backups", 5)
+                remoto = estimacion['remote_bytes']
+                print(Tema.m(f"\n  Próximo backup: {self._resumen_estimacion()}"))
+                print(Tema.m(f"  Espacio en {nuevo_destino}: ~{self.utils.formato_bytes(remoto * max_backups)} "
+                             f"({max_backups} backups retenidos)"))
+            if InputHandler.confirmar(f"¿Usar {nuevo_destino} como destino?"):
                 self.config.set("backup_folder", nuevo_destino)
                 Display.msg(f"Destino: {nuevo_destino}")
                 self.utils.logger.info(f"Destino: {nuevo_destino}")
         
         InputHandler.pausar()
     
+    def _ver_estadisticas(self, dias=7):
+        stats = self.backup.obtener_estadisticas_backup(dias)
+        
+        if stats is None:
+            Display.warning("Estadísticas no disponibles")
+            InputHandler.pausar()
+            return
+        
+        print(f"\n{Tema.INFO} Últimos {dias} días\n")
+        print(Tema.m(f"  Exitosos:  {Tema.verde(str(stats['exitosos']))}"))
+        print(Tema.m(f"  Fallidos:  {Tema.rojo(str(stats['fallidos']))}"))
+        
+        for modo, valores in stats['por_modo'].items():
+            print(Tema.m(f"    {modo}: {valores['exitosos']} ok / {valores['fallidos']} error"))
+        
+        if stats['duracion_promedio'] is not None:
+            print(Tema.m(f"  Duración promedio: {stats['duracion_promedio']} s"))
+        if stats['tamano_promedio_mb'] is not None:
+            print(Tema.m(f"  Tamaño promedio:   {stats['tamano_promedio_mb']} MB"))
+        if stats['ultimo_exito']:
+            print(Tema.m(f"  Último exitoso:    {stats['ultimo_exito'].strftime('%d-%m-%Y %H:%M')}"))
+        if stats['ultimo_error']:
+            fecha, error = stats['ultimo_error']
+            print(Tema.m(f"  Último error:      {fecha.strftime('%d-%m-%Y %H:%M')} - {error}"))
+        
+        transfer_queue = CloudModuleLoader.load_module("transfer_queue")
+        subidas = transfer_queue.queue.get_status() if transfer_queue else []
+        if subidas:
+            print(f"\n{Tema.INFO} Subidas en segundo plano\n")
+            for t in subidas:
+                progreso = f" {t['progreso']}" if t['progreso'] else ""
+                print(Tema.m(f"  {t['archivo']} → {t['destino']}: {t['estado']}{progreso} "
+                             f"(intento {t['intentos']}, desde {t['creado']})"))
+        
+        InputHandler.pausar()
+    
+    def _ver_rendimiento(self, ventana=20):
+        try:
+            from core.profiling import profile_history
+        except ImportError:
+            Display.error("Perfiles de pipeline no disponibles")
+            InputHandler.pausar()
+            return
+        
+        pipelines = profile_history.pipelines()
+        if not pipelines:
+            Display.info("Sin corridas registradas todavía")
+            InputHandler.pausar()
+            return
+        
+        for pipeline in pipelines:
+            resumen = profile_history.summarize(pipeline, window=ventana)
+            regresiones = {r['step']: r for r in profile_history.regressions(pipeline)}
+            
+            print(f"\n{Tema.INFO} {pipeline} (últimas {ventana} corridas)\n")
+            print(Tema.m(f"{'Paso':<16} {'N':>3} {'p50':>8} {'p95':>8} {'CPU p50':>8} {'RSS p95':>9} {'Bytes p50':>11}"))
+            print(Tema.m("─" * 68))
+            
+            for paso, r in resumen.items():
+                rss = f"{r['rss_p95_mb']:.0f} MB" if r['rss_p95_mb'] is not None else "-"
+                datos = self.utils.formato_bytes(r['bytes_p50']) if r['bytes_p50'] is not None else "-"
+                linea = (
+                    f"{paso:<16} {r['runs']:>3} {r['wall_p50']:>7.1f}s {r['wall_p95']:>7.1f}s "
+                    f"{r['cpu_p50']:>7.1f}s {rss:>9} {datos:>11}"
+                )
+                print(Tema.rojo(linea) if paso in regresiones else Tema.m(linea))
+            
+            for paso, r in regresiones.items():
+                ratio = f" (x{r['ratio']})" if r.get('ratio') is not None else ""
+                print(Tema.rojo(
+                    f"  ⚠ {paso}: {r['wall_seconds']:.1f}s en la última corrida vs "
+                    f"{r['baseline_seconds']:.1f}s de mediana{ratio}"
+                ))
+        
+        InputHandler.pausar()
+    
+    def _estimar(self, forzar=False):
+        """Dry run del backup automático: no comprime, no sube ni toma el lock"""
+        if not forzar and self._ultima_estimacion and time.time() - self._estimada_en < ESTIMACION_TTL_SECONDS:
+            return self._ultima_estimacion
+        
+        estimar = getattr(self.backup, "estimar_backup", None)
+        print(f"\n{Tema.INFO} Estimando el próximo backup (no se comprime ni se sube nada)...")
+        try:
+            self._ultima_estimacion = estimar("auto") if estimar else None
+        except Exception as e:
+            self._ultima_estimacion = None
+            self.utils.logger.error(f"Error estimando backup: {e}")
+        self._estimada_en = time.time()
+        return self._ultima_estimacion
+    
+    def _resumen_estimacion(self):
+        estimacion = self._ultima_estimacion
+        if not estimacion:
+            return "sin estimación (opción 8)"
+        resumen = f"~{estimacion['seconds'] / 60:.1f} min, {self.utils.formato_bytes(estimacion['remote_bytes'])}"
+        return resumen + (" (parcial)" if estimacion['unknown_steps'] else "")
+    
+    def _estimar_backup(self):
+        estimacion = self._estimar(forzar=True)
+        print()
+        if estimacion is None:
+            Display.warning("Estimación no disponible")
+            InputHandler.pausar()
+            return
+        
+        def bytes_con_signo(valor):
+            if not valor:
+                return "-"
+            signo = "-" if valor < 0 else ""
+            return signo + self.utils.formato_bytes(abs(valor))
+        
+        contexto = estimacion['context']
+        print(Tema.m(f"\n  Carpeta: {contexto.get('server_folder')} "
+                     f"({contexto.get('file_count', 0)} archivos, {contexto.get('size_mb', 0)} MB)\n"))
+        print(Tema.m(f"{'Paso':<14} {'Tiempo':>9} {'Disco':>11} {'Remoto':>11}  Base"))
+        print(Tema.m("─" * 68))
+        for paso, e in estimacion['steps'].items():
+            tiempo = f"{e['seconds']:.1f}s" if e['seconds'] is not None else "?"
+            print(Tema.m(
+                f"{paso:<14} {tiempo:>9} {bytes_con_signo(e['disk_bytes']):>11} "
+                f"{bytes_con_signo(e['remote_bytes']):>11}  {e['basis'] or '-'}"
+            ))
+        
+        intervalo = self.config.CONFIG.get("backup_interval_minutes", 5)
+        max_backups = self.config.CONFIG.get("max_backups", 5)
+        duracion = estimacion['seconds']
+        print()
+        print(Tema.m(f"  Duración estimada: {duracion / 60:.1f} min (ruta: {' → '.join(estimacion['path'])})"))
+        print(Tema.m(f"  Disco local (pico): {bytes_con_signo(estimacion['disk_peak_bytes'])}"))
+        print(Tema.m(f"  Remoto por backup:  {bytes_con_signo(estimacion['remote_bytes'])} "
+                     f"(x{max_backups} retenidos: {bytes_con_signo(estimacion['remote_bytes'] * max_backups)})"))
+        if estimacion['unknown_steps']:
+            Display.info(f"Sin datos para: {', '.join(estimacion['unknown_steps'])} (no cuentan en el total)")
+        if duracion > intervalo * 60:
+            Display.warning(f"Tarda más que el intervalo actual ({intervalo} min)")
+        
+        InputHandler.pausar()
+    
+    def _cancelar_backup(self):
+        try:
+            from core.pipeline import active_runs, cancel_runs
+        except ImportError:
+            Display.error("Sistema de pipeline no disponible")
+            InputHandler.pausar()
+            return
+        
+        corridas = [r for r in active_runs() if r['pipeline'].startswith("backup.")]
+        if not corridas:
+            Display.info("No hay ningún backup en curso")
+            InputHandler.pausar()
+            return
+        
+        print(f"\n{Tema.INFO} Backups en curso:\n")
+        for r in corridas:
+            inicio = datetime.fromtimestamp(r['started_at']).strftime('%H:%M:%S') if r['started_at'] else "-"
+            estado = Tema.amarillo(" (cancelando...)") if r['cancelling'] else ""
+            print(Tema.m(f"  {r['pipeline']} - desde {inicio}{estado}"))
+        
+        if InputHandler.confirmar("\n¿Cancelar el backup en curso?"):
+            cancelados = cancel_runs("backup.", "Cancelado desde el menú")
+            if cancelados:
+                Display.msg("Cancelación pedida: el backup se detiene en el próximo punto seguro")
+                self.utils.logger.info(f"Cancelación de backup solicitada desde el menú ({cancelados})")
+            else:
+                Display.info("El backup ya terminó o se estaba cancelando")
+        
+        InputHandler.pausar()
+    
+    def _ver_metricas_eventos(self):
+        try:
+            from core.events import event_bus
+        except ImportError:
+            Display.error("Sistema de eventos no disponible")
+            InputHandler.pausar()
+            return
+        
+        metricas = event_bus.get_metrics()
+        
+        if not metricas:
+            Display.info("Sin handlers ejecutados todavía")
+            InputHandler.pausar()
+            return
+        
+        print(f"\n{Tema.INFO} Handlers del bus de eventos (por tiempo total)\n")
+        print(Tema.m(f"{'Handler':<44} {'Llam.':>6} {'Err.':>5} {'Prom.':>9} {'p95':>7} {'Máx.':>9}"))
+        print(Tema.m("─" * 84))
+        
+        for nombre, m in metricas.items():
+            nombre_corto = nombre if len(nombre) <= 44 else "…" + nombre[-43:]
+            errores = Tema.rojo(f"{m['errors']:>5}") if m['errors'] else f"{m['errors']:>5}"
+            print(Tema.m(
+                f"{nombre_corto:<44} {m['calls']:>6} {errores} {m['avg_ms']:>7.1f}ms "
+                f"{m['p95_ms']:>5}ms {m['max_ms']:>7.1f}ms"
+            ))
+        
+        stats = event_bus.get_dispatch_stats()
+        print(Tema.m(f"\nCola asíncrona: {stats['pending']} pendientes, {stats['dropped']} descartados"))
+        if event_bus.slow_handler_ms:
+            print(Tema.m(f"Umbral de handler lento: {event_bus.slow_handler_ms:.0f} ms"))
+        
+        if InputHandler.confirmar("\n¿Reiniciar métricas?"):
+            event_bus.reset_metrics()
+            Display.msg("Métricas reiniciadas")
+        
+        InputHandler.pausar()
+    
     def _cambiar_max_backups(self, max_actual):
         print(f"\n{Tema.FOLDER} Actual: {max_actual}")
         print("💡 Recomendado: 5")
@@ -372,15 +621,31 @@ class MenuArchivos:
         self.megacmd = CloudModuleLoader.load_module("megacmd")
     
     def _pause_autobackup(self):
-        if self.autobackup.is_enabled():
-            self.autobackup.stop_autobackup()
+        if not self.autobackup.is_enabled():
+            return False
+        self.autobackup.stop_autobackup()
+        
+        # Detener el timer no frena el backup que ya arrancó
+        try:
+            from core.pipeline import active_runs, cancel_runs
+        except ImportError:
             return True
-        return False
+        en_curso = [r for r in active_runs() if r['pipeline'] == "backup.auto" and not r['cancelling']]
+        if en_curso and InputHandler.confirmar("Hay un backup automático en curso. ¿Cancelarlo?"):
+            if cancel_runs("backup.auto", "Cancelado al pausar el autobackup"):
+                Display.msg("Cancelación pedida: el backup se detiene en el próximo punto seguro")
+                self.utils.logger.info("Backup automático cancelado al pausar el autobackup")
+        return True
     
     def _resume_autobackup(self, was_enabled):
         if was_enabled:
             self.autobackup.start_autobackup()
     
+    def _invalidar_arbol_remoto(self):
+        remote_tree = CloudModuleLoader.load_module("remote_tree")
+        if remote_tree:
+            remote_tree.tree.invalidate()
+    
     def listar_y_descargar(self):
         was_enabled = self._pause_autobackup()
         
@@ -394,20 +659,24 @@ class MenuArchivos:
             
             print(f"{Tema.FOLDER} Carpetas en MEGA:\n")
             
-            result_root = self.megacmd.list_files("/", detailed=True)
+            # Un único recorrido recursivo; las siguientes consultas son en memoria
+            remote_tree = CloudModuleLoader.load_module("remote_tree")
+            raiz = remote_tree.tree.get("/") if remote_tree else None
             
-            if result_root.returncode != 0:
+            if raiz is None:
                 Display.error("No se pudo listar MEGA")
                 return
             
-            carpetas = []
-            for line in result_root.stdout.strip().split('\n'):
-                parts = line.split()
-                if len(parts) >= 2 and parts[0].startswith('d'):
-                    carpetas.append(parts[-1])
+            carpetas = [
+                {
+                    'nombre': carpeta.name,
+                    'size_str': f"{carpeta.file_count} archivos, {self.utils.formato_bytes(carpeta.total_size)}"
+                }
+                for carpeta in raiz.carpetas()
+            ]
             
             if not carpetas:
-                carpetas = [self.config.CONFIG.get("backup_folder", "/backups")]
+                carpetas = [{'nombre': self.config.CONFIG.get("backup_folder", "/backups").strip('/')}]
             
             Display.lista_archivos(carpetas)
             opcion = input(Tema.m("\nCarpeta (0=raíz): ")).strip()
@@ -417,29 +686,22 @@ class MenuArchivos:
             else:
                 try:
                     idx_sel = int(opcion) - 1
-                    ruta = "/" + carpetas[idx_sel] if 0 <= idx_sel < len(carpetas) else "/"
+                    ruta = "/" + carpetas[idx_sel]['nombre'] if 0 <= idx_sel < len(carpetas) else "/"
                 except:
                     ruta = "/"
             
             print(f"\n{Tema.FOLDER} {ruta}\n")
             
-            result = self.megacmd.list_files(ruta, detailed=True)
+            nodo = remote_tree.tree.get(ruta)
             
-            if result.returncode != 0:
+            if nodo is None:
                 Display.error("No se pudo listar")
                 return
             
-            archivos = []
-            for linea in result.stdout.strip().split('\n'):
-                if '.zip' in linea:
-                    partes = linea.split()
-                    if len(partes) >= 2:
-                        nombre = partes[-1]
-                        try:
-                            size_str = partes[0]
-                            archivos.append({'nombre': nombre, 'size_str': size_str})
-                        except:
-                            archivos.append({'nombre': nombre, 'size_str': 'N/A'})
+            archivos = [
+                {'nombre': archivo.name, 'size_str': self.utils.formato_bytes(archivo.size)}
+                for archivo in nodo.archivos('.zip')
+            ]
             
             if not archivos:
                 Display.warning("No hay archivos ZIP")
@@ -530,7 +792,7 @@ class MenuArchivos:
                 return
             
             archivos = [line.strip() for line in result.stdout.split('\n')
-                       if backup_prefix in line and '.zip' in line]
+                       if backup_prefix in line and line.strip().endswith('.zip')]
             archivos.sort(reverse=True)
             
             if not archivos:
@@ -573,6 +835,7 @@ class MenuArchivos:
             elif opcion == 2:
                 if self.backup:
                     self.backup.limpiar_backups_antiguos()
+                    self._invalidar_arbol_remoto()
                 else:
                     Display.error("Módulo no disponible")
             elif opcion == 3:
@@ -604,6 +867,7 @@ class MenuArchivos:
             result_rm = self.megacmd.remove_file(f"{backup_folder}/{archivo_eliminar}")
             
             if result_rm.returncode == 0:
+                self._invalidar_arbol_remoto()
                 Display.msg(f"Eliminado: {archivo_eliminar}")
                 self.utils.logger.info(f"Eliminado: {archivo_eliminar}")
             else:
@@ -658,6 +922,7 @@ class MenuArchivos:
                 self.utils.logger.error(f"Error subiendo {archivo}")
                 return
             
+            self._invalidar_arbol_remoto()
             Display.msg(f"Subido: {os.path.basename(archivo)}")
             self.utils.logger.info(f"Subido: {archivo} -> {backup_folder}")
         
@@ -696,7 +961,7 @@ class MenuArchivos:
             result_ls = self.megacmd.list_files(backup_folder)
             
             if result_ls.returncode == 0:
-                archivos = [line for line in result_ls.stdout.split('\n') if '.zip' in line]
+                archivos = [line for line in result_ls.stdout.split('\n') if line.strip().endswith('.zip')]
                 print(Tema.m(f" {len(archivos)} backups"))
             
             print("\n" + Tema.LINE)
@@ -1,4 +1,5 @@
 from core.events import event_bus, Event
+from core.ipc import is_remote
 
 def setup_discord_observer():
     
@@ -17,7 +18,7 @@ def setup_discord_observer():
         publisher.publish_backup_success(
             backup_file=result.get('backup_name', 'unknown'),
             size_mb=result.get('backup_size_mb', 0),
-            duration_seconds=result.get('duration', 0)
+            duration_seconds=event.data.get('duration_seconds', 0)
         )
     
     def on_backup_failed(event: Event):
@@ -33,5 +34,39 @@ def setup_discord_observer():
             backup_file=context.get('backup_name')
         )
     
-    event_bus.subscribe("backup.*.success", on_backup_success, priority=50)
-    event_bus.subscribe("backup.*.failed", on_backup_failed, priority=50)
\ No newline at end of file
+    def on_backup_cancelled(event: Event):
+        # Cancelar a mano no es un error; vencer el plazo sí merece aviso
+        if not publisher.is_enabled() or not event.data.get('deadline_exceeded'):
+            return
+        
+        context = event.data.get('context', {})
+        publisher.publish_backup_error(
+            error_type="deadline",
+            error_message=event.data.get('reason', 'Plazo vencido'),
+            backup_file=context.get('backup_name')
+        )
+    
+    def on_space_pressure(event: Event):
+        if not publisher.is_enabled():
+            return
+        
+        publisher.publish_storage_pressure(
+            free_bytes=event.data.get('free_bytes', 0),
+            needed_bytes=event.data.get('needed_bytes', 0),
+            deleted_files=event.data.get('deleted_files', []),
+            sufficient=event.data.get('sufficient', True),
+            storage=event.data.get('storage', 'mega')
+        )
+    
+    # Los eventos de otros procesos ya los notificó el proceso que los publicó
+    def solo_locales(event: Event):
+        return not is_remote(event)
+    
+    event_bus.subscribe("backup.*.success", on_backup_success, priority=50,
+                        filter_fn=solo_locales, dispatch="thread")
+    event_bus.subscribe("backup.*.failed", on_backup_failed, priority=50,
+                        filter_fn=solo_locales, dispatch="thread")
+    event_bus.subscribe("backup.*.cancelled", on_backup_cancelled, priority=50,
+                        filter_fn=solo_locales, dispatch="thread")
+    event_bus.subscribe("backup.*.space_pressure", on_space_pressure, priority=50,
+                        filter_fn=solo_locales, dispatch="thread")
\ No newline at end of file
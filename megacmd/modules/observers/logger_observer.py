@@ -1,4 +1,5 @@
 from core.events import event_bus, Event
+from core.ipc import is_remote
 
 def setup_logger_observer():    
     logger = CloudModuleLoader.load_module("logger").logger_manager
@@ -17,6 +18,18 @@ def setup_logger_observer():
         error = event.data.get('error', 'Unknown error')
         logger.error(f"Backup falló: {error}")
     
+    def on_backup_cancelled(event: Event):
+        motivo = event.data.get('reason', 'Cancelado')
+        logger.warning(f"Backup cancelado: {motivo} (pasos completos: {len(event.data.get('completed_steps', []))})")
+    
+    def on_backup_lock_waiting(event: Event):
+        holder = event.data.get('holder') or {}
+        logger.info(f"Backup en espera: lock ocupado por PID {holder.get('pid')} (paso {holder.get('stage')})")
+    
+    def on_backup_lock_busy(event: Event):
+        holder = event.data.get('holder') or {}
+        logger.info(f"Backup no iniciado: lock ocupado por PID {holder.get('pid')} (paso {holder.get('stage')})")
+    
     def on_backup_finished(event: Event):
         logger.info("========== FIN BACKUP ==========")
     
@@ -33,14 +46,54 @@ def setup_logger_observer():
         logger.info("Subiendo a MEGA...")
     
     def on_upload_success(event: Event):
+        if event.data.get('result', {}).get('upload_queued'):
+            logger.info("Subida encolada en segundo plano")
+            return
         logger.info("Subida completada")
     
-    event_bus.subscribe("backup.*.started", on_backup_started, priority=100)
-    event_bus.subscribe("backup.*.success", on_backup_success, priority=100)
-    event_bus.subscribe("backup.*.failed", on_backup_failed, priority=100)
-    event_bus.subscribe("backup.*.finished", on_backup_finished, priority=100)
+    def on_step_retrying(event: Event):
+        logger.warning(
+            f"Paso {event.data.get('step_name')} falló (intento {event.data.get('attempt')}/"
+            f"{event.data.get('max_attempts')}): {event.data.get('error')} - "
+            f"reintento en {event.data.get('delay_seconds', 0):.0f}s"
+        )
+    
+    def on_background_upload_completed(event: Event):
+        logger.info(f"Subida en segundo plano completada: {event.data.get('remote_path')}")
+    
+    def on_background_upload_failed(event: Event):
+        logger.error(f"Subida en segundo plano falló: {event.data.get('error')}")
+    
+    # El proceso que publicó el evento ya lo escribió en el log compartido
+    def solo_locales(event: Event):
+        return not is_remote(event)
+    
+    event_bus.subscribe("backup.*.started", on_backup_started, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.success", on_backup_success, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.failed", on_backup_failed, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.cancelled", on_backup_cancelled, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.finished", on_backup_finished, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.lock_waiting", on_backup_lock_waiting, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.lock_busy", on_backup_lock_busy, priority=100,
+                        filter_fn=solo_locales)
   
-    event_bus.subscribe("backup.*.step.compress.started", on_compress_started, priority=100)
-    event_bus.subscribe("backup.*.step.compress.success", on_compress_success, priority=100)
-    event_bus.subscribe("backup.*.step.upload.started", on_upload_started, priority=100)
-    event_bus.subscribe("backup.*.step.upload.success", on_upload_success, priority=100)
\ No newline at end of file
+    event_bus.subscribe("backup.*.step.compress.started", on_compress_started, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.step.compress.success", on_compress_success, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.step.upload.started", on_upload_started, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.step.upload.success", on_upload_success, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.step.*.retrying", on_step_retrying, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.upload.completed", on_background_upload_completed, priority=100,
+                        filter_fn=solo_locales)
+    event_bus.subscribe("backup.*.upload.failed", on_background_upload_failed, priority=100,
+                        filter_fn=solo_locales)
\ No newline at end of file
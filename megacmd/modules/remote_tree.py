@@ -0,0 +1,249 @@
+import time
+import threading
+
+utils = CloudModuleLoader.load_module("utils")
+megacmd = CloudModuleLoader.load_module("megacmd")
+
+try:
+    from core.events import event_bus
+except ImportError:
+    event_bus = None
+
+# Antigüedad a partir de la cual se refresca en segundo plano
+MAX_AGE_SECONDS = 300
+# Tras un mega-find fallido no se reintenta antes de este plazo (se duplica con cada fallo)
+FAILURE_BACKOFF_SECONDS = 60
+MAX_FAILURE_BACKOFF_SECONDS = 900
+
+
+class RemoteNode:
+    def __init__(self, name, path, is_dir=True, size=0, modified=None):
+        self.name = name
+        self.path = path
+        self.is_dir = is_dir
+        self.size = size
+        self.modified = modified
+        self.children = {}
+        self.file_count = 0
+        self.total_size = 0
+        # False: carpeta del listado de respaldo (mega-ls) cuyo contenido aún no se leyó
+        self.listado = True
+
+    def carpetas(self):
+        return sorted((n for n in self.children.values() if n.is_dir), key=lambda n: n.name)
+
+    def archivos(self, sufijo=None):
+        return sorted(
+            (n for n in self.children.values()
+             if not n.is_dir and (sufijo is None or n.name.endswith(sufijo))),
+            key=lambda n: n.name
+        )
+
+    def _acumular(self):
+        # Totales recursivos calculados una sola vez al construir el árbol
+        self.file_count = 0
+        self.total_size = 0
+        for hijo in self.children.values():
+            if hijo.is_dir:
+                hijo._acumular()
+                self.file_count += hijo.file_count
+                self.total_size += hijo.total_size
+            else:
+                self.file_count += 1
+                self.total_size += hijo.size
+
+
+def construir_arbol(entries, root="/"):
+    raiz = RemoteNode(root.rstrip('/').rsplit('/', 1)[-1] or '/', root.rstrip('/') or '/')
+    prefijo = raiz.path.rstrip('/')
+
+    # Ordenar por profundidad garantiza que el padre exista antes que el hijo
+    for entry in sorted(entries, key=lambda e: e['path'].count('/')):
+        ruta = entry['path']
+        if ruta == raiz.path or not ruta.startswith(prefijo + '/'):
+            continue
+
+        padre = raiz
+        partes = ruta[len(prefijo) + 1:].split('/')
+        for parte in partes[:-1]:
+            if parte not in padre.children:
+                # Carpeta intermedia que mega-find no listó por separado
+                padre.children[parte] = RemoteNode(parte, f"{padre.path.rstrip('/')}/{parte}")
+            padre = padre.children[parte]
+
+        nombre = partes[-1]
+        existente = padre.children.get(nombre)
+        if existente is not None and existente.is_dir and entry['is_dir']:
+            existente.modified = entry.get('modified')
+            continue
+
+        padre.children[nombre] = RemoteNode(
+            nombre, ruta,
+            is_dir=entry['is_dir'],
+            size=entry.get('size', 0),
+            modified=entry.get('modified')
+        )
+
+    raiz._acumular()
+    return raiz
+
+
+class RemoteTree:
+    def __init__(self, root="/", max_age=MAX_AGE_SECONDS):
+        self.root = root
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._arbol = None
+        self._actualizado = 0
+        self._stale = False
+        self._thread = None
+        # Árbol armado con mega-ls mientras mega-find falla: se completa carpeta por carpeta
+        self._parcial = False
+        self._fallos = 0
+        self._reintentar_en = 0
+
+    def refresh(self):
+        inicio = time.time()
+        entries = megacmd.find_all(self.root)
+        if entries is None:
+            self._registrar_fallo()
+            return False
+
+        arbol = construir_arbol(entries, self.root)
+        with self._lock:
+            self._arbol = arbol
+            self._actualizado = time.time()
+            self._stale = False
+            self._parcial = False
+            self._fallos = 0
+            self._reintentar_en = 0
+
+        utils.logger.debug(
+            f"Árbol remoto actualizado: {len(entries)} entradas en {time.time() - inicio:.1f}s"
+        )
+        return True
+
+    def _registrar_fallo(self):
+        with self._lock:
+            self._fallos += 1
+            espera = min(FAILURE_BACKOFF_SECONDS * 2 ** (self._fallos - 1), MAX_FAILURE_BACKOFF_SECONDS)
+            self._reintentar_en = time.time() + espera
+        utils.logger.warning(f"mega-find falló; se usará mega-ls y se reintentará en {espera}s")
+
+    def _listar(self, path):
+        result = megacmd.list_files(path, detailed=True)
+        if result.returncode != 0:
+            return None
+        return megacmd.parse_ls_long(result.stdout, path)
+
+    def _marcar_sin_listar(self, nodo):
+        for hijo in nodo.children.values():
+            if hijo.is_dir:
+                hijo.listado = False
+
+    def _cargar_parcial(self):
+        entries = self._listar(self.root)
+        if entries is None:
+            return None
+
+        arbol = construir_arbol(entries, self.root)
+        self._marcar_sin_listar(arbol)
+        with self._lock:
+            self._arbol = arbol
+            self._actualizado = time.time()
+            self._parcial = True
+        return arbol
+
+    def _completar(self, nodo):
+        # Solo en el árbol parcial: un mega-ls de la carpeta al entrar en ella
+        if nodo.listado:
+            return
+        entries = self._listar(nodo.path)
+        if entries is None:
+            return
+        sub = construir_arbol(entries, nodo.path)
+        self._marcar_sin_listar(sub)
+        nodo.children = sub.children
+        nodo.listado = True
+        nodo._acumular()
+
+    def refresh_async(self):
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._refresh_safe, daemon=True)
+            self._thread.start()
+
+    def _refresh_safe(self):
+        try:
+            self.refresh()
+        except Exception as e:
+            utils.logger.warning(f"Error actualizando árbol remoto: {e}")
+
+    def invalidate(self):
+        with self._lock:
+            self._stale = True
+
+    def is_stale(self):
+        return self._parcial or self._stale or time.time() - self._actualizado > self.max_age
+
+    def ensure(self):
+        # Primera carga bloqueante; después se sirve la copia en memoria
+        # y se refresca en segundo plano si quedó vieja. Mientras corre el
+        # plazo de un mega-find fallido no se reintenta: se usa mega-ls
+        en_espera = time.time() < self._reintentar_en
+        if self._arbol is None:
+            if en_espera or not self.refresh():
+                return self._cargar_parcial()
+        elif self.is_stale() and not en_espera:
+            self.refresh_async()
+        return self._arbol
+
+    def get(self, path):
+        arbol = self.ensure()
+        if arbol is None:
+            return None
+
+        path = path.rstrip('/') or '/'
+        if path == arbol.path:
+            return arbol
+
+        prefijo = arbol.path.rstrip('/')
+        if not path.startswith(prefijo + '/'):
+            return None
+
+        nodo = arbol
+        for parte in path[len(prefijo) + 1:].split('/'):
+            self._completar(nodo)
+            nodo = nodo.children.get(parte)
+            if nodo is None or not nodo.is_dir:
+                return None
+        self._completar(nodo)
+        return nodo
+
+    def antiguedad(self):
+        return time.time() - self._actualizado if self._actualizado else None
+
+
+tree = RemoteTree()
+
+
+def setup_remote_tree_observer():
+    if event_bus is None:
+        return
+    
+    # Subidas y limpiezas cambian el contenido remoto
+    def on_remote_changed(event):
+        tree.invalidate()
+    
+    event_bus.subscribe("backup.*.success", on_remote_changed, priority=10)
+    event_bus.subscribe("backup.*.upload.completed", on_remote_changed, priority=10)
+
+
+__all__ = [
+    'RemoteNode',
+    'RemoteTree',
+    'construir_arbol',
+    'setup_remote_tree_observer',
+    'tree'
+]
@@ -0,0 +1,162 @@
+import os
+from datetime import datetime
+
+config = CloudModuleLoader.load_module("config")
+utils = CloudModuleLoader.load_module("utils")
+
+from core.storage import StorageBackend, LocalStorageBackend
+
+_backends = {}
+
+def get_backend(nombre=None):
+    nombre = nombre or config.CONFIG.get("storage_backend", "mega")
+    
+    if nombre == "local":
+        ruta = config.CONFIG.get("storage_local_path") or os.path.expanduser("~/.d0ce3_addons/storage")
+        clave = f"local:{ruta}"
+        if clave not in _backends:
+            _backends[clave] = LocalStorageBackend(ruta)
+            utils.logger.info(f"Backend de almacenamiento local: {ruta}")
+        return _backends[clave]
+    
+    if nombre != "mega":
+        utils.logger.warning(f"Backend '{nombre}' desconocido, usando MEGA")
+    
+    megacmd = CloudModuleLoader.load_module("megacmd")
+    return megacmd.storage_backend
+
+def is_mega(backend):
+    return getattr(backend, 'name', None) == "mega"
+
+def extraer_fecha_backup(nombre_archivo):
+    try:
+        partes = nombre_archivo.replace('.zip', '').split('_')
+        if len(partes) >= 3:
+            fecha_str = partes[-2]
+            hora_str = partes[-1]
+            return datetime.strptime(f"{fecha_str}_{hora_str}", "%d-%m-%Y_%H-%M")
+    except:
+        pass
+    return datetime.min
+
+def filtrar_backups(entries, backup_prefix):
+    backups = [e for e in entries
+               if not e.is_dir and backup_prefix in e.name and e.name.endswith('.zip')]
+    backups.sort(key=lambda e: extraer_fecha_backup(e.name), reverse=True)
+    return backups
+
+def liberar_espacio(storage, backup_folder, backup_prefix, max_backups, bytes_necesarios):
+    quota = storage.quota()
+    if quota is None:
+        return {'quota_checked': False}
+    
+    resultado = {
+        'quota_checked': True,
+        'quota_free_bytes': quota['free'],
+        'quota_needed_bytes': bytes_necesarios,
+        'space_pruned': []
+    }
+    
+    libre = quota['free']
+    if libre >= bytes_necesarios:
+        resultado['space_sufficient'] = True
+        return resultado
+    
+    entries = storage.list(backup_folder)
+    if entries is None:
+        resultado['space_sufficient'] = False
+        return resultado
+    
+    sidecars = {e.name for e in entries if e.name.endswith('.sha256')}
+    
+    # La retención posterior conserva max_backups contando el nuevo: solo son
+    # elegibles los que se borrarían de todas formas tras la subida
+    elegibles = filtrar_backups(entries, backup_prefix)[max(max_backups - 1, 0):]
+    
+    while libre < bytes_necesarios and elegibles:
+        viejo = elegibles.pop()
+        if not storage.delete(storage.join(backup_folder, viejo.name)):
+            continue
+        libre += viejo.size
+        resultado['space_pruned'].append(viejo.name)
+        utils.logger.info(f"Eliminado por falta de espacio: {viejo.name} ({utils.formato_bytes(viejo.size)})")
+        if f"{viejo.name}.sha256" in sidecars:
+            storage.delete(storage.join(backup_folder, f"{viejo.name}.sha256"))
+    
+    resultado['quota_free_bytes'] = libre
+    resultado['space_sufficient'] = libre >= bytes_necesarios
+    if not resultado['space_sufficient']:
+        utils.logger.warning(
+            f"Espacio insuficiente en {storage.name.upper()}: libre {utils.formato_bytes(libre)}, "
+            f"necesario {utils.formato_bytes(bytes_necesarios)} (mínimo de {max_backups} backups respetado)"
+        )
+    return resultado
+
+def verificar_subida(storage, local_file, remote_folder, entries=None, sha_local=None):
+    nombre = os.path.basename(local_file)
+    remote_path = storage.join(remote_folder, nombre)
+    local_size = os.path.getsize(local_file)
+    
+    # Se reutiliza el listado de la carpeta si ya se obtuvo (ej: para la retención)
+    if entries is None:
+        entries = storage.list(remote_folder)
+    remoto = next((e for e in entries or [] if e.name == nombre), None)
+    if remoto is None:
+        remoto = storage.stat(remote_path)
+    
+    resultado = {
+        'verified': False,
+        'local_size': local_size,
+        'remote_size': remoto.size if remoto else None
+    }
+    
+    if remoto is None:
+        resultado['verify_error'] = f"{remote_path} no encontrado en {storage.name.upper()}"
+        return resultado
+    
+    if remoto.size != local_size:
+        resultado['verify_error'] = f"Tamaño remoto {remoto.size} != local {local_size}"
+        return resultado
+    
+    # El hash calculado al comprimir evita releer el archivo completo
+    if sha_local is None:
+        sha_local = utils.calcular_sha256(local_file)
+    sha_remoto = storage.checksum(remote_path)
+    
+    if sha_remoto and sha_remoto != sha_local:
+        resultado['verify_error'] = "SHA-256 remoto no coincide"
+        return resultado
+    
+    resultado.update({
+        'verified': True,
+        'sha256': sha_local,
+        'remote_hash_checked': sha_remoto is not None
+    })
+    return resultado
+
+def subir_checksum(storage, local_file, remote_folder, sha256):
+    sidecar = f"{local_file}.sha256"
+    try:
+        with open(sidecar, 'w', encoding='utf-8') as f:
+            f.write(f"{sha256}  {os.path.basename(local_file)}\n")
+        return storage.put(sidecar, remote_folder)
+    except Exception as e:
+        utils.logger.warning(f"No se pudo subir checksum de {local_file}: {e}")
+        return False
+    finally:
+        try:
+            os.remove(sidecar)
+        except OSError:
+            pass
+
+__all__ = [
+    'StorageBackend',
+    'LocalStorageBackend',
+    'get_backend',
+    'is_mega',
+    'extraer_fecha_backup',
+    'filtrar_backups',
+    'liberar_espacio',
+    'verificar_subida',
+    'subir_checksum'
+]
@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+utils = CloudModuleLoader.load_module("utils")
+megacmd = CloudModuleLoader.load_module("megacmd")
+
+try:
+    from core.events import event_bus
+except ImportError:
+    event_bus = None
+
+try:
+    from core.locking import ProcessLock, LockBusyError
+except ImportError:
+    ProcessLock = None
+
+ADDONS_DIR = os.path.expanduser('~/.d0ce3_addons')
+os.makedirs(ADDONS_DIR, exist_ok=True)
+QUEUE_FILE = os.path.join(ADDONS_DIR, '.transfer_queue.json')
+
+POLL_INTERVAL_SECONDS = 15
+MAX_SUBMISSIONS = 3
+# Tiempo que se espera a que MEGAcmd muestre la transferencia antes de reenviarla
+LOST_GRACE_SECONDS = 120
+
+ESTADOS_EN_CURSO = ('QUEUED', 'ACTIVE', 'PAUSED', 'RETRYING', 'COMPLETING')
+ESTADOS_FALLIDOS = ('FAILED', 'CANCELLED')
+
+
+class TransferQueue:
+    def __init__(self, queue_file=QUEUE_FILE, poll_interval=POLL_INTERVAL_SECONDS):
+        self.queue_file = queue_file
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        # Serializa las consultas; _lock solo protege el archivo, para no frenar enqueue()
+        self._poll_lock = threading.Lock()
+        self._timer = None
+        # El menú y el autobackup comparten el archivo: también se excluyen entre procesos
+        directorio = os.path.dirname(os.path.abspath(queue_file))
+        nombre = os.path.basename(queue_file).lstrip('.')
+        self._file_process_lock = ProcessLock(f"{nombre}.file", directorio) if ProcessLock else None
+        self._poll_process_lock = ProcessLock(f"{nombre}.poll", directorio) if ProcessLock else None
+        # Límite de subida vigente antes de que poll() aplicara el horario; None si no lo tocó
+        self._limite_previo = None
+
+    @contextmanager
+    def _archivo(self):
+        """Lock para leer-modificar-guardar la cola (reentrante dentro del mismo hilo)"""
+        with self._lock:
+            if self._file_process_lock is None or self._file_process_lock.held:
+                yield
+                return
+            self._file_process_lock.acquire('wait', owner="transfer_queue")
+            try:
+                yield
+            finally:
+                self._file_process_lock.release()
+
+    def _load(self):
+        if not os.path.exists(self.queue_file):
+            return []
+
+        try:
+            with open(self.queue_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data.get('transfers', [])
+        except Exception as e:
+            utils.logger.warning(f"Cola de transferencias ilegible, se reinicia: {e}")
+            return []
+
+    def _save(self, entries):
+        tmp_file = f"{self.queue_file}.tmp"
+        try:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'transfers': entries}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_file, self.queue_file)
+        except Exception as e:
+            utils.logger.error(f"Error guardando cola de transferencias: {e}")
+
+    def enqueue(self, local_file, remote_folder, delete_local=False, pipeline=None, metadata=None):
+        entry = {
+            'id': uuid.uuid4().hex[:12],
+            'local_file': os.path.abspath(local_file),
+            'remote_folder': remote_folder.rstrip('/') or '/',
+            'file_name': os.path.basename(local_file),
+            'delete_local': delete_local,
+            'pipeline': pipeline,
+            'metadata': metadata or {},
+            'state': 'PENDING',
+            'submissions': 0,
+            'created_at': time.time(),
+            'submitted_at': None,
+            'last_error': None
+        }
+
+        self._submit(entry)
+
+        with self._archivo():
+            entries = self._load()
+            entries.append(entry)
+            self._save(entries)
+
+        utils.logger.info(f"Transferencia {entry['id']} encolada: {entry['file_name']} -> {entry['remote_folder']}")
+        self._ensure_polling()
+        return entry['id']
+
+    def _submit(self, entry):
+        if not os.path.exists(entry['local_file']):
+            entry['state'] = 'FAILED'
+            entry['last_error'] = "Archivo local no encontrado"
+            return False
+
+        result = megacmd.enqueue_upload(entry['local_file'], entry['remote_folder'])
+        entry['submissions'] += 1
+        entry['submitted_at'] = time.time()
+
+        if result.returncode != 0:
+            entry['state'] = 'PENDING'
+            entry['last_error'] = result.stderr.strip() or f"returncode {result.returncode}"
+            return False
+
+        entry['state'] = 'SUBMITTED'
+        entry['last_error'] = None
+        return True
+
+    def _remote_path(self, entry):
+        return f"{entry['remote_folder'].rstrip('/')}/{entry['file_name']}"
+
+    def _find_transfer(self, entry, transfers):
+        for transfer in transfers:
+            if transfer['source'] == entry['local_file'] and \
+               transfer['destination'].rstrip('/').startswith(entry['remote_folder'].rstrip('/')):
+                return transfer
+        return None
+
+    @contextmanager
+    def _turno_de_consulta(self):
+        """True si este proceso puede consultar ahora; False si otro ya lo está haciendo"""
+        if self._poll_process_lock is None:
+            yield True
+            return
+        try:
+            self._poll_process_lock.acquire('skip', owner="transfer_queue")
+        except LockBusyError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            self._poll_process_lock.release()
+
+    def poll(self):
+        with self._poll_lock, self._turno_de_consulta() as turno:
+            # Dos procesos consultando a la vez finalizarían (y notificarían) dos veces
+            # la misma transferencia: si otro ya consulta, esta ronda se salta
+            if not turno:
+                return len(self.pending())
+
+            # Las llamadas a MEGAcmd corren sin el lock: enqueue() no espera a los subprocesos
+            with self._archivo():
+                entries = self._load()
+            if not entries:
+                self._restaurar_limite()
+                return 0
+
+            self._ajustar_limite()
+            
+            transfers = megacmd.list_transfers()
+            if transfers is None:
+                return len(entries)
+
+            for entry in entries:
+                if entry['state'] in ('COMPLETED', 'FAILED'):
+                    continue
+
+                if entry['state'] == 'PENDING':
+                    self._retry(entry)
+                    continue
+
+                transfer = self._find_transfer(entry, transfers)
+                estado = transfer['state'] if transfer else None
+
+                if estado == 'COMPLETED':
+                    self._verify_and_finish(entry)
+                elif estado in ESTADOS_FALLIDOS:
+                    entry['last_error'] = f"MEGAcmd reportó {estado}"
+                    self._retry(entry)
+                elif estado in ESTADOS_EN_CURSO:
+                    entry['state'] = 'SUBMITTED'
+                    entry['progress'] = transfer['progress']
+                else:
+                    # MEGAcmd ya no lista la transferencia (p.ej. reinicio del servidor)
+                    if megacmd.remote_exists(self._remote_path(entry)):
+                        self._verify_and_finish(entry)
+                    elif time.time() - (entry['submitted_at'] or 0) > LOST_GRACE_SECONDS:
+                        entry['last_error'] = "Transferencia perdida"
+                        self._retry(entry)
+
+            # Lo encolado mientras tanto no estaba en la instantánea y se conserva tal cual
+            actualizadas = {entry['id']: entry for entry in entries}
+            with self._archivo():
+                restantes = [
+                    entry for entry in (actualizadas.get(e['id'], e) for e in self._load())
+                    if entry['state'] not in ('COMPLETED', 'FAILED')
+                ]
+                self._save(restantes)
+            if not restantes:
+                self._restaurar_limite()
+            return len(restantes)
+
+    def _ajustar_limite(self):
+        # Reajustar el límite de subida mientras haya transferencias en curso
+        try:
+            bandwidth = CloudModuleLoader.load_module("bandwidth")
+            if not bandwidth or not bandwidth.scheduler.is_enabled():
+                return
+            if self._limite_previo is None:
+                self._limite_previo = megacmd.get_upload_speed_limit()
+            bandwidth.scheduler.aplicar()
+        except Exception as e:
+            utils.logger.debug(f"No se pudo ajustar ancho de banda: {e}")
+
+    def _restaurar_limite(self):
+        limite, self._limite_previo = self._limite_previo, None
+        if limite is None:
+            return
+        try:
+            bandwidth = CloudModuleLoader.load_module("bandwidth")
+            if bandwidth:
+                bandwidth.scheduler.restaurar(limite)
+        except Exception as e:
+            utils.logger.warning(f"No se pudo restaurar el límite de subida: {e}")
+
+    def _verify_and_finish(self, entry):
+        if not os.path.exists(entry['local_file']):
+            self._finish(entry, True)
+            return
+        
+        storage_backends = CloudModuleLoader.load_module("storage_backends")
+        storage = megacmd.storage_backend
+        if storage is None or storage_backends is None:
+            # Sin core.storage no hay cómo verificar: el archivo local se conserva
+            self._finish(entry, False, "No se pudo verificar: backend de almacenamiento no disponible")
+            return
+        resultado = storage_backends.verificar_subida(storage, entry['local_file'], entry['remote_folder'])
+        
+        if not resultado['verified']:
+            entry['last_error'] = resultado.get('verify_error')
+            self._retry(entry)
+            return
+        
+        storage_backends.subir_checksum(storage, entry['local_file'], entry['remote_folder'], resultado['sha256'])
+        entry['metadata']['sha256'] = resultado['sha256']
+        self._finish(entry, True)
+    
+    def _retry(self, entry):
+        if entry['submissions'] >= MAX_SUBMISSIONS:
+            self._finish(entry, False, entry['last_error'])
+            return
+        utils.logger.warning(f"Reintentando transferencia {entry['id']}: {entry['last_error']}")
+        self._submit(entry)
+
+    def _finish(self, entry, success, error=None):
+        entry['state'] = 'COMPLETED' if success else 'FAILED'
+        entry['finished_at'] = time.time()
+        duration = entry['finished_at'] - entry['created_at']
+
+        if success:
+            utils.logger.info(f"Transferencia {entry['id']} completada: {self._remote_path(entry)} ({duration:.0f}s)")
+            if entry['delete_local'] and os.path.exists(entry['local_file']):
+                try:
+                    os.remove(entry['local_file'])
+                    utils.logger.info(f"Archivo local eliminado: {entry['local_file']}")
+                except Exception as e:
+                    utils.logger.warning(f"No se pudo eliminar archivo local: {e}")
+        else:
+            utils.logger.error(f"Transferencia {entry['id']} falló: {error}")
+
+        if event_bus is None:
+            return
+
+        topic = f"{entry['pipeline']}.upload" if entry.get('pipeline') else "transfer"
+        event_bus.publish(
+            f"{topic}.{'completed' if success else 'failed'}",
+            transfer_id=entry['id'],
+            local_file=entry['local_file'],
+            remote_path=self._remote_path(entry),
+            duration_seconds=duration,
+            error=error,
+            **entry.get('metadata', {})
+        )
+
+    def pending(self):
+        with self._archivo():
+            return [e for e in self._load() if e['state'] not in ('COMPLETED', 'FAILED')]
+
+    def resume(self):
+        pendientes = self.pending()
+        if not pendientes:
+            return 0
+
+        utils.logger.info(f"Reanudando {len(pendientes)} transferencia(s) pendiente(s)")
+        self._ensure_polling(immediate=True)
+        return len(pendientes)
+
+    def _ensure_polling(self, immediate=False):
+        with self._lock:
+            if self._timer and self._timer.is_alive():
+                return
+            self._timer = threading.Timer(0 if immediate else self.poll_interval, self._poll_callback)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _poll_callback(self):
+        try:
+            restantes = self.poll()
+        except Exception as e:
+            utils.logger.error(f"Error consultando transferencias: {e}")
+            restantes = 1
+
+        with self._lock:
+            self._timer = None
+
+        if restantes:
+            self._ensure_polling()
+
+    def stop(self):
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def get_status(self):
+        return [
+            {
+                'id': e['id'],
+                'archivo': e['file_name'],
+                'destino': e['remote_folder'],
+                'estado': e['state'],
+                'progreso': e.get('progress', ''),
+                'intentos': e['submissions'],
+                'creado': datetime.fromtimestamp(e['created_at']).strftime("%d-%m-%Y %H:%M")
+            }
+            for e in self.pending()
+        ]
+
+
+queue = TransferQueue()
+
+__all__ = [
+    'TransferQueue',
+    'queue'
+]
@@ -69,12 +69,18 @@ class Spinner:
         self.mensaje = mensaje
         self.chars = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
     
-    def start(self, proceso, check_file=None):
+    def start(self, proceso, check_file=None, cancel_token=None):
         import time
         inicio = time.time()
         idx = 0
         
         while proceso.poll() is None:
+            if cancel_token is not None and cancel_token.cancelled:
+                from core.cancellation import terminate_process
+                terminate_process(proceso)
+                print(f"\r{self.mensaje} cancelado" + " " * 20)
+                logger.warning(f"{self.mensaje} cancelado: {cancel_token.reason}")
+                cancel_token.check()
             print(f"\r{self.chars[idx % len(self.chars)]} {self.mensaje}...", end='', flush=True)
             idx += 1
             time.sleep(0.1)
@@ -185,6 +191,14 @@ def obtener_tamano_directorio(ruta):
         logger.warning(f"Error calculando tamaño de {ruta}: {e}")
     return total
 
+def calcular_sha256(ruta, chunk_size=1024 * 1024):
+    import hashlib
+    sha = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
 def es_directorio_valido(ruta):
     return os.path.exists(ruta) and os.path.isdir(ruta)
 
@@ -205,5 +219,6 @@ __all__ = [
     'verificar_megacmd',
     'manejar_error',
     'obtener_tamano_directorio',
+    'calcular_sha256',
     'es_directorio_valido'
 ]
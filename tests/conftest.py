@@ -0,0 +1,46 @@
+import builtins
+import os
+import sys
+import tempfile
+import types
+
+# Los módulos resuelven ~/.d0ce3_addons al cargarse: que no toquen el HOME real
+os.environ['HOME'] = tempfile.mkdtemp(prefix='d0ce3-tests-')
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'megacmd')
+sys.path.insert(0, ROOT)
+
+
+class ModuleLoader:
+    """Versión mínima del ModuleLoader de d0ce3_tools.py: ejecuta modules/<nombre>.py"""
+
+    _cache = {}
+
+    @staticmethod
+    def load_module(module_name):
+        if module_name in ModuleLoader._cache:
+            return ModuleLoader._cache[module_name]
+
+        for carpeta in ('modules', os.path.join('modules', 'observers')):
+            module_file = os.path.join(ROOT, carpeta, f"{module_name}.py")
+            if os.path.exists(module_file):
+                break
+        else:
+            return None
+
+        module = types.ModuleType(module_name)
+        module.__dict__.update({
+            '__file__': module_file,
+            'ModuleLoader': ModuleLoader,
+            'CloudModuleLoader': ModuleLoader,
+            'SCRIPT_BASE_DIR': os.environ['HOME']
+        })
+        ModuleLoader._cache[module_name] = module
+        sys.modules[module_name] = module
+        with open(module_file, 'r', encoding='utf-8') as f:
+            exec(compile(f.read(), module_file, 'exec'), module.__dict__)
+        return module
+
+
+# En producción lo inyecta el loader en cada módulo; core/ y los tests lo buscan como builtin
+builtins.CloudModuleLoader = ModuleLoader
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import pytest
+
+bandwidth = CloudModuleLoader.load_module("bandwidth")
+
+NOCHE = {'inicio': "22:00", 'fin': "02:00", 'limite_kbs': 500}
+TARDE = {'inicio': "18:00", 'fin': "22:00", 'limite_kbs': 1000}
+
+
+def a_las(hora, minuto=0):
+    return datetime(2026, 1, 1, hora, minuto)
+
+
+@pytest.mark.parametrize('ahora, esperada', [
+    (a_las(23, 30), NOCHE),
+    (a_las(0, 0), NOCHE),
+    (a_las(1, 59), NOCHE),
+    (a_las(2, 0), None),
+    (a_las(21, 59), TARDE),
+    (a_las(22, 0), NOCHE),
+    (a_las(12, 0), None),
+])
+def test_ventana_activa_cruza_medianoche(ahora, esperada):
+    assert bandwidth.ventana_activa([TARDE, NOCHE], ahora) == esperada
+
+
+def test_ventana_invalida_se_ignora():
+    ventanas = [{'inicio': "xx"}, NOCHE]
+    assert bandwidth.ventana_activa(ventanas, a_las(23)) == NOCHE
+
+
+def test_calcular_limite_en_ventana_nocturna():
+    schedule = {'windows': [NOCHE], 'default_kbs': 2000}
+    decision = bandwidth.calcular_limite(schedule, None, a_las(1))
+    assert decision == {'limit_kbs': 500, 'players': None, 'window': "22:00-02:00"}
+    assert bandwidth.calcular_limite(schedule, None, a_las(3))['limit_kbs'] == 2000
+
+
+def test_calcular_limite_por_jugadores():
+    schedule = {'windows': [NOCHE], 'default_kbs': 2000, 'per_player_kbs': 100,
+                'min_kbs': 300, 'empty_server_kbs': 0}
+    assert bandwidth.calcular_limite(schedule, 3, a_las(12))['limit_kbs'] == 1700
+    # Nunca por debajo del mínimo
+    assert bandwidth.calcular_limite(schedule, 3, a_las(23))['limit_kbs'] == 300
+    # Servidor vacío: sin límite, aunque haya ventana
+    assert bandwidth.calcular_limite(schedule, 0, a_las(23))['limit_kbs'] == 0
@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from core.cancellation import CancellationToken, PipelineCancelledError
+
+
+def test_token_sin_plazo():
+    token = CancellationToken()
+    assert token.remaining() is None
+    assert not token.wait(0.01)
+    token.check()
+
+
+def test_plazo_vencido_cancela_el_token():
+    token = CancellationToken(0.05)
+    assert 0 < token.remaining() <= 0.05
+    assert token.wait(2)
+    assert token.deadline_exceeded
+    assert token.remaining() == 0
+    with pytest.raises(PipelineCancelledError) as info:
+        token.check()
+    assert info.value.deadline_exceeded
+
+
+def test_cancelar_conserva_el_primer_motivo():
+    token = CancellationToken(10)
+    assert token.cancel("primero")
+    assert not token.cancel("segundo")
+    assert token.reason == "primero"
+    assert not token.deadline_exceeded
+
+
+def test_release_desarma_el_plazo():
+    token = CancellationToken(0.05)
+    token.release()
+    assert not token.wait(0.2)
+
+
+def test_on_cancel_y_su_remocion():
+    token = CancellationToken()
+    llamados = []
+    quitar = token.on_cancel(lambda: llamados.append("a"))
+    token.on_cancel(lambda: llamados.append("b"))
+    quitar()
+    token.cancel()
+    assert llamados == ["b"]
+    # Ya cancelado: el callback corre enseguida
+    token.on_cancel(lambda: llamados.append("c"))
+    assert llamados == ["b", "c"]
+
+
+def test_hijo_vence_su_propio_plazo_sin_cancelar_al_padre():
+    padre = CancellationToken(10)
+    hijo = padre.child(0.05)
+    assert hijo.wait(2)
+    assert hijo.deadline_exceeded
+    assert not padre.cancelled
+    hijo.release()
+    padre.release()
+
+
+def test_hijo_hereda_plazo_y_cancelacion_del_padre():
+    padre = CancellationToken(0.05)
+    hijo = padre.child(10)
+    assert hijo.remaining() <= 0.05
+    assert hijo.wait(2)
+    assert hijo.deadline_exceeded
+    assert hijo.reason == padre.reason
+
+
+def test_release_del_hijo_lo_desliga_del_padre():
+    padre = CancellationToken()
+    hijo = padre.child()
+    hijo.release()
+    padre.cancel()
+    time.sleep(0.01)
+    assert not hijo.cancelled
@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+from core.events import Event
+from core.journal import EventJournal, pattern_matches
+
+
+def test_pattern_matches():
+    assert pattern_matches("backup.auto.success", "backup.auto.success")
+    assert pattern_matches("backup.*.success", "backup.manual.success")
+    assert not pattern_matches("backup.*", "backup.auto.success")
+    assert not pattern_matches("backup.*.success", "backup.auto.failed")
+
+
+def journal_con_eventos(tmp_path, eventos, patterns=None):
+    journal = EventJournal()
+    journal.enable_persistence(str(tmp_path), patterns=patterns)
+    for nombre, momento in eventos:
+        journal.record(Event(nombre, timestamp=momento, data={'n': nombre}))
+    return journal
+
+
+def test_replay_filtra_por_patron_y_rango(tmp_path):
+    base = datetime(2026, 1, 1, 12, 0)
+    journal = journal_con_eventos(tmp_path, [
+        ("backup.auto.success", base),
+        ("backup.manual.failed", base + timedelta(minutes=1)),
+        ("system.start", base + timedelta(minutes=2)),
+        ("backup.auto.success", base + timedelta(minutes=3)),
+    ])
+
+    assert len(list(journal.replay())) == 4
+    assert [e.timestamp for e in journal.replay("backup.*.success")] == [base, base + timedelta(minutes=3)]
+    desde = [e.name for e in journal.replay(since=base + timedelta(minutes=1), until=base + timedelta(minutes=2))]
+    assert desde == ["backup.manual.failed", "system.start"]
+    assert list(journal.replay(since=base + timedelta(hours=1))) == []
+
+
+def test_replay_solo_ve_lo_persistido(tmp_path):
+    base = datetime(2026, 1, 1, 12, 0)
+    journal = journal_con_eventos(tmp_path, [("backup.auto.success", base), ("system.tick", base)],
+                                  patterns=["backup.*.*"])
+    journal.record(Event("backup.auto.failed", timestamp=base), persist=False)
+
+    assert [e.name for e in journal.replay()] == ["backup.auto.success"]
+    assert len(journal.get_history()) == 3
+
+
+def test_replay_saltea_lineas_truncadas(tmp_path):
+    journal = journal_con_eventos(tmp_path, [("backup.auto.success", datetime(2026, 1, 1))])
+    journal.flush()
+    segmento = journal._segments()[-1]
+    with open(segmento, 'a', encoding='utf-8') as f:
+        f.write('{"n":"backup.auto.fa')
+
+    assert [e.name for e in journal.replay()] == ["backup.auto.success"]
+
+
+def test_rotacion_conserva_los_segmentos_mas_recientes(tmp_path):
+    journal = EventJournal()
+    journal.enable_persistence(str(tmp_path), segment_bytes=200, max_segments=2)
+    for i in range(20):
+        journal.record(Event("backup.auto.step", timestamp=datetime(2026, 1, 1), data={'i': i}))
+
+    eventos = list(journal.replay())
+    assert len(journal._segments()) == 2
+    assert eventos[-1].data == {'i': 19}
+    assert [e.data['i'] for e in eventos] == sorted(e.data['i'] for e in eventos)
@@ -0,0 +1,68 @@
+import subprocess
+
+megacmd = CloudModuleLoader.load_module("megacmd")
+
+
+def test_parse_quota_en_bytes():
+    salida = "ACCOUNT USAGE\nUSED STORAGE:   1073741824   5.00% of 21474836480\n"
+    assert megacmd.parse_quota(salida) == {
+        'used': 1073741824, 'total': 21474836480, 'free': 21474836480 - 1073741824
+    }
+
+
+def test_parse_quota_con_unidades():
+    salida = "USED STORAGE:   1.50 GB   7.50% of 20.00 GB"
+    cuota = megacmd.parse_quota(salida)
+    assert cuota['used'] == int(1.5 * 1024 ** 3)
+    assert cuota['total'] == 20 * 1024 ** 3
+
+
+def test_parse_quota_sin_formato():
+    assert megacmd.parse_quota("Not logged in.") is None
+
+
+def test_list_transfers(monkeypatch):
+    salida = (
+        "TAG|SOURCEPATH|DESTINYPATH|PROGRESS|STATE\n"
+        "1|/srv/MSX_1.zip|/backups/|45.20%|active\n"
+        "2|/srv/MSX_2.zip|/backups/| 100.00% |COMPLETED\n"
+        "basura sin columnas\n"
+    )
+
+    def run(cmd, **kwargs):
+        assert cmd[0] == "mega-transfers"
+        return subprocess.CompletedProcess(cmd, 0, salida, "")
+
+    monkeypatch.setattr(megacmd.subprocess, "run", run)
+    assert megacmd.list_transfers() == [
+        {'tag': "1", 'source': "/srv/MSX_1.zip", 'destination': "/backups/", 'progress': "45.20%",
+         'state': "ACTIVE"},
+        {'tag': "2", 'source': "/srv/MSX_2.zip", 'destination': "/backups/", 'progress': "100.00%",
+         'state': "COMPLETED"},
+    ]
+
+
+def test_list_transfers_error(monkeypatch):
+    monkeypatch.setattr(megacmd.subprocess, "run",
+                        lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 1, "", "not logged in"))
+    assert megacmd.list_transfers() is None
+
+
+def test_parse_find_long():
+    salida = (
+        "FLAGS VERS SIZE DATE                NAME\n"
+        "d--- - - 04Mar2024 10:00:00 /backups\n"
+        "-rw- 1 1234 04Mar2024 10:01:02 /backups/MSX 1.zip\n"
+        "-rw- 99 05Mar2024 10:00:00 sub/x.zip\n"
+    )
+    entradas = megacmd.parse_find_long(salida, "/backups")
+    assert [(e['path'], e['name'], e['size'], e['is_dir']) for e in entradas] == [
+        ("/backups", "backups", 0, True),
+        ("/backups/MSX 1.zip", "MSX 1.zip", 1234, False),
+        ("/backups/sub/x.zip", "x.zip", 99, False),
+    ]
+
+
+def test_parse_find_long_formato_desconocido():
+    assert megacmd.parse_find_long("/backups\n/backups/a.zip\n") is None
+    assert megacmd.parse_find_long("") == []
@@ -0,0 +1,99 @@
+import pytest
+
+from core.pipeline import Pipeline, RetryPolicy, StepTimeoutError
+
+
+def paso(ctx):
+    return {}
+
+
+def nombres(pipeline, waves):
+    return [[pipeline.steps[i].name for i in wave] for wave in waves]
+
+
+def test_plan_agrupa_pasos_independientes():
+    pipeline = Pipeline("t", checkpoint_dir=None)
+    pipeline.add_step("config", paso, reads=(), writes=('folder',)) \
+        .add_step("a", paso, reads=('folder',), writes=('a',)) \
+        .add_step("b", paso, reads=('folder',), writes=('b',)) \
+        .add_step("join", paso, reads=('a', 'b'), writes=('out',)) \
+        .add_step("last", paso, reads=(), writes=(), after=('join',))
+
+    _, waves, feeds = pipeline._plan()
+    assert nombres(pipeline, waves) == [["config"], ["a", "b"], ["join"], ["last"]]
+    assert feeds == {}
+
+
+def test_paso_sin_declarar_espera_a_todos_los_anteriores():
+    pipeline = Pipeline("t", checkpoint_dir=None)
+    pipeline.add_step("a", paso, reads=(), writes=('a',)) \
+        .add_step("b", paso, reads=(), writes=('b',)) \
+        .add_step("legacy", paso)
+
+    _, waves, _ = pipeline._plan()
+    assert nombres(pipeline, waves) == [["a", "b"], ["legacy"]]
+
+
+def test_stream_va_en_la_ola_de_su_consumidor():
+    pipeline = Pipeline("t", checkpoint_dir=None)
+    pipeline.add_step("config", paso, reads=(), writes=('folder',)) \
+        .add_step("hooks", paso, reads=('folder',), writes=('hooks',)) \
+        .add_step("inventory", paso, reads=('folder',), writes=('files',), after=('hooks',)) \
+        .add_step("compress", paso, reads=('folder',), writes=('zip',), consumes="inventory") \
+        .add_step("upload", paso, reads=('zip',), writes=('remote',))
+
+    _, waves, feeds = pipeline._plan()
+    assert nombres(pipeline, waves) == [["config"], ["hooks"], ["inventory", "compress"], ["upload"]]
+    inventory = [s.name for s in pipeline.steps].index("inventory")
+    assert pipeline.steps[feeds[inventory]].name == "compress"
+
+
+def test_stream_con_dos_consumidores_se_rechaza():
+    pipeline = Pipeline("t", checkpoint_dir=None)
+    pipeline.add_step("gen", paso, reads=(), writes=('g',)) \
+        .add_step("c1", paso, reads=(), writes=('c1',), consumes="gen") \
+        .add_step("c2", paso, reads=(), writes=('c2',), consumes="gen")
+
+    with pytest.raises(ValueError):
+        pipeline._plan()
+
+
+def test_consumir_un_paso_posterior_se_rechaza():
+    pipeline = Pipeline("t", checkpoint_dir=None)
+    pipeline.add_step("c", paso, reads=(), writes=('c',), consumes="gen") \
+        .add_step("gen", paso, reads=(), writes=('g',))
+
+    with pytest.raises(ValueError):
+        pipeline._plan()
+
+
+def test_retry_policy_reintenta_hasta_max_attempts():
+    policy = RetryPolicy(max_attempts=3, retry_on=(OSError,))
+    assert policy.should_retry(OSError("x"), 1)
+    assert policy.should_retry(OSError("x"), 2)
+    assert not policy.should_retry(OSError("x"), 3)
+    assert not policy.should_retry(ValueError("x"), 1)
+
+
+def test_retry_policy_no_reintenta_timeouts_salvo_que_se_pida():
+    error = StepTimeoutError("lento")
+    assert not RetryPolicy(max_attempts=3).should_retry(error, 1)
+    assert RetryPolicy(max_attempts=3, retry_timeouts=True).should_retry(error, 1)
+
+
+def test_retry_policy_delay_exponencial_con_tope():
+    policy = RetryPolicy(backoff_seconds=2, backoff_factor=3, max_backoff_seconds=10, jitter=0)
+    assert [policy.delay(n) for n in (1, 2, 3)] == [2, 6, 10]
+
+    con_jitter = RetryPolicy(backoff_seconds=10, jitter=0.2)
+    assert all(8 <= con_jitter.delay(1) <= 12 for _ in range(50))
+
+
+def test_retry_policy_from_config():
+    assert RetryPolicy.from_config(None) is None
+
+    policy = RetryPolicy.from_config({'max_attempts': 0, 'backoff_seconds': "5",
+                                      'retry_on': ['OSError', 'NoExiste']})
+    assert policy.max_attempts == 1
+    assert policy.backoff_seconds == 5.0
+    assert policy.retry_on == (OSError,)